@@ -3,9 +3,42 @@
 
 # Add these imports to your existing imports section
 from datetime import date
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+from operator import attrgetter
+from itertools import groupby
+import csv
+import gzip
+import hashlib
+import json
+import os
+import queue
 import random
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+import re
+import sys
+import threading
+import time
+from types import MappingProxyType
+import atexit
+import click
+import jwt
+from kitchen_scheduler import parse_delivery_slots, schedule_preparation, slot_window
+import asset_pipeline
+import auth_pool
+import city_shards
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+from sqlalchemy.exc import IntegrityError
 
 # Add these new models to your existing models section
 
@@ -62,21 +95,14 @@ class DeliveryZone(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'city': self.city,
-            'zone_name': self.zone_name,
-            'pincode_range': self.pincode_range.split(','),
-            'delivery_slots': dict(slot.split(':') for slot in self.delivery_slots.split(',') if ':' in slot),
-            'preparation_time_hours': self.preparation_time_hours
-        }
+        return serialize_model(self)
 
 class ProductBatch(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     batch_number = db.Column(db.String(50), unique=True, nullable=False)
     preparation_date = db.Column(db.DateTime, nullable=False)
-    expiry_datetime = db.Column(db.DateTime, nullable=False)
+    expiry_datetime = db.Column(db.DateTime, nullable=False, index=True)
     quantity_prepared = db.Column(db.Integer, nullable=False)
     preparation_location = db.Column(db.String(100), nullable=False)
     quality_score = db.Column(db.Float, default=5.0)  # out of 5
@@ -86,17 +112,7 @@ class ProductBatch(db.Model):
     product = db.relationship('Product', backref='batches')
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'batch_number': self.batch_number,
-            'preparation_date': self.preparation_date.isoformat(),
-            'expiry_datetime': self.expiry_datetime.isoformat(),
-            'quantity_prepared': self.quantity_prepared,
-            'preparation_location': self.preparation_location,
-            'quality_score': self.quality_score,
-            'ingredients_source': self.ingredients_source,
-            'freshness_hours_left': self.get_freshness_hours_left()
-        }
+        return serialize_model(self)
     
     def get_freshness_hours_left(self):
         if self.expiry_datetime > datetime.utcnow():
@@ -135,6 +151,303 @@ class UserFeedback(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class SkinDiary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    entry_date = db.Column(db.Date, nullable=False, default=date.today)
+    skin_condition = db.Column(db.String(50), nullable=True)  # excellent, good, average, poor
+    products_used = db.Column(db.Text, nullable=True)  # comma separated product names
+    skin_feeling = db.Column(db.String(50), nullable=True)  # dry, oily, normal, tight
+    breakouts = db.Column(db.Boolean, default=False)
+    sensitivity = db.Column(db.Boolean, default=False)
+    notes = db.Column(db.Text, nullable=True)
+    photos = db.Column(db.Text, nullable=True)  # comma separated photo urls
+    sleep_hours = db.Column(db.Float, nullable=True)
+    stress_level = db.Column(db.Integer, nullable=True)  # 1-10
+    water_intake = db.Column(db.Float, nullable=True)  # litres
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationship
+    user = db.relationship('User', backref='skin_diary_entries')
+    
+    def to_dict(self):
+        return serialize_model(self)
+
+class SkinInsight(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
+    insights = db.Column(db.Text, nullable=False)  # JSON encoded list of messages
+    entries_analysed = db.Column(db.Integer, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'insights': json.loads(self.insights),
+            'entries_analysed': self.entries_analysed,
+            'computed_at': self.computed_at.isoformat()
+        }
+
+class Referral(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    referrer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    referral_code = db.Column(db.String(20), unique=True, nullable=True, index=True)  # set from id on insert
+    friend_email = db.Column(db.String(120), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, successful
+    referred_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, unique=True)  # one redemption per user
+    reward_amount = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    redeemed_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    referrer = db.relationship('User', foreign_keys=[referrer_id], backref='referrals_sent')
+    referred_user = db.relationship('User', foreign_keys=[referred_user_id])
+    
+    __table_args__ = (
+        db.Index('ix_referral_referrer_status', 'referrer_id', 'status', 'redeemed_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'referral_code': self.referral_code,
+            'friend_email': self.friend_email,
+            'status': self.status,
+            'reward_amount': self.reward_amount,
+            'created_at': self.created_at.isoformat(),
+            'redeemed_at': self.redeemed_at.isoformat() if self.redeemed_at else None
+        }
+
+class ReferralStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_referrals = db.Column(db.Integer, default=0, nullable=False)
+    successful_referrals = db.Column(db.Integer, default=0, nullable=False)
+    pending_referrals = db.Column(db.Integer, default=0, nullable=False)
+    total_rewards_earned = db.Column(db.Integer, default=0, nullable=False)
+    current_referral_code = db.Column(db.String(20), nullable=True)
+    
+    def to_dict(self):
+        return {
+            'total_referrals': self.total_referrals,
+            'successful_referrals': self.successful_referrals,
+            'pending_referrals': self.pending_referrals,
+            'total_rewards_earned': self.total_rewards_earned,
+            'current_referral_code': self.current_referral_code
+        }
+
+class CommunityTip(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    author_name = db.Column(db.String(100), nullable=False)
+    tip = db.Column(db.Text, nullable=False)
+    category = db.Column(db.String(50), nullable=False, index=True)  # application, storage, lifestyle
+    season = db.Column(db.String(20), nullable=True, index=True)  # summer, monsoon, winter, spring
+    likes = db.Column(db.Integer, default=0, nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tip': self.tip,
+            'category': self.category,
+            'season': self.season,
+            'user': self.author_name,
+            'likes': self.likes,
+            'created_at': self.created_at.isoformat()
+        }
+
+class SuccessStory(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    author_name = db.Column(db.String(100), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    preview = db.Column(db.Text, nullable=False)
+    duration = db.Column(db.String(50), nullable=True)
+    before_after = db.Column(db.Boolean, default=False)
+    likes = db.Column(db.Integer, default=0, nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'preview': self.preview,
+            'user': self.author_name,
+            'duration': self.duration,
+            'before_after': self.before_after,
+            'likes': self.likes
+        }
+
+class ZoneDeliveryTimeline(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    zone_id = db.Column(db.Integer, db.ForeignKey('delivery_zone.id', ondelete='CASCADE'), nullable=False)
+    pincode = db.Column(db.String(10), nullable=False, index=True)
+    city = db.Column(db.String(100), nullable=False, index=True)
+    slot_name = db.Column(db.String(20), nullable=False)
+    slot_start_minute = db.Column(db.Integer, nullable=False)  # minutes after midnight of delivery day
+    slot_end_minute = db.Column(db.Integer, nullable=False)
+    preparation_start_minute = db.Column(db.Integer, nullable=False)
+    cutoff_minute = db.Column(db.Integer, nullable=False)  # negative means the day before delivery
+    
+    zone = db.relationship('DeliveryZone')
+
+class QualityStats(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)  # product, location
+    key = db.Column(db.String(100), nullable=False)  # product id or preparation location
+    count = db.Column(db.Integer, default=0, nullable=False)
+    mean = db.Column(db.Float, default=0.0, nullable=False)
+    m2 = db.Column(db.Float, default=0.0, nullable=False)  # sum of squared deviations (Welford)
+    ewma = db.Column(db.Float, default=0.0, nullable=False)
+    ewm_variance = db.Column(db.Float, default=0.0, nullable=False)
+    last_score = db.Column(db.Float, nullable=True)
+    anomaly_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('scope', 'key'),)
+    
+    def to_dict(self):
+        return {
+            'scope': self.scope,
+            'key': self.key,
+            'count': self.count,
+            'mean': round(self.mean, 3),
+            'std_dev': round((self.m2 / (self.count - 1)) ** 0.5, 3) if self.count > 1 else 0.0,
+            'ewma': round(self.ewma, 3),
+            'ewm_std_dev': round(self.ewm_variance ** 0.5, 3),
+            'last_score': self.last_score,
+            'anomaly_count': self.anomaly_count,
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class QualityAnomaly(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, nullable=False, index=True)  # may since have been archived
+    scope = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    quality_score = db.Column(db.Float, nullable=False)
+    expected_score = db.Column(db.Float, nullable=False)
+    z_score = db.Column(db.Float, nullable=False)
+    detected_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'batch_id': self.batch_id,
+            'scope': self.scope,
+            'key': self.key,
+            'quality_score': self.quality_score,
+            'expected_score': round(self.expected_score, 3),
+            'z_score': round(self.z_score, 2),
+            'detected_at': self.detected_at.isoformat()
+        }
+
+class ArchivedProductBatch(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # id it had in product_batch
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    batch_number = db.Column(db.String(50), unique=True, nullable=False)
+    preparation_date = db.Column(db.DateTime, nullable=False)
+    expiry_datetime = db.Column(db.DateTime, nullable=False)
+    quantity_prepared = db.Column(db.Integer, nullable=False)
+    preparation_location = db.Column(db.String(100), nullable=False)
+    quality_score = db.Column(db.Float, default=5.0)
+    ingredients_source = db.Column(db.Text, nullable=True)
+    quantity_sold = db.Column(db.Integer, default=0, nullable=False)
+    quantity_wasted = db.Column(db.Integer, default=0, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailyWasteRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # expiry date
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    preparation_location = db.Column(db.String(100), nullable=False)
+    batches = db.Column(db.Integer, default=0, nullable=False)
+    quantity_prepared = db.Column(db.Integer, default=0, nullable=False)
+    quantity_wasted = db.Column(db.Integer, default=0, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('day', 'product_id', 'preparation_location'),)
+
+class DailyRevenueRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    zone = db.Column(db.String(100), nullable=False)
+    plan_type = db.Column(db.String(50), nullable=False)
+    order_count = db.Column(db.Integer, default=0, nullable=False)
+    item_count = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('day', 'zone', 'plan_type'),)
+
+class DailyProductRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('day', 'product_id'),)
+
+class DailyFeedbackRollup(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    feedback_count = db.Column(db.Integer, default=0, nullable=False)
+    reorder_count = db.Column(db.Integer, default=0, nullable=False)
+
+class RollupWatermark(db.Model):
+    name = db.Column(db.String(50), primary_key=True)  # source table
+    last_id = db.Column(db.Integer, default=0, nullable=False)
+
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)  # cached data set, e.g. catalog
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+class ProfilerWindow(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sample_rate = db.Column(db.Float, nullable=False)
+    endpoint = db.Column(db.String(100))  # all endpoints when empty
+    interval_ms = db.Column(db.Float, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False, index=True)
+    profiled_requests = db.Column(db.Integer, default=0, nullable=False)
+    samples = db.Column(db.Integer, default=0, nullable=False)
+
+class ProfilerStack(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    window_id = db.Column(db.Integer, db.ForeignKey('profiler_window.id', ondelete='CASCADE'), nullable=False, index=True)
+    stack = db.Column(db.Text, nullable=False)  # collapsed 'a;b;c' form
+    count = db.Column(db.Integer, nullable=False)  # one worker's samples since its last flush
+
+# Bearer tokens for the routes below are verified with decode_auth_token, so
+# they follow AUTH_TOKEN_ALGORITHM and its keys (see the password hashing and
+# token signing section). This replaces the core token_required here. Its
+# routes go through admission control once the caller is authenticated, so
+# requests with bad tokens never take a slot or a rate token.
+
+def token_required(f):
+    """Require a valid bearer token and pass its user to the view"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        token = header[len('Bearer '):] if header.startswith('Bearer ') else header
+        if not token:
+            return jsonify({'message': 'Token is missing'}), 401
+        try:
+            data = decode_auth_token(token)
+        except jwt.PyJWTError:
+            return jsonify({'message': 'Token is invalid'}), 401
+        
+        current_user = db.session.get(User, data.get('user_id'))
+        if current_user is None:
+            return jsonify({'message': 'Token is invalid'}), 401
+        
+        shed_response = apply_admission_limits()
+        if shed_response is not None:
+            return shed_response
+        return f(current_user, *args, **kwargs)
+    
+    decorated.admitted_after_authentication = True
+    return decorated
+
 # Add these new routes to your existing routes section
 
 @app.route('/api/weather-adaptive-products', methods=['GET'])
@@ -195,13 +508,16 @@ def set_customization_preferences(current_user):
 def get_delivery_zones():
     """Get available delivery zones"""
     try:
+        fields = parse_fields_param(DeliveryZone)
         zones = DeliveryZone.query.filter_by(is_active=True).all()
         
-        return jsonify({
-            'delivery_zones': [zone.to_dict() for zone in zones],
+        return json_response({
+            'delivery_zones': serialize_rows(DeliveryZone, zones, fields),
             'coverage_message': 'Currently serving select metro areas with plans to expand soon!'
-        }), 200
+        })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -245,6 +561,8 @@ def check_delivery_availability():
 def get_fresh_batches(current_user):
     """Get information about fresh product batches"""
     try:
+        fields = parse_fields_param(ProductBatch)
+        
         # Get today's fresh batches
         today = datetime.now().date()
         fresh_batches = ProductBatch.query.filter(
@@ -252,12 +570,14 @@ def get_fresh_batches(current_user):
             ProductBatch.expiry_datetime > datetime.utcnow()
         ).all()
         
-        return jsonify({
-            'fresh_batches': [batch.to_dict() for batch in fresh_batches],
+        return json_response({
+            'fresh_batches': serialize_rows(ProductBatch, fresh_batches, fields),
             'total_fresh_products': len(fresh_batches),
             'freshness_guarantee': 'All products are made fresh daily and delivered within 4 hours of preparation'
-        }), 200
+        })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -272,8 +592,13 @@ def get_personalized_routine(current_user):
         # Get user's preferences
         prefs = CustomizationPreferences.query.filter_by(user_id=current_user.id).first()
         
+        # Adapt to today's weather unless the user opted out
+        weather = None
+        if not prefs or prefs.weather_adaptation:
+            weather = get_current_weather(request.args.get('city', 'Mumbai'))
+        
         # Generate comprehensive routine
-        routine = generate_comprehensive_routine(current_user.skin_profile, prefs)
+        routine = generate_comprehensive_routine(current_user.skin_profile, prefs, weather)
         
         return jsonify({
             'personalized_routine': routine,
@@ -353,36 +678,139 @@ def get_ingredient_transparency():
         product_id = request.args.get('product_id')
         
         if product_id:
-            product = Product.query.get(product_id)
-            if not product:
+            if not product_id.isdigit():
+                raise ValueError('product_id must be an integer')
+            body = get_product_transparency_json(int(product_id))
+            if body is None:
                 return jsonify({'error': 'Product not found'}), 404
-            
-            # Get ingredient details
-            ingredient_details = get_detailed_ingredient_info(product)
-            
-            return jsonify({
-                'product': product.to_dict(),
-                'ingredient_transparency': ingredient_details,
-                'sourcing_info': {
-                    'local_farms': get_local_farm_info(),
-                    'organic_certification': True,
-                    'fair_trade': True,
-                    'seasonal_availability': get_seasonal_ingredient_info()
-                }
-            }), 200
         else:
             # Return general ingredient information
-            return jsonify({
-                'common_ingredients': get_common_ingredient_benefits(),
-                'avoided_chemicals': get_avoided_chemicals_list(),
-                'sourcing_philosophy': 'Fresh, Local, Organic, Sustainable'
-            }), 200
+            body = ingredient_knowledge['general_json']
         
+        return app.response_class(body, status=200, mimetype='application/json')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Helper functions to add to your existing helper functions
 
+# Response serialization: orjson when installed, stdlib json otherwise, with
+# per-model serializers compiled once per field selection. Datetimes are
+# left to the encoder instead of calling isoformat() per row.
+
+def split_list_field(attribute):
+    """Serialize a comma separated column as a list"""
+    getter = attrgetter(attribute)
+    return lambda row: getter(row).split(',') if getter(row) else []
+
+# Output field name -> column attribute, or a function of the row
+MODEL_SERIALIZERS = {
+    DeliveryZone: {
+        'id': 'id',
+        'city': 'city',
+        'zone_name': 'zone_name',
+        'pincode_range': lambda zone: zone.pincode_range.split(','),
+        'delivery_slots': lambda zone: dict(slot.split(':') for slot in zone.delivery_slots.split(',') if ':' in slot),
+        'preparation_time_hours': 'preparation_time_hours'
+    },
+    ProductBatch: {
+        'id': 'id',
+        'batch_number': 'batch_number',
+        'preparation_date': 'preparation_date',
+        'expiry_datetime': 'expiry_datetime',
+        'quantity_prepared': 'quantity_prepared',
+        'preparation_location': 'preparation_location',
+        'quality_score': 'quality_score',
+        'ingredients_source': 'ingredients_source',
+        'freshness_hours_left': ProductBatch.get_freshness_hours_left
+    },
+    SkinDiary: {
+        'id': 'id',
+        'date': 'entry_date',
+        'skin_condition': 'skin_condition',
+        'products_used': split_list_field('products_used'),
+        'skin_feeling': 'skin_feeling',
+        'breakouts': 'breakouts',
+        'sensitivity': 'sensitivity',
+        'notes': 'notes',
+        'photos': split_list_field('photos'),
+        'sleep_hours': 'sleep_hours',
+        'stress_level': 'stress_level',
+        'water_intake': 'water_intake'
+    }
+}
+
+def encode_json_default(value):
+    """Encode values the stdlib json module doesn't handle"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_json(payload):
+    """Serialize a payload to JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=encode_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=encode_json_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def json_response(payload, status=200):
+    """Build a JSON response using dumps_json"""
+    return app.response_class(dumps_json(payload), status=status, mimetype='application/json')
+
+@lru_cache(maxsize=256)
+def compile_serializer(model, fields=None):
+    """Build a row -> dict function for a model and field selection"""
+    spec = MODEL_SERIALIZERS[model]
+    names = tuple(fields) if fields else tuple(spec)
+    
+    attributes = [name for name in names if isinstance(spec[name], str)]
+    computed = [(name, spec[name]) for name in names if not isinstance(spec[name], str)]
+    
+    if len(attributes) == 1:
+        single_getter = attrgetter(spec[attributes[0]])
+        getter = lambda row: (single_getter(row),)
+    elif attributes:
+        getter = attrgetter(*(spec[name] for name in attributes))
+    else:
+        getter = lambda row: ()
+    
+    def serialize(row):
+        data = dict(zip(attributes, getter(row)))
+        for name, compute in computed:
+            data[name] = compute(row)
+        return data
+    
+    return serialize
+
+def serialize_rows(model, rows, fields=None):
+    """Serialize model rows, optionally limited to selected fields"""
+    serialize = compile_serializer(model, fields)
+    return [serialize(row) for row in rows]
+
+def serialize_model(row):
+    """Serialize a single row for to_dict(), with dates as ISO strings for jsonify"""
+    data = compile_serializer(type(row))(row)
+    for name, value in data.items():
+        if isinstance(value, (datetime, date)):
+            data[name] = value.isoformat()
+    return data
+
+def parse_fields_param(model):
+    """Read a sparse fieldset from ?fields=a,b,c for a model"""
+    value = request.args.get('fields')
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in MODEL_SERIALIZERS[model]]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
 def get_current_weather(city):
     """Get current weather data (integrate with weather API)"""
     # This is a mock function - integrate with actual weather API
@@ -396,6 +824,10 @@ def get_current_weather(city):
 
 def get_products_for_weather(weather, skin_profile):
     """Get products suitable for current weather conditions"""
+    return get_weather_products(weather, get_user_allergies(skin_profile))
+
+def get_weather_products(weather, allergies):
+    """Get weather-suited products, leaving out anything containing the allergens"""
     weather_product_mapping = {
         'humid': ['hydrating_gel', 'light_moisturizer', 'clay_mask'],
         'dry': ['rich_moisturizer', 'hydrating_serum', 'nourishing_oil'],
@@ -407,11 +839,16 @@ def get_products_for_weather(weather, skin_profile):
     condition = weather.get('condition', 'sunny')
     suitable_categories = weather_product_mapping.get(condition, ['moisturizer'])
     
-    # Get products from these categories
-    products = Product.query.filter(
+    # Get products from these categories, leaving out anything the user is allergic to
+    query = Product.query.filter(
         Product.category.in_(suitable_categories),
         Product.is_active == True
-    ).limit(5).all()
+    )
+    unsafe_product_ids = get_unsafe_product_ids(allergies)
+    if unsafe_product_ids:
+        query = query.filter(~Product.id.in_(unsafe_product_ids))
+    
+    products = query.limit(5).all()
     
     return [product.to_dict() for product in products]
 
@@ -430,43 +867,182 @@ def get_weather_adaptation_message(weather):
     
     return messages.get(condition, "Perfect weather for your personalized skincare routine!")
 
-def generate_comprehensive_routine(skin_profile, preferences):
-    """Generate a detailed skincare routine"""
-    routine = {
-        'morning': {
-            'steps': [
-                {'step': 1, 'product': 'Gentle Cleanser', 'time': '30 seconds', 'instruction': 'Massage gently with damp hands'},
-                {'step': 2, 'product': 'Hydrating Toner', 'time': '1 minute', 'instruction': 'Pat gently into skin'},
-                {'step': 3, 'product': 'Vitamin C Serum', 'time': '2 minutes', 'instruction': 'Apply and let absorb'},
-                {'step': 4, 'product': 'Daily Moisturizer', 'time': '1 minute', 'instruction': 'Apply in upward motions'}
-            ],
-            'total_time': '4-5 minutes'
-        },
-        'evening': {
-            'steps': [
-                {'step': 1, 'product': 'Deep Cleanser', 'time': '1 minute', 'instruction': 'Double cleanse if wearing makeup'},
-                {'step': 2, 'product': 'Treatment Toner', 'time': '1 minute', 'instruction': 'Use cotton pad or pat with hands'},
-                {'step': 3, 'product': 'Night Serum', 'time': '2 minutes', 'instruction': 'Focus on concern areas'},
-                {'step': 4, 'product': 'Night Moisturizer', 'time': '1 minute', 'instruction': 'Apply generously'}
-            ],
-            'total_time': '5-6 minutes'
-        },
-        'weekly_treatments': [
-            {'frequency': '2x per week', 'product': 'Exfoliating Mask', 'day': 'Wednesday, Sunday'},
-            {'frequency': '1x per week', 'product': 'Deep Hydration Mask', 'day': 'Saturday'},
-            {'frequency': '1x per week', 'product': 'Eye Treatment', 'day': 'Friday'}
-        ],
-        'skin_concerns_focus': skin_profile.skin_concerns.split(',') if skin_profile.skin_concerns else [],
-        'expected_results_timeline': {
-            '1 week': 'Improved skin texture and hydration',
-            '2 weeks': 'Reduced irritation and better skin barrier',
-            '4 weeks': 'Visible improvement in skin concerns',
-            '8 weeks': 'Significant transformation and glow'
+# Routine slots: (category, step time in minutes, instruction if the product has none)
+ROUTINE_STEPS = {
+    'morning': [
+        ('cleanser', 1, 'Massage gently with damp hands'),
+        ('toner', 1, 'Pat gently into skin'),
+        ('moisturizer', 1, 'Apply in upward motions')
+    ],
+    'evening': [
+        ('cleanser', 1, 'Double cleanse if wearing makeup'),
+        ('toner', 1, 'Use cotton pad or pat with hands'),
+        ('treatment', 2, 'Focus on concern areas'),
+        ('moisturizer', 1, 'Apply generously')
+    ]
+}
+
+# Weekly treatments: (category, uses per week by delivery frequency, days)
+WEEKLY_TREATMENTS = [
+    ('mask', {'daily': 2, 'alternate': 2, 'weekly': 1}, ['Wednesday', 'Sunday']),
+    ('scrub', {'daily': 1, 'alternate': 1, 'weekly': 1}, ['Saturday'])
+]
+
+# Benefit keywords that address each skin concern
+CONCERN_BENEFIT_KEYWORDS = {
+    'acne': ['antibacterial', 'anti-bacterial', 'oil control', 'deep cleansing', 'pore'],
+    'dryness': ['hydrat', 'moistur', 'nourish', 'softening'],
+    'pigmentation': ['brighten', 'natural glow'],
+    'aging': ['anti-aging', 'firming', 'repair', 'plumping'],
+    'sensitivity': ['soothing', 'calming', 'anti-inflammatory', 'gentle'],
+    'dullness': ['brighten', 'glow', 'exfoliation', 'antioxidant'],
+    'oiliness': ['oil control', 'pore', 'non-greasy', 'light texture'],
+    'dark circles': ['dark circle', 'de-puffing']
+}
+
+WEATHER_BENEFIT_KEYWORDS = {
+    'humid': ['light texture', 'non-greasy', 'oil control', 'cooling'],
+    'dry': ['hydrat', 'moistur', 'nourish'],
+    'sunny': ['antioxidant', 'cooling', 'brighten'],
+    'rainy': ['gentle', 'calming', 'soothing'],
+    'windy': ['repair', 'nourish', 'healing']
+}
+
+# Hours from delivery until each routine is used, by delivery time preference
+ROUTINE_USE_AFTER_DELIVERY_HOURS = {
+    'morning': {'morning': 0, 'evening': 13},
+    'evening': {'morning': 12, 'evening': 0},
+    'both': {'morning': 0, 'evening': 0}
+}
+
+# Extra hours products must last until the next delivery arrives
+DELIVERY_FREQUENCY_EXTRA_HOURS = {'daily': 0, 'alternate': 24, 'weekly': 144}
+
+ROUTINE_CACHE_SIZE = 2048
+
+routine_cache_state = {'version': None}
+
+def normalize_routine_key(skin_profile, preferences, weather):
+    """Reduce a profile to the hashable inputs its routine depends on"""
+    concerns = split_catalog_values(skin_profile.skin_concerns)
+    allergies = [normalize_ingredient(allergy) for allergy in get_user_allergies(skin_profile)]
+    return (
+        (skin_profile.skin_type or 'normal').strip().lower(),
+        tuple(sorted(set(concerns))),
+        preferences.frequency if preferences and preferences.frequency else 'daily',
+        preferences.delivery_time_preference if preferences and preferences.delivery_time_preference else 'morning',
+        weather.get('condition') if weather else None,
+        tuple(sorted(set(filter(None, allergies))))
+    )
+
+def score_routine_product(product, skin_type, concerns, weather_condition, required_hours):
+    """Score how well a product suits a profile for a routine step"""
+    product_skin_types = split_catalog_values(product.skin_types)
+    benefits = product.benefits.lower() if product.benefits else ''
+    
+    score = 0
+    if skin_type in product_skin_types:
+        score += 3
+    elif 'all' in product_skin_types:
+        score += 1
+    
+    for concern in concerns:
+        if any(keyword in benefits for keyword in CONCERN_BENEFIT_KEYWORDS.get(concern, [concern])):
+            score += 2
+    
+    if any(keyword in benefits for keyword in WEATHER_BENEFIT_KEYWORDS.get(weather_condition, [])):
+        score += 1
+    
+    # Preservative-free products must still be fresh when they're used
+    if product.shelf_life_hours is not None and product.shelf_life_hours < required_hours:
+        score -= 4
+    
+    return score
+
+@lru_cache(maxsize=ROUTINE_CACHE_SIZE)
+def build_routine_for_profile(routine_key):
+    """Assemble a routine from catalog products for a normalized profile key"""
+    skin_type, concerns, frequency, delivery_time, weather_condition, allergies = routine_key
+    
+    unsafe_product_ids = get_unsafe_product_ids(list(allergies))
+    products_by_category = {}
+    for product in Product.query.filter_by(is_active=True).order_by(Product.id).all():
+        if product.id not in unsafe_product_ids:
+            products_by_category.setdefault(product.category, []).append(product)
+    
+    use_after_hours = ROUTINE_USE_AFTER_DELIVERY_HOURS.get(delivery_time, ROUTINE_USE_AFTER_DELIVERY_HOURS['morning'])
+    extra_hours = DELIVERY_FREQUENCY_EXTRA_HOURS.get(frequency, 0)
+    
+    def pick_products(category, required_hours):
+        candidates = products_by_category.get(category, [])
+        return sorted(
+            candidates,
+            key=lambda product: (
+                -score_routine_product(product, skin_type, concerns, weather_condition, required_hours),
+                product.price
+            )
+        )
+    
+    routine = {}
+    chosen_ids = set()
+    for period, steps in ROUTINE_STEPS.items():
+        routine_steps = []
+        total_minutes = 0
+        for category, minutes, default_instruction in steps:
+            ranked = pick_products(category, use_after_hours[period] + extra_hours)
+            if not ranked:
+                continue
+            # Prefer a product not already used elsewhere in the routine
+            product = next((product for product in ranked if product.id not in chosen_ids), ranked[0])
+            chosen_ids.add(product.id)
+            total_minutes += minutes
+            routine_steps.append({
+                'step': len(routine_steps) + 1,
+                'product': product.name,
+                'product_id': product.id,
+                'time': f"{minutes} minute{'s' if minutes > 1 else ''}",
+                'instruction': product.usage_instructions or default_instruction
+            })
+        routine[period] = {
+            'steps': routine_steps,
+            'total_time': f"{total_minutes}-{total_minutes + 1} minutes"
         }
+    
+    weekly_treatments = []
+    for category, uses_per_week, days in WEEKLY_TREATMENTS:
+        ranked = pick_products(category, extra_hours)
+        if not ranked:
+            continue
+        times = uses_per_week.get(frequency, 1)
+        weekly_treatments.append({
+            'frequency': f"{times}x per week",
+            'product': ranked[0].name,
+            'product_id': ranked[0].id,
+            'day': ', '.join(days[:times])
+        })
+    routine['weekly_treatments'] = weekly_treatments
+    
+    routine['skin_concerns_focus'] = list(concerns)
+    routine['expected_results_timeline'] = {
+        '1 week': 'Improved skin texture and hydration',
+        '2 weeks': 'Reduced irritation and better skin barrier',
+        '4 weeks': 'Visible improvement in skin concerns',
+        '8 weeks': 'Significant transformation and glow'
     }
     
     return routine
 
+def generate_comprehensive_routine(skin_profile, preferences, weather=None):
+    """Generate a detailed skincare routine from the product catalog"""
+    # Many users share the same profile inputs, so routines are memoized on the
+    # normalized key. Cached routines are shared - callers must not modify them.
+    catalog_version = get_catalog_version()
+    if routine_cache_state['version'] != catalog_version:
+        build_routine_for_profile.cache_clear()
+        routine_cache_state['version'] = catalog_version
+    
+    return build_routine_for_profile(normalize_routine_key(skin_profile, preferences, weather))
+
 def update_recommendations_based_on_feedback(user, feedback):
     """Update future recommendations based on user feedback"""
     # This function would implement ML logic to improve recommendations
@@ -494,82 +1070,6 @@ def get_next_eco_milestone(total_orders):
             return f"{milestone - total_orders} more orders to reach next eco milestone!"
     return "You've achieved all eco milestones! You're an environmental superhero!"
 
-def get_detailed_ingredient_info(product):
-    """Get detailed information about product ingredients"""
-    # Mock detailed ingredient information
-    ingredient_benefits = {
-        'aloe_vera': {
-            'benefits': ['Soothing', 'Anti-inflammatory', 'Hydrating'],
-            'source': 'Organic farms in Rajasthan',
-            'extraction_method': 'Cold-pressed',
-            'purity': '99.5%'
-        },
-        'turmeric': {
-            'benefits': ['Anti-bacterial', 'Brightening', 'Anti-aging'],
-            'source': 'Kerala organic farms',
-            'extraction_method': 'Traditional grinding',
-            'purity': '98%'
-        },
-        'rose_water': {
-            'benefits': ['Toning', 'Hydrating', 'Calming'],
-            'source': 'Kashmir rose gardens',
-            'extraction_method': 'Steam distillation',
-            'purity': '100% natural'
-        }
-    }
-    
-    return ingredient_benefits
-
-def get_local_farm_info():
-    """Get information about partner farms"""
-    return [
-        {
-            'name': 'Green Valley Organic Farm',
-            'location': 'Pune, Maharashtra',
-            'speciality': 'Aloe Vera, Neem, Tulsi',
-            'certification': 'Organic India Certified'
-        },
-        {
-            'name': 'Himalayan Herb Gardens',
-            'location': 'Uttarakhand',
-            'speciality': 'Rose, Lavender, Chamomile',
-            'certification': 'NPOP Certified'
-        }
-    ]
-
-def get_seasonal_ingredient_info():
-    """Get seasonal availability of ingredients"""
-    return {
-        'summer': ['Cucumber', 'Mint', 'Aloe Vera', 'Rose'],
-        'monsoon': ['Neem', 'Turmeric', 'Honey', 'Clay'],
-        'winter': ['Almond Oil', 'Shea Butter', 'Oats', 'Milk'],
-        'spring': ['Green Tea', 'Lemon', 'Papaya', 'Vitamin E']
-    }
-
-def get_common_ingredient_benefits():
-    """Get benefits of commonly used natural ingredients"""
-    return {
-        'Natural Ingredients': {
-            'Turmeric': 'Anti-inflammatory, brightening, antibacterial',
-            'Aloe Vera': 'Soothing, hydrating, healing',
-            'Rose Water': 'Toning, calming, pH balancing',
-            'Honey': 'Moisturizing, antibacterial, gentle exfoliation',
-            'Oats': 'Gentle cleansing, soothing, anti-inflammatory',
-            'Cucumber': 'Cooling, hydrating, reduces puffiness'
-        }
-    }
-
-def get_avoided_chemicals_list():
-    """List of harmful chemicals that Freskin avoids"""
-    return {
-        'Parabens': 'Preservatives linked to hormone disruption',
-        'Sulfates': 'Harsh cleansing agents that strip natural oils',
-        'Silicones': 'Can clog pores and prevent skin breathing',
-        'Artificial Fragrances': 'Can cause allergic reactions and sensitivity',
-        'Formaldehyde': 'Carcinogenic preservative',
-        'Phthalates': 'Endocrine disruptors found in fragrances'
-    }
-
 def send_welcome_email(email, name):
     """Send welcome email to new users"""
     try:
@@ -679,62 +1179,477 @@ def get_product_categories():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Initialize database with sample data
-def initialize_sample_data():
-    """Initialize database with sample data"""
+@app.route('/api/products/search', methods=['GET'])
+@token_required
+def search_products(current_user):
+    """Full-text and facet search over the product catalog"""
     try:
-        # Create sample subscription plans
-        if not Subscription.query.first():
-            plans = [
-                Subscription(
-                    plan_type='basic',
-                    price=999.0,
-                    duration_days=30,
-                    features='Daily cleanser,Weekly mask,Basic toner',
-                    is_active=True
-                ),
-                Subscription(
-                    plan_type='premium',
-                    price=1999.0,
-                    duration_days=30,
-                    features='Full morning routine,Evening routine,Weekly treatments,Weather adaptation',
-                    is_active=True
-                ),
-                Subscription(
-                    plan_type='luxury',
-                    price=2999.0,
-                    duration_days=30,
-                    features='Complete personalized routine,Twice daily delivery,Premium ingredients,Personal skin consultant,Express delivery',
-                    is_active=True
-                )
-            ]
-            
-            for plan in plans:
-                db.session.add(plan)
+        limit = max(0, min(request.args.get('limit', 20, type=int), 100))
+        offset = max(0, request.args.get('offset', 0, type=int))
         
-        # Create sample products based on your business idea
-        if not Product.query.first():
-            products = [
-                # Face Masks
-                Product(
-                    name='Papaya-Honey Brightening Mask',
-                    category='mask',
-                    ingredients='Fresh papaya,Raw honey,Turmeric powder,Rose water',
-                    skin_types='all,dull,pigmented',
-                    benefits='Brightening,Exfoliation,Natural glow,Anti-aging',
-                    usage_instructions='Apply thick layer, leave for 15 minutes, rinse with lukewarm water',
-                    shelf_life_hours=12,
-                    price=299.0,
-                    is_active=True
-                ),
-                Product(
-                    name='Cucumber-Aloe Cooling Mask',
-                    category='mask',
-                    ingredients='Fresh cucumber,Aloe vera gel,Mint extract,Glycerin',
-                    skin_types='sensitive,oily,irritated',
-                    benefits='Soothing,Cooling,Anti-inflammatory,Hydrating',
-                    usage_instructions='Apply evenly, relax for 20 minutes, remove gently',
-                    shelf_life_hours=24,
+        filters = {
+            facet: request.args.getlist(facet)
+            for facet in PRODUCT_SEARCH_FACETS
+            if request.args.getlist(facet)
+        }
+        
+        allergies = get_user_allergies(current_user.skin_profile)
+        
+        results = search_product_catalog(
+            request.args.get('q', ''),
+            filters=filters,
+            exclude_ingredients=allergies,
+            limit=limit,
+            offset=offset
+        )
+        
+        return jsonify(results), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Product search index, rebuilt in-process whenever the catalog changes
+
+PRODUCT_SEARCH_FACETS = {
+    'ingredient': 'ingredients',
+    'benefit': 'benefits',
+    'skin_type': 'skin_types',
+    'category': 'category'
+}
+
+# Relevance weight of a query term matching each product field
+PRODUCT_SEARCH_FIELD_WEIGHTS = {
+    'name': 3.0,
+    'ingredients': 2.0,
+    'benefits': 2.0,
+    'category': 1.5,
+    'skin_types': 1.0
+}
+
+# Result sets up to this size are facet-counted product by product
+PRODUCT_SEARCH_FACET_WALK_LIMIT = 1000
+
+# Catalog caches live in each worker, so changes are also counted in a shared
+# cache_version row that workers re-read every CACHE_VERSION_CHECK_SECONDS.
+# That way a change made by another worker or by `flask import` reaches them.
+CACHE_VERSION_CHECK_SECONDS = 5
+
+catalog_state = {'version': 0}
+cache_versions = {}
+product_search_index = {'version': None}
+
+def bump_cache_version(connection, name):
+    """Count a change to a cached data set in the caller's transaction"""
+    table = CacheVersion.__table__
+    bump = table.update().where(table.c.name == name).values(version=table.c.version + 1)
+    if not connection.execute(bump).rowcount:
+        try:
+            # First change to this data set - create the counter row
+            with connection.begin_nested():
+                connection.execute(table.insert().values(name=name, version=1))
+        except IntegrityError:
+            connection.execute(bump)  # Created concurrently
+
+def get_cache_version(name):
+    """Get the shared version of a cached data set, re-read every few seconds"""
+    version, checked_at = cache_versions.get(name, (0, None))
+    if checked_at is None or time.monotonic() - checked_at > CACHE_VERSION_CHECK_SECONDS:
+        version = db.session.execute(
+            db.select(CacheVersion.version).where(CacheVersion.name == name)
+        ).scalar() or 0
+        cache_versions[name] = (version, time.monotonic())
+    return version
+
+def get_catalog_version():
+    """Get the version catalog caches are keyed on (shared and in-process changes)"""
+    return (get_cache_version('catalog'), catalog_state['version'])
+
+@db.event.listens_for(Product, 'after_insert')
+@db.event.listens_for(Product, 'after_update')
+@db.event.listens_for(Product, 'after_delete')
+def mark_catalog_changed(mapper, connection, target):
+    """Invalidate catalog-derived indexes when a product changes"""
+    catalog_state['version'] += 1
+    bump_cache_version(connection, 'catalog')
+
+def tokenize_text(text):
+    """Lowercase a text and split it into search tokens"""
+    return re.findall(r'[a-z0-9]+', text.lower()) if text else []
+
+def split_catalog_values(text):
+    """Split a comma separated product field into normalized values"""
+    return [value.strip().lower() for value in text.split(',') if value.strip()] if text else []
+
+def build_product_search_index():
+    """Build the inverted index and facet postings for active products"""
+    # Read the version first: a change made while building bumps it again
+    # and the next lookup rebuilds, instead of stamping old rows as current
+    version = get_catalog_version()
+    products = Product.query.filter_by(is_active=True).order_by(Product.id).all()
+    
+    postings = {}
+    facets = {facet: {} for facet in PRODUCT_SEARCH_FACETS}
+    product_facets = {}
+    documents = {}
+    
+    for product in products:
+        documents[product.id] = product.to_dict()
+        
+        for field, weight in PRODUCT_SEARCH_FIELD_WEIGHTS.items():
+            for token in set(tokenize_text(getattr(product, field))):
+                postings.setdefault(token, {})
+                postings[token][product.id] = postings[token].get(product.id, 0) + weight
+        
+        product_facets[product.id] = {}
+        for facet, field in PRODUCT_SEARCH_FACETS.items():
+            values = split_catalog_values(getattr(product, field))
+            product_facets[product.id][facet] = values
+            for value in values:
+                facets[facet].setdefault(value, set()).add(product.id)
+    
+    return {
+        'version': version,
+        'postings': postings,
+        'vocabulary': sorted(postings),
+        'facets': facets,
+        'product_facets': product_facets,
+        'documents': documents,
+        'all_ids': set(documents)
+    }
+
+def get_product_search_index():
+    """Get the search index, rebuilding it if the catalog has changed"""
+    global product_search_index
+    if product_search_index['version'] != get_catalog_version():
+        product_search_index = build_product_search_index()
+    return product_search_index
+
+def match_query_tokens(index, tokens):
+    """Score products containing every query token (last token as a prefix)"""
+    scores = None
+    for position, token in enumerate(tokens):
+        if position == len(tokens) - 1:
+            # Treat the last token as a prefix so search-as-you-type works
+            vocabulary = index['vocabulary']
+            start = bisect_left(vocabulary, token)
+            token_scores = {}
+            for term in vocabulary[start:]:
+                if not term.startswith(token):
+                    break
+                for product_id, score in index['postings'][term].items():
+                    token_scores[product_id] = max(token_scores.get(product_id, 0), score)
+        else:
+            token_scores = index['postings'].get(token, {})
+        
+        if scores is None:
+            scores = dict(token_scores)
+        else:
+            scores = {
+                product_id: score + token_scores[product_id]
+                for product_id, score in scores.items()
+                if product_id in token_scores
+            }
+        if not scores:
+            break
+    
+    return scores or {}
+
+def search_product_catalog(query, filters=None, exclude_ingredients=None, limit=20, offset=0):
+    """Search active products by text and facets, excluding given ingredients"""
+    index = get_product_search_index()
+    tokens = tokenize_text(query)
+    
+    if tokens:
+        scores = match_query_tokens(index, tokens)
+        candidates = set(scores)
+    else:
+        scores = None
+        candidates = set(index['all_ids'])
+    
+    for facet, values in (filters or {}).items():
+        facet_ids = set()
+        for value in values:
+            facet_ids |= index['facets'][facet].get(value.strip().lower(), set())
+        candidates &= facet_ids
+    
+    excluded = get_unsafe_product_ids(exclude_ingredients or []) & candidates
+    candidates -= excluded
+    
+    # Small result sets are counted by walking their facet values; for broad
+    # browsing, intersecting each facet value's postings is much cheaper
+    if len(candidates) <= PRODUCT_SEARCH_FACET_WALK_LIMIT:
+        facet_counts = {facet: {} for facet in PRODUCT_SEARCH_FACETS}
+        for product_id in candidates:
+            for facet, values in index['product_facets'][product_id].items():
+                counts = facet_counts[facet]
+                for value in values:
+                    counts[value] = counts.get(value, 0) + 1
+    else:
+        facet_counts = {}
+        for facet, postings in index['facets'].items():
+            counts = {}
+            for value, product_ids in postings.items():
+                count = len(product_ids & candidates)
+                if count:
+                    counts[value] = count
+            facet_counts[facet] = counts
+    
+    if scores:
+        ranked = sorted(candidates, key=lambda product_id: (-scores[product_id], product_id))
+    else:
+        ranked = sorted(candidates)
+    
+    return {
+        'products': [index['documents'][product_id] for product_id in ranked[offset:offset + limit]],
+        'total_results': len(ranked),
+        'facets': facet_counts,
+        'excluded_for_allergies': len(excluded)
+    }
+
+# Allergen exclusion index: every active product's ingredients as a bitset
+# over a normalized ingredient vocabulary, so an allergy list compiles to a
+# mask and the whole catalog is screened with one AND per product
+
+# Preparation words that don't change what an ingredient is
+INGREDIENT_DESCRIPTORS = {
+    'fresh', 'raw', 'pure', 'organic', 'natural', 'ground', 'virgin',
+    'powder', 'extract', 'juice', 'gel'
+}
+
+# Compiled allergy masks kept per index build
+ALLERGY_MASK_CACHE_SIZE = 1024
+
+allergen_index = {'version': None}
+
+def normalize_ingredient(name):
+    """Normalize an ingredient name to its vocabulary form"""
+    return ' '.join(token for token in tokenize_text(name) if token not in INGREDIENT_DESCRIPTORS)
+
+def build_allergen_index():
+    """Build the ingredient vocabulary and per-product ingredient bitsets"""
+    version = get_catalog_version()  # Before the query, as for the search index
+    products = Product.query.filter_by(is_active=True).order_by(Product.id).all()
+    
+    vocabulary = {}
+    product_ids = []
+    bitsets = []
+    
+    for product in products:
+        bits = 0
+        for ingredient in split_catalog_values(product.ingredients):
+            normalized = normalize_ingredient(ingredient)
+            if normalized:
+                bits |= 1 << vocabulary.setdefault(normalized, len(vocabulary))
+        product_ids.append(product.id)
+        bitsets.append(bits)
+    
+    return {
+        'version': version,
+        'vocabulary': vocabulary,
+        'vocabulary_tokens': {name: set(name.split()) for name in vocabulary},
+        'product_ids': product_ids,
+        'bitsets': bitsets,
+        'masks': {}
+    }
+
+def get_allergen_index():
+    """Get the allergen index, rebuilding it if the catalog has changed"""
+    global allergen_index
+    if allergen_index['version'] != get_catalog_version():
+        allergen_index = build_allergen_index()
+    return allergen_index
+
+def compile_allergy_mask(index, allergies):
+    """Compile allergies to an ingredient bitmask (an allergy matches every
+    vocabulary ingredient containing all of its words, e.g. 'rose' matches
+    'rose water')"""
+    key = frozenset(filter(None, (normalize_ingredient(allergy) for allergy in allergies)))
+    mask = index['masks'].get(key)
+    if mask is not None:
+        return mask
+    
+    mask = 0
+    for allergy in key:
+        allergy_tokens = set(allergy.split())
+        for name, ingredient_id in index['vocabulary'].items():
+            if allergy_tokens <= index['vocabulary_tokens'][name]:
+                mask |= 1 << ingredient_id
+    
+    if len(index['masks']) >= ALLERGY_MASK_CACHE_SIZE:
+        index['masks'].clear()
+    index['masks'][key] = mask
+    return mask
+
+def get_unsafe_product_ids(allergies):
+    """Get ids of active products containing any of the given allergens"""
+    if not allergies:
+        return set()
+    index = get_allergen_index()
+    mask = compile_allergy_mask(index, allergies)
+    if not mask:
+        return set()
+    return {
+        product_id
+        for product_id, bits in zip(index['product_ids'], index['bitsets'])
+        if bits & mask
+    }
+
+def get_user_allergies(skin_profile):
+    """Get the allergy list from a user's skin profile"""
+    if not skin_profile or not skin_profile.allergies:
+        return []
+    return [allergy for allergy in skin_profile.allergies.split(',') if allergy.strip()]
+
+# Ingredient and sourcing knowledge base, loaded once from a versioned data
+# file into read-only structures with the JSON responses pre-serialized
+
+INGREDIENT_KNOWLEDGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ingredient_knowledge.json')
+
+def freeze_knowledge(value):
+    """Recursively convert loaded JSON into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze_knowledge(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze_knowledge(item) for item in value)
+    return value
+
+def load_ingredient_knowledge(path=INGREDIENT_KNOWLEDGE_PATH):
+    """Load the knowledge base and pre-serialize its shared JSON fragments"""
+    with open(path, encoding='utf-8') as knowledge_file:
+        data = json.load(knowledge_file)
+    
+    knowledge = freeze_knowledge(data)
+    sourcing_info = {
+        'local_farms': data['local_farms'],
+        'organic_certification': True,
+        'fair_trade': True,
+        'seasonal_availability': data['seasonal_availability']
+    }
+    general = {
+        'common_ingredients': data['common_ingredient_benefits'],
+        'avoided_chemicals': data['avoided_chemicals'],
+        'sourcing_philosophy': data['sourcing_philosophy']
+    }
+    
+    return {
+        'version': data['version'],
+        'data': knowledge,
+        # Ingredient entries indexed by their normalized vocabulary name
+        'by_ingredient': MappingProxyType({
+            normalize_ingredient(key.replace('_', ' ')): (key, info)
+            for key, info in knowledge['ingredients'].items()
+        }),
+        'sourcing_info_json': dumps_json(sourcing_info),
+        'general_json': dumps_json(general)
+    }
+
+ingredient_knowledge = load_ingredient_knowledge()
+
+# Per-product transparency responses, dropped whenever the catalog changes
+product_transparency_cache = {'version': None, 'responses': {}}
+
+def get_detailed_ingredient_info(product):
+    """Get detailed information about product ingredients"""
+    details = {}
+    for ingredient in split_catalog_values(product.ingredients):
+        entry = ingredient_knowledge['by_ingredient'].get(normalize_ingredient(ingredient))
+        if entry:
+            key, info = entry
+            details[key] = info
+    return MappingProxyType(details)
+
+def get_product_transparency_json(product_id):
+    """Get the cached transparency response bytes for a product"""
+    catalog_version = get_catalog_version()
+    if product_transparency_cache['version'] != catalog_version:
+        product_transparency_cache['responses'] = {}
+        product_transparency_cache['version'] = catalog_version
+    
+    responses = product_transparency_cache['responses']
+    if product_id not in responses:
+        product = Product.query.get(product_id)
+        if not product:
+            return None
+        responses[product_id] = b''.join([
+            b'{"product":', dumps_json(product.to_dict()),
+            b',"ingredient_transparency":', dumps_json(get_detailed_ingredient_info(product)),
+            b',"sourcing_info":', ingredient_knowledge['sourcing_info_json'],
+            b'}'
+        ])
+    return responses[product_id]
+
+def get_local_farm_info():
+    """Get information about partner farms"""
+    return ingredient_knowledge['data']['local_farms']
+
+def get_seasonal_ingredient_info():
+    """Get seasonal availability of ingredients"""
+    return ingredient_knowledge['data']['seasonal_availability']
+
+def get_common_ingredient_benefits():
+    """Get benefits of commonly used natural ingredients"""
+    return ingredient_knowledge['data']['common_ingredient_benefits']
+
+def get_avoided_chemicals_list():
+    """List of harmful chemicals that Freskin avoids"""
+    return ingredient_knowledge['data']['avoided_chemicals']
+
+# Initialize database with sample data
+def initialize_sample_data():
+    """Initialize database with sample data"""
+    try:
+        # Create sample subscription plans
+        if not Subscription.query.first():
+            plans = [
+                Subscription(
+                    plan_type='basic',
+                    price=999.0,
+                    duration_days=30,
+                    features='Daily cleanser,Weekly mask,Basic toner',
+                    is_active=True
+                ),
+                Subscription(
+                    plan_type='premium',
+                    price=1999.0,
+                    duration_days=30,
+                    features='Full morning routine,Evening routine,Weekly treatments,Weather adaptation',
+                    is_active=True
+                ),
+                Subscription(
+                    plan_type='luxury',
+                    price=2999.0,
+                    duration_days=30,
+                    features='Complete personalized routine,Twice daily delivery,Premium ingredients,Personal skin consultant,Express delivery',
+                    is_active=True
+                )
+            ]
+            
+            for plan in plans:
+                db.session.add(plan)
+        
+        # Create sample products based on your business idea
+        if not Product.query.first():
+            products = [
+                # Face Masks
+                Product(
+                    name='Papaya-Honey Brightening Mask',
+                    category='mask',
+                    ingredients='Fresh papaya,Raw honey,Turmeric powder,Rose water',
+                    skin_types='all,dull,pigmented',
+                    benefits='Brightening,Exfoliation,Natural glow,Anti-aging',
+                    usage_instructions='Apply thick layer, leave for 15 minutes, rinse with lukewarm water',
+                    shelf_life_hours=12,
+                    price=299.0,
+                    is_active=True
+                ),
+                Product(
+                    name='Cucumber-Aloe Cooling Mask',
+                    category='mask',
+                    ingredients='Fresh cucumber,Aloe vera gel,Mint extract,Glycerin',
+                    skin_types='sensitive,oily,irritated',
+                    benefits='Soothing,Cooling,Anti-inflammatory,Hydrating',
+                    usage_instructions='Apply evenly, relax for 20 minutes, remove gently',
+                    shelf_life_hours=24,
                     price=249.0,
                     is_active=True
                 ),
@@ -903,6 +1818,39 @@ def initialize_sample_data():
             for zone in zones:
                 db.session.add(zone)
         
+        # Create sample community content
+        if not CommunityTip.query.first():
+            tips = [
+                CommunityTip(tip='Apply products on slightly damp skin for better absorption',
+                             category='application', author_name='SkincareLover23', likes=45),
+                CommunityTip(tip='Store your fresh products in the refrigerator for extra cooling effect',
+                             category='storage', author_name='FreshSkinFan', likes=38),
+                CommunityTip(tip='Use cucumber eye patches while doing your morning yoga',
+                             category='lifestyle', author_name='WellnessWarrior', likes=52),
+                CommunityTip(tip='Switch to lighter gels and hydrating mists',
+                             category='seasonal', season='summer', author_name='Freskin Team'),
+                CommunityTip(tip='Use clay masks twice a week to control oil',
+                             category='seasonal', season='summer', author_name='Freskin Team'),
+                CommunityTip(tip='Don\'t skip moisturizer even if you have oily skin',
+                             category='seasonal', season='summer', author_name='Freskin Team')
+            ]
+            
+            for tip in tips:
+                db.session.add(tip)
+        
+        if not SuccessStory.query.first():
+            stories = [
+                SuccessStory(title='My 30-day Freskin transformation',
+                             preview='From dull to glowing skin with consistent fresh products...',
+                             author_name='GlowGetter', duration='30 days', before_after=True),
+                SuccessStory(title='How I finally found products that work for sensitive skin',
+                             preview='After years of reactions, Freskin\'s gentle formulas...',
+                             author_name='SensitiveSkinSurvivor', duration='45 days', before_after=False)
+            ]
+            
+            for story in stories:
+                db.session.add(story)
+        
         db.session.commit()
         print("Sample data initialized successfully!")
         
@@ -917,21 +1865,20 @@ def get_daily_fresh_report(current_user):
     """Get today's freshness report and product availability"""
     try:
         today = datetime.now().date()
+        city = request.args.get('city', 'Mumbai')
+        # Only plain values go to the I/O pool, never this session's ORM objects
+        allergies = get_user_allergies(current_user.skin_profile) if current_user.skin_profile else None
+        
+        # The weather lookup and the recommendation query that depends on it
+        # run alongside the batch query when concurrent I/O is enabled
+        selection_future = submit_io_task(get_weather_adapted_selection, city, allergies)
         
         # Get today's fresh batches
         fresh_batches = ProductBatch.query.filter(
             db.func.date(ProductBatch.preparation_date) == today
         ).all()
         
-        # Get weather-adapted recommendations
-        city = request.args.get('city', 'Mumbai')
-        weather = get_current_weather(city)
-        
-        # Generate today's personalized selection
-        if current_user.skin_profile:
-            daily_selection = get_products_for_weather(weather, current_user.skin_profile)
-        else:
-            daily_selection = []
+        weather, daily_selection = selection_future.result()
         
         freshness_report = {
             'date': today.isoformat(),
@@ -951,7 +1898,10 @@ def get_daily_fresh_report(current_user):
         return jsonify({
             'freshness_report': freshness_report,
             'personalized_message': get_daily_freshness_message(current_user.name),
-            'next_preparation_time': get_next_preparation_schedule()
+            'next_preparation_time': get_next_preparation_schedule(
+                pincode=request.args.get('pincode') or getattr(current_user, 'pincode', None),
+                city=city
+            )
         }), 200
         
     except Exception as e:
@@ -965,28 +1915,33 @@ def skin_diary(current_user):
         try:
             data = request.get_json()
             
-            # Create a new diary entry (you might want to create a SkinDiary model)
-            diary_entry = {
-                'user_id': current_user.id,
-                'date': datetime.now().date().isoformat(),
-                'skin_condition': data.get('skin_condition'),
-                'products_used': data.get('products_used', []),
-                'skin_feeling': data.get('skin_feeling'),
-                'breakouts': data.get('breakouts', False),
-                'sensitivity': data.get('sensitivity', False),
-                'notes': data.get('notes', ''),
-                'photos': data.get('photos', []),  # For progress tracking
-                'sleep_hours': data.get('sleep_hours'),
-                'stress_level': data.get('stress_level'),
-                'water_intake': data.get('water_intake')
-            }
+            products_used = parse_diary_list(data.get('products_used'))
+            photos = parse_diary_list(data.get('photos'))  # For progress tracking
+            
+            diary_entry = SkinDiary(
+                user_id=current_user.id,
+                entry_date=datetime.now().date(),
+                skin_condition=data.get('skin_condition'),
+                products_used=products_used,
+                skin_feeling=data.get('skin_feeling'),
+                breakouts=data.get('breakouts', False),
+                sensitivity=data.get('sensitivity', False),
+                notes=data.get('notes', ''),
+                photos=photos,
+                sleep_hours=data.get('sleep_hours'),
+                stress_level=data.get('stress_level'),
+                water_intake=data.get('water_intake')
+            )
+            
+            db.session.add(diary_entry)
+            db.session.commit()
             
-            # Store in database (implement SkinDiary model if needed)
+            history = get_skin_diary_history(current_user.id)
             
             return jsonify({
                 'message': 'Diary entry saved successfully',
-                'entry_id': f"diary_{datetime.now().strftime('%Y%m%d')}",
-                'insights': generate_skin_insights(diary_entry)
+                'entry_id': diary_entry.id,
+                'insights': generate_skin_insights(history)
             }), 201
             
         except Exception as e:
@@ -994,27 +1949,27 @@ def skin_diary(current_user):
     
     else:  # GET request
         try:
+            fields = parse_fields_param(SkinDiary)
+            
             # Get diary entries for the last 30 days
-            # This would fetch from SkinDiary model
+            history = get_skin_diary_history(current_user.id)
             
-            mock_entries = [
-                {
-                    'date': (datetime.now() - timedelta(days=i)).date().isoformat(),
-                    'skin_condition': random.choice(['excellent', 'good', 'average', 'poor']),
-                    'mood': random.choice(['happy', 'neutral', 'stressed'])
-                } for i in range(7)
-            ]
+            # The nightly precomputed insights are only current if no entry
+            # was written after they were computed
+            cached = SkinInsight.query.filter_by(user_id=current_user.id).first()
+            if cached and history and cached.computed_at >= max(entry.created_at for entry in history):
+                insights = cached.to_dict()['insights']
+            else:
+                insights = generate_skin_insights(history)
             
-            return jsonify({
-                'diary_entries': mock_entries,
-                'progress_summary': {
-                    'total_entries': 45,
-                    'improvement_trend': 'positive',
-                    'consistent_days': 30,
-                    'best_performing_products': ['Aloe-Chia Gel', 'Rose Water Toner']
-                }
-            }), 200
+            return json_response({
+                'diary_entries': serialize_rows(SkinDiary, reversed(history), fields),
+                'insights': insights,
+                'progress_summary': summarize_skin_progress(current_user.id, history)
+            })
             
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -1022,59 +1977,51 @@ def skin_diary(current_user):
 def get_community_tips():
     """Get skincare tips and success stories from the community"""
     try:
+        feed_name = request.args.get('feed', 'top_daily')
+        if feed_name == 'category':
+            feed_name = f"category:{request.args.get('category', '').strip().lower()}"
+        limit = min(request.args.get('limit', COMMUNITY_FEED_PAGE_SIZE, type=int), 50)
+        
+        flush_pending_likes()
+        feeds = get_community_feeds()
+        if feed_name not in feeds['tips']:
+            return jsonify({'error': f'Unknown feed: {feed_name}'}), 400
+        
+        daily_tips, next_cursor = get_feed_page(feeds['tips'][feed_name], request.args.get('cursor'), limit)
+        
         community_content = {
-            'daily_tips': [
-                {
-                    'tip': 'Apply products on slightly damp skin for better absorption',
-                    'category': 'application',
-                    'user': 'SkincareLover23',
-                    'likes': 45
-                },
-                {
-                    'tip': 'Store your fresh products in the refrigerator for extra cooling effect',
-                    'category': 'storage',
-                    'user': 'FreshSkinFan',
-                    'likes': 38
-                },
-                {
-                    'tip': 'Use cucumber eye patches while doing your morning yoga',
-                    'category': 'lifestyle',
-                    'user': 'WellnessWarrior',
-                    'likes': 52
-                }
-            ],
-            'success_stories': [
-                {
-                    'title': 'My 30-day Freskin transformation',
-                    'preview': 'From dull to glowing skin with consistent fresh products...',
-                    'user': 'GlowGetter',
-                    'duration': '30 days',
-                    'before_after': True
-                },
-                {
-                    'title': 'How I finally found products that work for sensitive skin',
-                    'preview': 'After years of reactions, Freskin\'s gentle formulas...',
-                    'user': 'SensitiveSkinSurvivor',
-                    'duration': '45 days',
-                    'before_after': False
-                }
-            ],
+            'daily_tips': daily_tips,
+            'success_stories': get_feed_page(feeds['stories'], None, COMMUNITY_STORIES_PER_PAGE)[0],
             'seasonal_advice': {
-                'current_season': 'summer',
-                'tips': [
-                    'Switch to lighter gels and hydrating mists',
-                    'Use clay masks twice a week to control oil',
-                    'Don\'t skip moisturizer even if you have oily skin'
-                ]
+                'current_season': feeds['season'],
+                'tips': [item['tip'] for item in get_feed_page(feeds['tips']['seasonal'], None, 3)[0]]
             }
         }
         
         return jsonify({
             'community_content': community_content,
+            'next_cursor': next_cursor,
             'featured_ingredient': get_featured_ingredient_of_week(),
             'diy_tip': get_weekly_diy_tip()
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/community-tips/<kind>/<int:item_id>/like', methods=['POST'])
+@token_required
+def like_community_item(current_user, kind, item_id):
+    """Like a community tip or success story"""
+    try:
+        if kind not in COMMUNITY_LIKE_MODELS:
+            return jsonify({'error': 'Only tips and stories can be liked'}), 404
+        
+        record_like(kind, item_id)
+        
+        return jsonify({'message': 'Thanks for the love!'}), 202
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1090,40 +2037,45 @@ def referral_program(current_user):
             if not friend_email:
                 return jsonify({'error': 'Friend email is required'}), 400
             
-            # Generate referral code
-            referral_code = f"FRESH{current_user.id}{random.randint(100, 999)}"
+            referral = create_referral(current_user, friend_email)
             
             # Send referral invitation
-            send_referral_invitation(friend_email, current_user.name, referral_code)
+            send_referral_invitation(friend_email, current_user.name, referral.referral_code)
             
             return jsonify({
                 'message': 'Referral invitation sent successfully',
-                'referral_code': referral_code,
-                'reward': 'Both you and your friend get ₹200 off your next order!'
+                'referral_code': referral.referral_code,
+                'reward': f'Both you and your friend get ₹{REFERRAL_REWARD_AMOUNT} off your next order!'
             }), 200
             
         except Exception as e:
+            db.session.rollback()
             return jsonify({'error': str(e)}), 500
     
     else:  # GET request
         try:
-            referral_stats = {
-                'total_referrals': random.randint(0, 15),
-                'successful_referrals': random.randint(0, 8),
-                'pending_referrals': random.randint(0, 3),
-                'total_rewards_earned': random.randint(0, 2000),
-                'current_referral_code': f"FRESH{current_user.id}LOVE",
-                'referral_rewards': [
-                    {'friend_name': 'Sarah K.', 'reward': 200, 'date': '2024-06-10'},
-                    {'friend_name': 'Priya M.', 'reward': 200, 'date': '2024-06-08'}
-                ]
-            }
+            stats = db.session.get(ReferralStats, current_user.id)
+            referral_stats = stats.to_dict() if stats else dict(EMPTY_REFERRAL_STATS)
+            
+            # Most recent rewards, read through the referrer/status index
+            recent_rewards = Referral.query.filter_by(
+                referrer_id=current_user.id,
+                status='successful'
+            ).order_by(Referral.redeemed_at.desc()).limit(5).all()
+            
+            referral_stats['referral_rewards'] = [
+                {
+                    'friend_name': referral.referred_user.name if referral.referred_user else referral.friend_email,
+                    'reward': referral.reward_amount,
+                    'date': referral.redeemed_at.strftime('%Y-%m-%d')
+                } for referral in recent_rewards
+            ]
             
             return jsonify({
                 'referral_stats': referral_stats,
                 'program_details': {
-                    'friend_discount': '₹200 off first order',
-                    'your_reward': '₹200 credit',
+                    'friend_discount': f'₹{REFERRAL_REWARD_AMOUNT} off first order',
+                    'your_reward': f'₹{REFERRAL_REWARD_AMOUNT} credit',
                     'additional_benefits': 'Extra eco-points for both'
                 }
             }), 200
@@ -1131,44 +2083,2612 @@ def referral_program(current_user):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
-# Helper functions for the new features
+@app.route('/api/referral-program/redeem', methods=['POST'])
+@token_required
+def redeem_referral(current_user):
+    """Redeem a friend's referral code"""
+    try:
+        data = request.get_json()
+        referral_code = (data.get('referral_code') or '').strip().upper()
+        
+        if not referral_code:
+            return jsonify({'error': 'Referral code is required'}), 400
+        
+        referral, error = redeem_referral_code(referral_code, current_user)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        return jsonify({
+            'message': f'Referral applied! You get ₹{REFERRAL_REWARD_AMOUNT} off your first order',
+            'discount': referral.reward_amount
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
-def get_daily_freshness_message(user_name):
-    """Generate personalized daily freshness message"""
-    messages = [
-        f"Good morning {user_name}! Today's products were prepared at 5 AM with fresh ingredients from our partner farms.",
-        f"Hello {user_name}! Your skincare selection is ready - made with love and zero preservatives!",
-        f"Fresh morning to you {user_name}! Today's batch includes seasonal ingredients perfect for your skin.",
-        f"Rise and shine {user_name}! Your chemical-free skincare routine is prepared and on its way!"
-    ]
-    return random.choice(messages)
+@app.route('/api/orders/<int:order_id>/events', methods=['GET'])
+@token_required
+def stream_order_events(current_user, order_id):
+    """Stream order status and ETA changes as server-sent events"""
+    try:
+        if not db.session.query(Order.id).filter_by(id=order_id, user_id=current_user.id).first():
+            return jsonify({'error': 'Order not found'}), 404
+        
+        # Subscribe before reading the status: a transition committed after
+        # the read arrives as an event, and one committed before it is in the
+        # snapshot, so none is missed
+        subscription = order_event_broker.subscribe(order_event_topic(order_id))
+        try:
+            # End the request's transaction so the read sees the latest commit
+            db.session.rollback()
+            status = db.session.query(Order.status).filter_by(id=order_id).scalar()
+        except Exception:
+            order_event_broker.unsubscribe(subscription)
+            raise
+        snapshot = {'order_id': order_id, 'status': status}
+        db.session.remove()
+        
+        return app.response_class(
+            generate_order_event_stream(subscription, snapshot),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-def get_next_preparation_schedule():
-    """Get next preparation schedule information"""
-    next_prep = datetime.now() + timedelta(hours=18)  # Next day's preparation
-    return {
-        'next_preparation': next_prep.strftime('%Y-%m-%d %H:%M'),
-        'cut_off_time': (datetime.now() + timedelta(hours=2)).strftime('%H:%M'),
-        'message': 'Order by cut-off time to get tomorrow\'s fresh batch'
-    }
+@app.route('/api/orders/history', methods=['GET'])
+@token_required
+def get_order_history(current_user):
+    """Get the current user's orders, newest first"""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        before_id = request.args.get('cursor', type=int)
+        
+        query = Order.query.filter_by(user_id=current_user.id)
+        if before_id:
+            query = query.filter(Order.id < before_id)
+        orders = query.order_by(Order.id.desc()).limit(limit + 1).all()
+        
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        
+        return jsonify({
+            'orders': [order.to_dict() for order in orders],
+            'next_cursor': orders[-1].id if has_more else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-def generate_skin_insights(diary_entry):
-    """Generate insights based on skin diary entry"""
-    insights = []
-    
-    if diary_entry.get('breakouts'):
-        insights.append("Consider using our clay-neem purifying mask this week")
-    
-    if diary_entry.get('skin_feeling') == 'dry':
-        insights.append("Switch to our richer moisturizers for better hydration")
-    
-    if diary_entry.get('stress_level', 0) > 7:
-        insights.append("High stress detected - our lavender-chamomile evening routine might help")
-    
-    if diary_entry.get('sleep_hours', 8) < 6:
-        insights.append("Low sleep affects skin repair - try our overnight treatment masks")
-    
-    return insights
+@app.route('/api/admin/analytics', methods=['GET'])
+@token_required
+def get_admin_analytics(current_user):
+    """Revenue, top product and reorder analytics from the daily rollups"""
+    try:
+        if not is_admin_user(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        end_day = parse_report_date(request.args.get('to')) or datetime.utcnow().date()
+        start_day = parse_report_date(request.args.get('from')) or end_day - timedelta(days=29)
+        
+        return jsonify({
+            'from': start_day.isoformat(),
+            'to': end_day.isoformat(),
+            'analytics': get_order_analytics(start_day, end_day)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/shards', methods=['GET'])
+@token_required
+def get_shard_summary(current_user):
+    """Row counts per city shard, fanned out across every shard"""
+    try:
+        if not is_admin_user(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        counts = fan_out_to_shards(count_shard_rows)
+        totals = {}
+        for shard_counts in counts.values():
+            for table, count in shard_counts.items():
+                totals[table] = totals.get(table, 0) + count
+        
+        return jsonify({
+            'sharded_cities': get_shard_cities(),
+            'shards': counts,
+            'totals': totals
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/compression-stats', methods=['GET'])
+@token_required
+def get_compression_stats(current_user):
+    """Per-endpoint response compression ratio and CPU cost"""
+    try:
+        if not is_admin_user(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        return jsonify({'compression_stats': summarize_compression_stats()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/admission-stats', methods=['GET'])
+@token_required
+def get_admission_stats(current_user):
+    """Admitted, degraded and rejected requests per priority class"""
+    try:
+        if not is_admin_user(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        with admission_lock:
+            stats = {priority: dict(counts) for priority, counts in admission_stats.items()}
+        
+        return jsonify({
+            'admission_control_enabled': app.config['ADMISSION_CONTROL'],
+            'classes': ADMISSION_CLASSES,
+            'admission_stats': stats
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/kitchen-schedule', methods=['POST'])
+@token_required
+def plan_kitchen_schedule(current_user):
+    """Plan per-kitchen preparation timelines so batches meet their delivery slots"""
+    try:
+        if not is_admin_user(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        data = request.get_json()
+        if not data or not data.get('batches'):
+            return jsonify({'error': 'Batches are required'}), 400
+        
+        delivery_date = parse_report_date(data.get('delivery_date')) or datetime.now().date() + timedelta(days=1)
+        opens_at = (parse_import_datetime(data['opens_at']) if data.get('opens_at')
+                    else datetime.combine(delivery_date, datetime.min.time()) + timedelta(hours=KITCHEN_OPENING_HOUR))
+        
+        jobs, errors = build_preparation_jobs(data['batches'], delivery_date)
+        if errors:
+            return jsonify({'error': 'Invalid batches', 'details': errors}), 400
+        
+        kitchens = data.get('kitchens') or {job['kitchen']: KITCHEN_DEFAULT_CAPACITY for job in jobs}
+        schedule = schedule_preparation(jobs, kitchens, opens_at)
+        
+        return json_response({
+            'delivery_date': delivery_date.isoformat(),
+            'opens_at': opens_at,
+            'schedule': schedule,
+            'total_batches': len(jobs),
+            'late_batches': len(schedule['late'])
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/quality-monitoring', methods=['GET'])
+@token_required
+def get_quality_monitoring(current_user):
+    """Running quality statistics and recent anomalous batches"""
+    try:
+        if not is_admin_user(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        scope = request.args.get('scope')
+        stats_query = QualityStats.query
+        if scope:
+            stats_query = stats_query.filter_by(scope=scope)
+        
+        anomalies = QualityAnomaly.query.order_by(QualityAnomaly.detected_at.desc()).limit(
+            min(request.args.get('limit', 50, type=int), 500)
+        ).all()
+        
+        return jsonify({
+            'quality_stats': [stats.to_dict() for stats in stats_query.order_by(QualityStats.scope, QualityStats.key).all()],
+            'recent_anomalies': [anomaly.to_dict() for anomaly in anomalies],
+            'thresholds': {
+                'z_score': QUALITY_ANOMALY_Z_SCORE,
+                'min_batches': QUALITY_ANOMALY_MIN_COUNT,
+                'ewma_alpha': QUALITY_EWMA_ALPHA
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/profiler', methods=['GET', 'POST', 'DELETE'])
+@token_required
+def manage_profiler(current_user):
+    """Start a sampling window, stop it, or download its collapsed stacks"""
+    try:
+        if not is_admin_user(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            endpoint = data.get('endpoint')
+            if endpoint is not None and endpoint not in app.view_functions:
+                raise ValueError(f"Unknown endpoint: {endpoint}")
+            
+            window = start_profiling(
+                sample_rate=float(data.get('sample_rate', 0.1)),
+                endpoint=endpoint,
+                duration_seconds=int(data.get('duration_seconds', 60)),
+                interval_ms=float(data.get('interval_ms', PROFILER_DEFAULT_INTERVAL_MS))
+            )
+            return jsonify({'message': 'Profiling started', 'window': window}), 201
+        
+        if request.method == 'DELETE':
+            stop_profiling()
+            return jsonify({'message': 'Profiling stopped', 'window': profiler_summary()}), 200
+        
+        # Collapsed stacks, one 'frame;frame;frame count' line per stack, for
+        # flamegraph.pl, speedscope or inferno
+        return app.response_class(collapsed_stacks(), status=200, mimetype='text/plain')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/auth/register', methods=['POST'])
+def register_with_password():
+    """Create an account and return a token, hashing on the auth pool"""
+    try:
+        data = request.get_json() or {}
+        name = (data.get('name') or '').strip()
+        email = (data.get('email') or '').strip().lower()
+        password = data.get('password') or ''
+        if not name or not email or not password:
+            return jsonify({'error': 'Name, email and password are required'}), 400
+        if len(password) < AUTH_MIN_PASSWORD_LENGTH:
+            return jsonify({'error': f'Password must be at least {AUTH_MIN_PASSWORD_LENGTH} characters'}), 400
+        if User.query.filter(db.func.lower(User.email) == email).first():
+            return jsonify({'error': 'Email is already registered'}), 400
+        
+        user = User(name=name, email=email, password_hash=hash_user_password(password))
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'Email is already registered'}), 400
+        
+        return jsonify({'message': 'Account created', 'user_id': user.id, 'token': issue_auth_token(user)}), 201
+        
+    except auth_pool.AuthPoolBusy:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/auth/login', methods=['POST'])
+def login_with_password():
+    """Check an email and password and return a token, hashing on the auth pool"""
+    try:
+        data = request.get_json() or {}
+        email = (data.get('email') or '').strip().lower()
+        password = data.get('password') or ''
+        if not email or not password:
+            return jsonify({'error': 'Email and password are required'}), 400
+        
+        user = User.query.filter(db.func.lower(User.email) == email).first()
+        if not user or not user.password_hash or not check_user_password(user, password):
+            return jsonify({'error': 'Invalid email or password'}), 401
+        
+        return jsonify({'user_id': user.id, 'token': issue_auth_token(user)}), 200
+        
+    except auth_pool.AuthPoolBusy:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Helper functions for the new features
+
+# Concurrent I/O for endpoints that combine independent lookups. Tasks run in
+# their own app context (and so their own database session); set
+# CONCURRENT_IO to False to run them inline on the request thread. The pool
+# is shared by all request threads in a worker, so size IO_EXECUTOR_WORKERS
+# to at least gunicorn's --threads or tasks queue behind each other.
+
+IO_EXECUTOR_WORKERS = int(os.environ.get('IO_EXECUTOR_WORKERS', '16'))
+
+app.config.setdefault('CONCURRENT_IO', os.environ.get('CONCURRENT_IO', '1') != '0')
+
+io_executor = ThreadPoolExecutor(max_workers=IO_EXECUTOR_WORKERS, thread_name_prefix='freskin-io')
+
+class CompletedTask:
+    """Result holder matching Future.result() for inline execution"""
+    
+    def __init__(self, fn, *args):
+        self.value = fn(*args)
+    
+    def result(self, timeout=None):
+        return self.value
+
+def run_in_app_context(fn, *args):
+    """Run a function in a fresh app context"""
+    with app.app_context():
+        return fn(*args)
+
+def submit_io_task(fn, *args):
+    """Start an I/O-bound task, concurrently if CONCURRENT_IO is enabled"""
+    if not app.config['CONCURRENT_IO']:
+        return CompletedTask(fn, *args)
+    return io_executor.submit(run_in_app_context, fn, *args)
+
+def get_weather_adapted_selection(city, allergies):
+    """Get the weather for a city and products suited to it (allergies is None without a skin profile)"""
+    weather = get_current_weather(city)
+    daily_selection = get_weather_products(weather, allergies) if allergies is not None else []
+    return weather, daily_selection
+
+def get_daily_freshness_message(user_name):
+    """Generate personalized daily freshness message"""
+    messages = [
+        f"Good morning {user_name}! Today's products were prepared at 5 AM with fresh ingredients from our partner farms.",
+        f"Hello {user_name}! Your skincare selection is ready - made with love and zero preservatives!",
+        f"Fresh morning to you {user_name}! Today's batch includes seasonal ingredients perfect for your skin.",
+        f"Rise and shine {user_name}! Your chemical-free skincare routine is prepared and on its way!"
+    ]
+    return random.choice(messages)
+
+def get_next_preparation_schedule(pincode=None, city=None):
+    """Get next preparation schedule information"""
+    cutoff = get_order_cutoff(pincode=pincode, city=city)
+    if not cutoff:
+        return {
+            'next_preparation': None,
+            'cut_off_time': None,
+            'message': 'We don\'t deliver to this area yet'
+        }
+    
+    return {
+        'next_preparation': cutoff['preparation_start'].strftime('%Y-%m-%d %H:%M'),
+        'cut_off_time': cutoff['cut_off'].strftime('%H:%M'),
+        'cut_off': cutoff['cut_off'].strftime('%Y-%m-%d %H:%M'),
+        'delivery_slot': cutoff['slot'],
+        'delivery_window': f"{cutoff['delivery_start'].strftime('%H:%M')}-{cutoff['delivery_end'].strftime('%H:%M')}",
+        'zone': cutoff['zone_name'],
+        'message': f"Order by {cutoff['cut_off'].strftime('%I:%M %p')} to get your {cutoff['slot']} fresh batch"
+    }
+
+# Skin insight rules are declared as data and evaluated over columns of the
+# diary history. 'window' is in days, counted back from the latest entry.
+SKIN_INSIGHT_LOOKBACK_DAYS = 30
+
+SKIN_INSIGHT_RULES = [
+    {'column': 'breakouts', 'window': 1, 'agg': 'last', 'op': '>=', 'threshold': 1,
+     'message': "Consider using our clay-neem purifying mask this week"},
+    {'column': 'dry_feeling', 'window': 1, 'agg': 'last', 'op': '>=', 'threshold': 1,
+     'message': "Switch to our richer moisturizers for better hydration"},
+    {'column': 'stress_level', 'window': 1, 'agg': 'last', 'op': '>', 'threshold': 7,
+     'message': "High stress detected - our lavender-chamomile evening routine might help"},
+    {'column': 'sleep_hours', 'window': 1, 'agg': 'last', 'op': '<', 'threshold': 6,
+     'message': "Low sleep affects skin repair - try our overnight treatment masks"},
+    {'column': 'breakouts', 'window': 7, 'agg': 'mean', 'op': '>=', 'threshold': 0.4,
+     'message': "Breakouts on {value:.0%} of days this week - add a weekly clay mask and keep cleansing gentle"},
+    {'column': 'sensitivity', 'window': 7, 'agg': 'mean', 'op': '>=', 'threshold': 0.4,
+     'message': "Frequent sensitivity this week - we recommend our fragrance-free soothing range"},
+    {'column': 'stress_level', 'window': 7, 'agg': 'mean', 'op': '>', 'threshold': 6,
+     'message': "Your stress has stayed high all week ({value:.1f}/10 on average) - skin often reacts a few days later"},
+    {'column': 'sleep_hours', 'window': 7, 'agg': 'mean', 'op': '<', 'threshold': 6.5,
+     'message': "You averaged {value:.1f} hours of sleep this week - aim for 7+ to support overnight repair"},
+    {'column': 'water_intake', 'window': 7, 'agg': 'mean', 'op': '<', 'threshold': 2,
+     'message': "Water intake is low this week ({value:.1f} L/day) - hydration shows up in your skin"},
+]
+
+# Flag a product when the reaction rate on days it was used is 'lift' times
+# the user's overall rate, over at least 'min_uses' diary days.
+PRODUCT_CORRELATION_RULES = [
+    {'column': 'breakouts', 'min_uses': 3, 'lift': 1.5,
+     'message': "Breakouts happened on {rate:.0%} of days you used {product} - try pausing it for a week"},
+    {'column': 'sensitivity', 'min_uses': 3, 'lift': 1.5,
+     'message': "Sensitivity showed up on {rate:.0%} of days you used {product} - consider a patch test"},
+]
+
+INSIGHT_COMPARATORS = {
+    '>': lambda value, threshold: value > threshold,
+    '>=': lambda value, threshold: value >= threshold,
+    '<': lambda value, threshold: value < threshold,
+    '<=': lambda value, threshold: value <= threshold,
+}
+
+def get_skin_diary_history(user_id, days=SKIN_INSIGHT_LOOKBACK_DAYS):
+    """Get a user's diary entries for the lookback window, oldest first"""
+    since = datetime.now().date() - timedelta(days=days)
+    return SkinDiary.query.filter(
+        SkinDiary.user_id == user_id,
+        SkinDiary.entry_date >= since
+    ).order_by(SkinDiary.entry_date, SkinDiary.id).all()
+
+def parse_diary_list(value):
+    """Store a list or a comma separated string of names as comma separated text"""
+    if not value:
+        return ''
+    items = value.split(',') if isinstance(value, str) else value
+    return ','.join(name for name in (str(item).strip() for item in items) if name)
+
+def split_diary_list(text):
+    """Split stored comma separated names, dropping surrounding whitespace"""
+    return [name.strip() for name in text.split(',') if name.strip()] if text else []
+
+def build_diary_columns(entries):
+    """Turn diary entries (oldest first) into per-field columns"""
+    return {
+        'date': [entry.entry_date for entry in entries],
+        'breakouts': [1 if entry.breakouts else 0 for entry in entries],
+        'sensitivity': [1 if entry.sensitivity else 0 for entry in entries],
+        'dry_feeling': [1 if entry.skin_feeling == 'dry' else 0 for entry in entries],
+        'stress_level': [entry.stress_level for entry in entries],
+        'sleep_hours': [entry.sleep_hours for entry in entries],
+        'water_intake': [entry.water_intake for entry in entries],
+        'products_used': [split_diary_list(entry.products_used) for entry in entries]
+    }
+
+def aggregate_window(values, agg):
+    """Aggregate a column window, ignoring missing values"""
+    present = [value for value in values if value is not None]
+    if not present:
+        return None
+    if agg == 'last':
+        return values[-1]
+    if agg == 'mean':
+        return sum(present) / len(present)
+    if agg == 'max':
+        return max(present)
+    if agg == 'min':
+        return min(present)
+    raise ValueError(f"Unknown aggregation: {agg}")
+
+def evaluate_insight_rules(columns, rules=SKIN_INSIGHT_RULES):
+    """Evaluate windowed threshold rules over diary columns"""
+    dates = columns['date']
+    if not dates:
+        return []
+    
+    insights = []
+    window_starts = {}
+    for rule in rules:
+        window = rule['window']
+        if window not in window_starts:
+            window_starts[window] = bisect_left(dates, dates[-1] - timedelta(days=window - 1))
+        value = aggregate_window(columns[rule['column']][window_starts[window]:], rule['agg'])
+        if value is not None and INSIGHT_COMPARATORS[rule['op']](value, rule['threshold']):
+            insights.append(rule['message'].format(value=value))
+    
+    return insights
+
+def evaluate_product_correlations(columns, rules=PRODUCT_CORRELATION_RULES):
+    """Find products whose usage lines up with breakouts or sensitivity"""
+    total_days = len(columns['date'])
+    if not total_days:
+        return []
+    
+    # Products are matched case-insensitively and reported as first written
+    usage = {}
+    names = {}
+    for day, products in enumerate(columns['products_used']):
+        for key in {product.lower() for product in products}:
+            usage.setdefault(key, []).append(day)
+        for product in products:
+            names.setdefault(product.lower(), product)
+    
+    insights = []
+    for rule in rules:
+        reactions = columns[rule['column']]
+        base_rate = sum(reactions) / total_days
+        if not base_rate:
+            continue
+        for key, days in sorted(usage.items()):
+            if len(days) < rule['min_uses']:
+                continue
+            rate = sum(reactions[day] for day in days) / len(days)
+            if rate >= base_rate * rule['lift']:
+                insights.append(rule['message'].format(product=names[key], rate=rate))
+    
+    return insights
+
+def generate_skin_insights(history):
+    """Generate insights from a user's skin diary history (oldest first)"""
+    columns = build_diary_columns(history)
+    return evaluate_insight_rules(columns) + evaluate_product_correlations(columns)
+
+def summarize_skin_progress(user_id, history):
+    """Summarize skin diary progress over the lookback window"""
+    scores = {'excellent': 4, 'good': 3, 'average': 2, 'poor': 1}
+    condition_scores = [scores[entry.skin_condition] for entry in history if entry.skin_condition in scores]
+    
+    trend = 'not enough data'
+    if len(condition_scores) >= 4:
+        half = len(condition_scores) // 2
+        earlier = sum(condition_scores[:half]) / half
+        recent = sum(condition_scores[half:]) / (len(condition_scores) - half)
+        trend = 'positive' if recent > earlier else 'negative' if recent < earlier else 'stable'
+    
+    product_counts = {}
+    names = {}
+    for entry in history:
+        if entry.skin_condition in ('excellent', 'good'):
+            for name in split_diary_list(entry.products_used):
+                product_counts[name.lower()] = product_counts.get(name.lower(), 0) + 1
+                names.setdefault(name.lower(), name)
+    
+    return {
+        'total_entries': SkinDiary.query.filter_by(user_id=user_id).count(),
+        'improvement_trend': trend,
+        'consistent_days': len(set(entry.entry_date for entry in history)),
+        'best_performing_products': [
+            names[key] for key in sorted(product_counts, key=product_counts.get, reverse=True)[:2]
+        ]
+    }
+
+def precompute_skin_insights():
+    """Nightly job: compute insights for every user in one pass over the diary"""
+    since = datetime.now().date() - timedelta(days=SKIN_INSIGHT_LOOKBACK_DAYS)
+    entries = SkinDiary.query.filter(
+        SkinDiary.entry_date >= since
+    ).order_by(SkinDiary.user_id, SkinDiary.entry_date, SkinDiary.id).all()
+    
+    existing = {insight.user_id: insight for insight in SkinInsight.query.all()}
+    computed_at = datetime.utcnow()
+    users_processed = 0
+    
+    for user_id, user_entries in groupby(entries, key=lambda entry: entry.user_id):
+        history = list(user_entries)
+        insight = existing.get(user_id) or SkinInsight(user_id=user_id)
+        insight.insights = json.dumps(generate_skin_insights(history))
+        insight.entries_analysed = len(history)
+        insight.computed_at = computed_at
+        db.session.add(insight)
+        users_processed += 1
+        existing.pop(user_id, None)
+    
+    # Users with no recent entries no longer have current insights
+    for stale in existing.values():
+        db.session.delete(stale)
+    
+    db.session.commit()
+    return users_processed
+
+@app.cli.command('precompute-skin-insights')
+def precompute_skin_insights_command():
+    """Precompute skin diary insights for all users (run nightly)"""
+    users_processed = precompute_skin_insights()
+    print(f"Skin insights precomputed for {users_processed} users")
+
+# Community feeds: likes are buffered in-process and applied as one coalesced
+# increment per item by a background flusher in each worker (and at exit),
+# and ranked feeds are recomputed periodically
+
+COMMUNITY_FEED_REFRESH_SECONDS = 300
+COMMUNITY_LIKE_FLUSH_SECONDS = 10
+COMMUNITY_LIKE_FLUSH_SIZE = 500
+COMMUNITY_FEED_PAGE_SIZE = 10
+COMMUNITY_STORIES_PER_PAGE = 5
+COMMUNITY_TOP_DAILY_DAYS = 1
+COMMUNITY_FEED_MAX_ITEMS = 500
+
+COMMUNITY_LIKE_MODELS = {'tips': CommunityTip, 'stories': SuccessStory}
+
+SEASON_BY_MONTH = {
+    12: 'winter', 1: 'winter', 2: 'spring', 3: 'spring', 4: 'summer', 5: 'summer',
+    6: 'monsoon', 7: 'monsoon', 8: 'monsoon', 9: 'monsoon', 10: 'winter', 11: 'winter'
+}
+
+pending_likes = {'counts': {}, 'since': time.monotonic(), 'lock': threading.Lock()}
+like_flusher = {'pid': None}
+community_feeds = {'computed_at': None}
+
+def get_current_season():
+    """Get the current Indian season"""
+    return SEASON_BY_MONTH[datetime.now().month]
+
+def get_latest_season_with_tips(tips):
+    """Get the current season, or the most recent earlier one that has tips"""
+    seasons = set(tip.season for tip in tips)
+    month = datetime.now().month
+    for months_back in range(12):
+        season = SEASON_BY_MONTH[(month - months_back - 1) % 12 + 1]
+        if season in seasons:
+            return season
+    return get_current_season()
+
+def start_like_flusher():
+    """Start this worker's background like flusher (once per process, after fork)"""
+    if like_flusher['pid'] == os.getpid():
+        return
+    with pending_likes['lock']:
+        if like_flusher['pid'] == os.getpid():
+            return
+        like_flusher['pid'] = os.getpid()
+    threading.Thread(target=flush_likes_periodically, name='freskin-like-flusher', daemon=True).start()
+    atexit.register(run_in_app_context, flush_pending_likes, True)
+
+def flush_likes_periodically():
+    """Flusher loop: apply buffered likes every COMMUNITY_LIKE_FLUSH_SECONDS"""
+    while True:
+        time.sleep(COMMUNITY_LIKE_FLUSH_SECONDS)
+        try:
+            run_in_app_context(flush_pending_likes, True)
+        except Exception as e:
+            print(f"Error flushing community likes: {e}")
+
+def record_like(kind, item_id):
+    """Buffer a like to be applied in the next batched flush"""
+    start_like_flusher()
+    with pending_likes['lock']:
+        key = (kind, item_id)
+        pending_likes['counts'][key] = pending_likes['counts'].get(key, 0) + 1
+        due = len(pending_likes['counts']) >= COMMUNITY_LIKE_FLUSH_SIZE
+    if due:
+        flush_pending_likes(force=True)
+
+def flush_pending_likes(force=False):
+    """Apply buffered likes with one executemany UPDATE per item type"""
+    with pending_likes['lock']:
+        age = time.monotonic() - pending_likes['since']
+        if not pending_likes['counts'] or (not force and age < COMMUNITY_LIKE_FLUSH_SECONDS):
+            return 0
+        counts = pending_likes['counts']
+        pending_likes['counts'] = {}
+        pending_likes['since'] = time.monotonic()
+    
+    try:
+        for kind, model in COMMUNITY_LIKE_MODELS.items():
+            params = [
+                {'item_id': item_id, 'delta': delta}
+                for (item_kind, item_id), delta in counts.items()
+                if item_kind == kind
+            ]
+            if params:
+                table = model.__table__
+                db.session.execute(
+                    table.update()
+                    .where(table.c.id == db.bindparam('item_id'))
+                    .values(likes=table.c.likes + db.bindparam('delta')),
+                    params
+                )
+        db.session.commit()
+    except Exception:
+        # Put the likes back so the next flush retries them
+        db.session.rollback()
+        with pending_likes['lock']:
+            for key, delta in counts.items():
+                pending_likes['counts'][key] = pending_likes['counts'].get(key, 0) + delta
+        raise
+    return sum(counts.values())
+
+def build_ranked_feed(items):
+    """Rank feed items by likes (newest first on ties) for keyset paging"""
+    ranked = sorted(items, key=lambda item: (-item.likes, -item.id))[:COMMUNITY_FEED_MAX_ITEMS]
+    return {
+        'keys': [(-item.likes, -item.id) for item in ranked],
+        'items': [item.to_dict() for item in ranked]
+    }
+
+def refresh_community_feeds():
+    """Recompute all ranked community feeds into the cache"""
+    global community_feeds
+    tips = CommunityTip.query.filter_by(is_active=True).all()
+    stories = SuccessStory.query.filter_by(is_active=True).all()
+    season = get_latest_season_with_tips(tips)
+    
+    recent_since = datetime.utcnow() - timedelta(days=COMMUNITY_TOP_DAILY_DAYS)
+    recent_tips = [tip for tip in tips if tip.created_at >= recent_since]
+    
+    tip_feeds = {
+        # Fall back to all-time favourites on days with no new tips
+        'top_daily': build_ranked_feed(recent_tips or tips),
+        'seasonal': build_ranked_feed([tip for tip in tips if tip.season == season])
+    }
+    for category in set(tip.category for tip in tips):
+        tip_feeds[f"category:{category}"] = build_ranked_feed([tip for tip in tips if tip.category == category])
+    
+    community_feeds = {
+        'computed_at': time.monotonic(),
+        'season': season,
+        'tips': tip_feeds,
+        'stories': build_ranked_feed(stories)
+    }
+    return community_feeds
+
+def get_community_feeds():
+    """Get the cached community feeds, recomputing them when stale"""
+    computed_at = community_feeds['computed_at']
+    if computed_at is None or time.monotonic() - computed_at > COMMUNITY_FEED_REFRESH_SECONDS:
+        return refresh_community_feeds()
+    return community_feeds
+
+def get_feed_page(feed, cursor, limit):
+    """Get the page of a ranked feed after a keyset cursor ('likes.id')"""
+    start = 0
+    if cursor:
+        try:
+            likes, item_id = (int(part) for part in cursor.split('.'))
+        except ValueError:
+            raise ValueError('Invalid cursor')
+        start = bisect_right(feed['keys'], (-likes, -item_id))
+    
+    page = feed['items'][start:start + limit]
+    next_cursor = None
+    if start + limit < len(feed['items']) and page:
+        next_cursor = f"{page[-1]['likes']}.{page[-1]['id']}"
+    return page, next_cursor
+
+# Order tracking events: status transitions are published after commit to an
+# in-process broker that fans out to every open event stream for the order
+
+ORDER_EVENT_HEARTBEAT_SECONDS = 15
+ORDER_EVENT_STREAM_MAX_SECONDS = 3 * 60 * 60
+ORDER_EVENT_QUEUE_SIZE = 32
+ORDER_TERMINAL_STATUSES = {'delivered', 'cancelled'}
+
+class InProcessEventBroker:
+    """Topic fan-out to subscriber queues within this worker process"""
+    
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+    
+    def subscribe(self, topic):
+        subscription = queue.Queue(maxsize=ORDER_EVENT_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.setdefault(topic, set()).add(subscription)
+        return (topic, subscription)
+    
+    def unsubscribe(self, subscription):
+        topic, events = subscription
+        with self.lock:
+            topic_subscribers = self.subscribers.get(topic)
+            if topic_subscribers:
+                topic_subscribers.discard(events)
+                if not topic_subscribers:
+                    del self.subscribers[topic]
+    
+    def publish(self, topic, event):
+        with self.lock:
+            topic_subscribers = list(self.subscribers.get(topic, ()))
+        for events in topic_subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass  # A stalled client resyncs from the snapshot when it reconnects
+        return len(topic_subscribers)
+    
+    def get(self, subscription, timeout):
+        try:
+            return subscription[1].get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+# Swap with set_order_event_broker() for a broker shared between workers
+order_event_broker = InProcessEventBroker()
+
+def set_order_event_broker(broker):
+    """Replace the broker used for order tracking events"""
+    global order_event_broker
+    order_event_broker = broker
+
+def order_event_topic(order_id):
+    """Get the broker topic for an order"""
+    return f"order:{order_id}"
+
+def publish_order_eta(order_id, eta):
+    """Push a new delivery ETA to everyone tracking an order"""
+    return order_event_broker.publish(order_event_topic(order_id), {
+        'type': 'eta',
+        'order_id': order_id,
+        'eta': eta.isoformat() if isinstance(eta, datetime) else eta
+    })
+
+@db.event.listens_for(Order, 'after_update')
+def queue_order_status_event(mapper, connection, target):
+    """Remember status transitions so they're published once committed"""
+    if db.inspect(target).attrs.status.history.has_changes():
+        session = db.object_session(target)
+        session.info.setdefault('order_events', []).append({
+            'type': 'status',
+            'order_id': target.id,
+            'status': target.status,
+            'updated_at': datetime.utcnow().isoformat()
+        })
+
+@db.event.listens_for(db.session, 'after_commit')
+def publish_order_status_events(session):
+    """Publish committed order status transitions"""
+    for event in session.info.pop('order_events', []):
+        order_event_broker.publish(order_event_topic(event['order_id']), event)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_order_status_events(session):
+    """Drop status transitions that were rolled back"""
+    session.info.pop('order_events', None)
+
+def format_server_sent_event(event):
+    """Format an event for a text/event-stream response"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def generate_order_event_stream(subscription, snapshot):
+    """Yield the current status, then every change until the order is done"""
+    try:
+        yield format_server_sent_event(dict(snapshot, type='status'))
+        if snapshot['status'] in ORDER_TERMINAL_STATUSES:
+            return
+        
+        deadline = time.monotonic() + ORDER_EVENT_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            event = order_event_broker.get(subscription, ORDER_EVENT_HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_server_sent_event(event)
+            if event['type'] == 'status' and event['status'] in ORDER_TERMINAL_STATUSES:
+                return
+    finally:
+        order_event_broker.unsubscribe(subscription)
+
+# Admin access and order analytics. Analytics read only the daily rollup
+# tables. Each refresh rebuilds whole days: every day with rows added since
+# the id watermark, plus the last ROLLUP_RESCAN_DAYS days, so orders whose
+# ids commit out of order and later cancellations are picked up. Older
+# status changes need a run with a larger --rescan-days. Rollups degrade
+# when the core Order model lacks a column they report on: orders fall under
+# the 'unknown' zone or 'one-time' plan, every status counts, revenue comes
+# from the order items, and without created_at only feedback is rolled up.
+
+ROLLUP_CHUNK_SIZE = 1000
+ROLLUP_RESCAN_DAYS = 3
+ROLLUP_EXCLUDED_ORDER_STATUSES = ('cancelled',)
+# The Order columns the rollups report on (see above for when one is missing)
+ORDER_ROLLUP_COLUMNS = ('created_at', 'status', 'total_amount', 'delivery_pincode', 'plan_type')
+
+app.config.setdefault('ADMIN_EMAILS', {
+    email.strip().lower() for email in os.environ.get('FRESKIN_ADMIN_EMAILS', '').split(',') if email.strip()
+})
+
+def is_admin_user(user):
+    """Check whether a user may use admin endpoints"""
+    return bool(getattr(user, 'is_admin', False)) or (user.email or '').lower() in app.config['ADMIN_EMAILS']
+
+def parse_report_date(value):
+    """Parse a YYYY-MM-DD report date"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+def get_rollup_watermark(name):
+    """Get (creating if needed) the watermark for a rollup source"""
+    watermark = RollupWatermark.query.get(name)
+    if not watermark:
+        watermark = RollupWatermark(name=name, last_id=0)
+        db.session.add(watermark)
+    return watermark
+
+def get_zones_by_pincode():
+    """Map every served pincode to its delivery zone name"""
+    zones_by_pincode = {}
+    for zone in DeliveryZone.query.all():
+        for pincode in zone.pincode_range.split(','):
+            zones_by_pincode[pincode.strip()] = zone.zone_name
+    return zones_by_pincode
+
+def check_order_rollup_columns():
+    """Get the Order columns the rollups report on that the core model lacks, warning about them"""
+    missing = [name for name in ORDER_ROLLUP_COLUMNS if name not in Order.__table__.columns]
+    if missing:
+        app.logger.warning("Order rollups are degraded, the Order model has no %s column(s)", ', '.join(missing))
+    return missing
+
+def get_order_rollup_column(name):
+    """Get an Order column the rollups report on, or NULL when the core model lacks it"""
+    columns = Order.__table__.columns
+    return columns[name] if name in columns else db.null()
+
+def add_to_rollup(model, key_columns, key, increments):
+    """Add increments to a rollup row, creating it if needed"""
+    row = model.query.filter_by(**dict(zip(key_columns, key))).first()
+    if not row:
+        row = model(**dict(zip(key_columns, key)), **{column: 0 for column in increments})
+        db.session.add(row)
+    for column, amount in increments.items():
+        setattr(row, column, getattr(row, column) + amount)
+
+def collect_days_after_watermark(model, watermark):
+    """Get the days of rows added since a watermark, the row count and the new highest id"""
+    days = set()
+    count = 0
+    last_id = watermark.last_id
+    while True:
+        rows = db.session.query(model.id, model.created_at).filter(
+            model.id > last_id
+        ).order_by(model.id).limit(ROLLUP_CHUNK_SIZE).all()
+        if not rows:
+            break
+        days.update(created_at.date() for _, created_at in rows)
+        count += len(rows)
+        last_id = rows[-1][0]
+    return days, count, last_id
+
+def get_rollup_key(pincode, plan_type, zones_by_pincode):
+    """Get the (zone, plan) an order is reported under"""
+    zone = zones_by_pincode.get(str(pincode).strip(), 'unknown') if pincode else 'unknown'
+    return zone, plan_type or 'one-time'
+
+def counted_orders_on(day):
+    """Filter for the orders created on a day that count towards revenue"""
+    start = datetime.combine(day, datetime.min.time())
+    status = get_order_rollup_column('status')
+    return db.and_(
+        Order.created_at >= start,
+        Order.created_at < start + timedelta(days=1),
+        db.or_(status.is_(None), status.notin_(ROLLUP_EXCLUDED_ORDER_STATUSES))
+    )
+
+def rebuild_order_rollups_for_day(day, zones_by_pincode):
+    """Recompute one day's revenue and product rollups from its orders"""
+    pincode_column = get_order_rollup_column('delivery_pincode')
+    plan_column = get_order_rollup_column('plan_type')
+    has_order_totals = 'total_amount' in Order.__table__.columns
+    
+    revenue_rows = {}
+    order_totals = db.session.query(
+        pincode_column, plan_column, db.func.count(Order.id), db.func.sum(get_order_rollup_column('total_amount'))
+    ).select_from(Order).filter(counted_orders_on(day)).group_by(pincode_column, plan_column).all()
+    for pincode, plan_type, order_count, revenue in order_totals:
+        key = get_rollup_key(pincode, plan_type, zones_by_pincode)
+        totals = revenue_rows.setdefault(key, {'order_count': 0, 'item_count': 0, 'revenue': 0.0})
+        totals['order_count'] += order_count
+        totals['revenue'] += revenue or 0.0
+    
+    item_totals = db.session.query(
+        pincode_column, plan_column, db.func.sum(OrderItem.quantity), db.func.sum(OrderItem.price * OrderItem.quantity)
+    ).select_from(Order).join(OrderItem, OrderItem.order_id == Order.id).filter(
+        counted_orders_on(day)
+    ).group_by(pincode_column, plan_column).all()
+    for pincode, plan_type, quantity, item_revenue in item_totals:
+        totals = revenue_rows[get_rollup_key(pincode, plan_type, zones_by_pincode)]
+        totals['item_count'] += quantity or 0
+        if not has_order_totals:
+            totals['revenue'] += item_revenue or 0.0
+    
+    product_totals = db.session.query(
+        OrderItem.product_id, db.func.sum(OrderItem.quantity), db.func.sum(OrderItem.price * OrderItem.quantity)
+    ).join(Order, Order.id == OrderItem.order_id).filter(
+        counted_orders_on(day)
+    ).group_by(OrderItem.product_id).all()
+    
+    DailyRevenueRollup.query.filter_by(day=day).delete()
+    DailyProductRollup.query.filter_by(day=day).delete()
+    db.session.add_all([
+        DailyRevenueRollup(day=day, zone=zone, plan_type=plan_type, **totals)
+        for (zone, plan_type), totals in revenue_rows.items()
+    ])
+    db.session.add_all([
+        DailyProductRollup(day=day, product_id=product_id, quantity=quantity or 0, revenue=revenue or 0.0)
+        for product_id, quantity, revenue in product_totals
+    ])
+
+def rebuild_feedback_rollup_for_day(day):
+    """Recompute one day's feedback and reorder counts"""
+    start = datetime.combine(day, datetime.min.time())
+    feedback_count, reorder_count = db.session.query(
+        db.func.count(UserFeedback.id),
+        db.func.coalesce(db.func.sum(db.case((UserFeedback.would_reorder == True, 1), else_=0)), 0)
+    ).filter(
+        UserFeedback.created_at >= start,
+        UserFeedback.created_at < start + timedelta(days=1)
+    ).one()
+    
+    DailyFeedbackRollup.query.filter_by(day=day).delete()
+    if feedback_count:
+        db.session.add(DailyFeedbackRollup(day=day, feedback_count=feedback_count, reorder_count=reorder_count))
+
+def refresh_order_rollups(rescan_days=ROLLUP_RESCAN_DAYS):
+    """Rebuild the rollups of recent days and of days with rows added since the last run"""
+    missing_columns = check_order_rollup_columns()
+    zones_by_pincode = get_zones_by_pincode()
+    today = datetime.utcnow().date()
+    recent_days = {today - timedelta(days=offset) for offset in range(rescan_days + 1)}
+    
+    # Orders can't be put on a day without created_at
+    order_days, new_orders = set(), 0
+    if 'created_at' not in missing_columns:
+        order_watermark = get_rollup_watermark('order')
+        order_days, new_orders, last_order_id = collect_days_after_watermark(Order, order_watermark)
+        for day in sorted(order_days | recent_days):
+            rebuild_order_rollups_for_day(day, zones_by_pincode)
+            db.session.commit()  # One day per transaction
+        order_watermark.last_id = last_order_id
+        db.session.commit()
+    
+    feedback_watermark = get_rollup_watermark('user_feedback')
+    feedback_days, _, last_feedback_id = collect_days_after_watermark(UserFeedback, feedback_watermark)
+    for day in sorted(feedback_days | recent_days):
+        rebuild_feedback_rollup_for_day(day)
+        db.session.commit()
+    feedback_watermark.last_id = last_feedback_id
+    db.session.commit()
+    
+    return {
+        'days_rebuilt': len(order_days | recent_days),
+        'new_orders': new_orders,
+        'missing_columns': missing_columns
+    }
+
+def get_order_analytics(start_day, end_day):
+    """Aggregate the daily rollups over a date range"""
+    revenue_rows = DailyRevenueRollup.query.filter(
+        DailyRevenueRollup.day >= start_day,
+        DailyRevenueRollup.day <= end_day
+    ).all()
+    
+    by_day, by_zone, by_plan = {}, {}, {}
+    for row in revenue_rows:
+        for totals, key in ((by_day, row.day.isoformat()), (by_zone, row.zone), (by_plan, row.plan_type)):
+            entry = totals.setdefault(key, {'orders': 0, 'revenue': 0.0})
+            entry['orders'] += row.order_count
+            entry['revenue'] += row.revenue
+    
+    top_products = db.session.query(
+        DailyProductRollup.product_id,
+        Product.name,
+        db.func.sum(DailyProductRollup.quantity).label('quantity'),
+        db.func.sum(DailyProductRollup.revenue).label('revenue')
+    ).join(Product, Product.id == DailyProductRollup.product_id).filter(
+        DailyProductRollup.day >= start_day,
+        DailyProductRollup.day <= end_day
+    ).group_by(DailyProductRollup.product_id, Product.name).order_by(db.desc('revenue')).limit(10).all()
+    
+    feedback = db.session.query(
+        db.func.coalesce(db.func.sum(DailyFeedbackRollup.feedback_count), 0),
+        db.func.coalesce(db.func.sum(DailyFeedbackRollup.reorder_count), 0)
+    ).filter(
+        DailyFeedbackRollup.day >= start_day,
+        DailyFeedbackRollup.day <= end_day
+    ).one()
+    
+    return {
+        'revenue_by_day': by_day,
+        'revenue_by_zone': by_zone,
+        'revenue_by_plan': by_plan,
+        'top_products': [
+            {'product_id': product_id, 'name': name, 'quantity': quantity, 'revenue': revenue}
+            for product_id, name, quantity, revenue in top_products
+        ],
+        'reorder_rate': feedback[1] / feedback[0] if feedback[0] else None,
+        'feedback_count': feedback[0]
+    }
+
+@app.cli.command('refresh-order-rollups')
+@click.option('--rescan-days', default=ROLLUP_RESCAN_DAYS, show_default=True, help='Recent days to rebuild on every run')
+def refresh_order_rollups_command(rescan_days):
+    """Rebuild the daily analytics rollups for new and recent days"""
+    stats = refresh_order_rollups(rescan_days)
+    print(f"Order rollups refreshed ({stats['new_orders']} new orders, {stats['days_rebuilt']} days rebuilt)")
+    if stats['missing_columns']:
+        print(f"Degraded: the Order model has no {', '.join(stats['missing_columns'])} column(s)")
+
+# Columnar exports for the data team. Tables are streamed in id order, one
+# chunk at a time, so memory use doesn't grow with table size. Tables with a
+# modification timestamp (updated_at, or created_at for append-only tables)
+# are exported incrementally: a watermark file next to the output records
+# the newest timestamp exported, and each run goes back EXPORT_OVERLAP from
+# it so rows committed late with an earlier timestamp are still picked up.
+# A row can then appear in more than one file; the newest file's copy wins.
+# Rows of other tables change in place, so every run exports them in full.
+
+EXPORT_TABLES = {
+    'order': Order,
+    'order_item': OrderItem,
+    'product_batch': ProductBatch,
+    'user_feedback': UserFeedback
+}
+
+# Tables whose rows are never changed once written
+EXPORT_APPEND_ONLY_TABLES = {'user_feedback'}
+
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_OVERLAP = timedelta(minutes=15)
+
+def get_arrow_type(column):
+    """Map a SQLAlchemy column type to an Arrow type"""
+    import pyarrow
+    
+    if isinstance(column.type, db.Boolean):
+        return pyarrow.bool_()
+    if isinstance(column.type, db.Integer):
+        return pyarrow.int64()
+    if isinstance(column.type, db.Float):
+        return pyarrow.float64()
+    if isinstance(column.type, db.DateTime):
+        return pyarrow.timestamp('us')
+    if isinstance(column.type, db.Date):
+        return pyarrow.date32()
+    return pyarrow.string()
+
+class ParquetExportWriter:
+    """Append chunks to a Parquet file as row groups"""
+    
+    extension = 'parquet'
+    
+    def __init__(self, path, columns):
+        import pyarrow
+        import pyarrow.parquet
+        
+        self.columns = columns
+        self.schema = pyarrow.schema([(column.name, get_arrow_type(column)) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+    
+    def write(self, rows):
+        import pyarrow
+        
+        arrays = [
+            pyarrow.array([row[position] for row in rows], type=field.type)
+            for position, field in enumerate(self.schema)
+        ]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+    
+    def close(self):
+        self.writer.close()
+
+class CsvGzipExportWriter:
+    """Append chunks to a gzip-compressed CSV file"""
+    
+    extension = 'csv.gz'
+    
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column.name for column in columns])
+    
+    def write(self, rows):
+        self.writer.writerows(
+            [value.isoformat() if isinstance(value, (datetime, date)) else value for value in row]
+            for row in rows
+        )
+    
+    def close(self):
+        self.file.close()
+
+def get_export_writer_class(export_format):
+    """Pick the export writer, using Parquet when pyarrow is installed"""
+    if export_format == 'csv':
+        return CsvGzipExportWriter
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        if export_format == 'parquet':
+            raise click.ClickException('Parquet export needs pyarrow (pip install pyarrow)')
+        return CsvGzipExportWriter
+    return ParquetExportWriter
+
+def get_export_timestamp_column(table_name):
+    """Get the column incremental exports of a table follow, or None when it's always exported in full"""
+    table = EXPORT_TABLES[table_name].__table__
+    if 'updated_at' in table.c:
+        return table.c.updated_at
+    if table_name in EXPORT_APPEND_ONLY_TABLES and 'created_at' in table.c:
+        return table.c.created_at
+    return None
+
+def read_export_watermark(path):
+    """Get the newest exported timestamp recorded in a watermark file"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as watermark_file:
+        exported_until = json.load(watermark_file).get('exported_until')
+    # Watermarks from id-based exports have no timestamp; start over in full
+    return datetime.fromisoformat(exported_until) if exported_until else None
+
+def write_export_watermark(path, exported_until):
+    """Record the newest exported timestamp, replacing the watermark file atomically"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as watermark_file:
+        json.dump({
+            'exported_until': exported_until.isoformat(),
+            'exported_at': datetime.utcnow().isoformat()
+        }, watermark_file)
+    os.replace(temp_path, path)
+
+def export_table(table_name, output_dir, writer_class, chunk_size=EXPORT_CHUNK_SIZE, full=False):
+    """Stream a table's rows changed since the last export (or all of them) to a new file"""
+    table = EXPORT_TABLES[table_name].__table__
+    columns = list(table.columns)
+    timestamp_column = get_export_timestamp_column(table_name)
+    watermark_path = os.path.join(output_dir, f"{table_name}.watermark.json")
+    exported_until = None
+    if timestamp_column is not None and not full:
+        exported_until = read_export_watermark(watermark_path)
+    
+    condition = db.true()
+    if exported_until:
+        condition = timestamp_column >= exported_until - EXPORT_OVERLAP
+    
+    started_at = datetime.utcnow()
+    newest = exported_until
+    last_id = 0
+    rows_written = 0
+    temp_path = os.path.join(output_dir, f".{table_name}.partial.{writer_class.extension}")
+    writer = None
+    
+    try:
+        while True:
+            # Keyset pagination keeps every chunk an indexed range scan
+            rows = db.session.execute(
+                db.select(*columns).where(condition, table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            if writer is None:
+                writer = writer_class(temp_path, columns)
+            writer.write(rows)
+            rows_written += len(rows)
+            last_id = rows[-1].id
+            if timestamp_column is not None:
+                for row in rows:
+                    timestamp = row._mapping[timestamp_column.name]
+                    if timestamp and (newest is None or timestamp > newest):
+                        newest = timestamp
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    if not rows_written:
+        return None, 0
+    
+    kind = 'changes' if exported_until else 'full'
+    path = os.path.join(output_dir, f"{table_name}-{kind}-{started_at:%Y%m%dT%H%M%S}.{writer_class.extension}")
+    os.replace(temp_path, path)
+    if newest:
+        write_export_watermark(watermark_path, newest)
+    return path, rows_written
+
+@app.cli.command('export')
+@click.argument('tables', nargs=-1)
+@click.option('--output-dir', default='exports', show_default=True, help='Directory for export files')
+@click.option('--format', 'export_format', type=click.Choice(['auto', 'parquet', 'csv']), default='auto',
+              show_default=True, help='Parquet needs pyarrow; auto falls back to CSV.gz')
+@click.option('--chunk-size', default=EXPORT_CHUNK_SIZE, show_default=True, help='Rows per chunk')
+@click.option('--full', is_flag=True, help='Ignore watermarks and export every row of every table')
+def export_command(tables, output_dir, export_format, chunk_size, full):
+    """Export orders, batches and feedback to compressed columnar files"""
+    unknown = set(tables) - set(EXPORT_TABLES)
+    if unknown:
+        raise click.BadParameter(f"Unknown tables: {', '.join(sorted(unknown))}", param_hint='TABLES')
+    
+    os.makedirs(output_dir, exist_ok=True)
+    writer_class = get_export_writer_class(export_format)
+    
+    for table_name in tables or EXPORT_TABLES:
+        started = time.perf_counter()
+        path, rows_written = export_table(table_name, output_dir, writer_class, chunk_size, full)
+        elapsed = time.perf_counter() - started
+        if path:
+            print(f"{table_name}: {rows_written} rows -> {path} ({rows_written / elapsed:.0f} rows/s)")
+        else:
+            print(f"{table_name}: no changed rows")
+
+# Bulk catalog imports. Rows are validated, then upserted on each table's
+# natural key in chunks, with one executemany INSERT and one executemany
+# UPDATE per chunk, each chunk in its own transaction.
+
+IMPORT_CHUNK_SIZE = 1000
+
+def parse_import_bool(value):
+    """Parse a boolean from CSV/JSON input"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'y'):
+        return True
+    if text in ('0', 'false', 'no', 'n'):
+        return False
+    raise ValueError(f"expected true/false, got '{value}'")
+
+def parse_import_datetime(value):
+    """Parse an ISO 8601 datetime from CSV/JSON input"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip())
+
+def parse_import_list(value):
+    """Normalize a list or comma separated value to the stored text form"""
+    if isinstance(value, dict):
+        return ','.join(f"{key}:{item}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item).strip() for item in value)
+    return ','.join(item.strip() for item in str(value).split(',') if item.strip())
+
+def validate_delivery_slots(value):
+    """Check delivery slots look like 'morning:6-9,evening:5-8'"""
+    for slot in value.split(','):
+        if not re.fullmatch(r'[a-z_]+:\d{1,2}-\d{1,2}', slot):
+            raise ValueError(f"invalid delivery slot '{slot}'")
+
+def validate_pincodes(value):
+    """Check every pincode is a six digit Indian PIN"""
+    for pincode in value.split(','):
+        if not re.fullmatch(r'\d{6}', pincode):
+            raise ValueError(f"invalid pincode '{pincode}'")
+
+# Per dataset: model, natural key and fields as (parser, required, validator)
+IMPORT_SPECS = {
+    'products': {
+        'model': Product,
+        'key': ('name',),
+        'fields': {
+            'name': (str, True, None),
+            'category': (str, True, None),
+            'ingredients': (parse_import_list, True, None),
+            'skin_types': (parse_import_list, True, None),
+            'benefits': (parse_import_list, False, None),
+            'usage_instructions': (str, False, None),
+            'shelf_life_hours': (int, True, lambda value: value > 0 or 'must be positive'),
+            'price': (float, True, lambda value: value > 0 or 'must be positive'),
+            'is_active': (parse_import_bool, False, None)
+        }
+    },
+    'zones': {
+        'model': DeliveryZone,
+        'key': ('city', 'zone_name'),
+        'fields': {
+            'city': (str, True, None),
+            'zone_name': (str, True, None),
+            'pincode_range': (parse_import_list, True, validate_pincodes),
+            'delivery_slots': (parse_import_list, True, validate_delivery_slots),
+            'preparation_time_hours': (int, False, lambda value: value >= 0 or 'must not be negative'),
+            'is_active': (parse_import_bool, False, None)
+        }
+    },
+    'batches': {
+        'model': ProductBatch,
+        'key': ('batch_number',),
+        'fields': {
+            'batch_number': (str, True, None),
+            'product_id': (int, True, None),
+            'preparation_date': (parse_import_datetime, True, None),
+            'expiry_datetime': (parse_import_datetime, True, None),
+            'quantity_prepared': (int, True, lambda value: value > 0 or 'must be positive'),
+            'preparation_location': (str, True, None),
+            'quality_score': (float, False, lambda value: 0 <= value <= 5 or 'must be between 0 and 5'),
+            'ingredients_source': (str, False, None)
+        }
+    }
+}
+
+def read_import_rows(path):
+    """Yield (line, row, error) from a CSV, JSON array or JSON lines file"""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as import_file:
+            for line, row in enumerate(csv.DictReader(import_file), start=2):
+                yield line, {key: value for key, value in row.items() if value not in (None, '')}, None
+    elif path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as import_file:
+            for line, text in enumerate(import_file, start=1):
+                if not text.strip():
+                    continue
+                # A malformed line is reported like an invalid row, not fatal
+                try:
+                    row = json.loads(text)
+                except ValueError as e:
+                    yield line, None, f"invalid JSON: {e}"
+                    continue
+                yield line, row, None
+    else:
+        with open(path, encoding='utf-8') as import_file:
+            for line, row in enumerate(json.load(import_file), start=1):
+                yield line, row, None
+
+def validate_import_row(spec, row, product_ids_by_name, product_ids=frozenset()):
+    """Coerce and validate an import row, returning (values, error)"""
+    if not isinstance(row, dict):
+        return None, 'expected an object'
+    row = dict(row)
+    if spec['model'] is ProductBatch and 'product_id' not in row and 'product_name' in row:
+        product_id = product_ids_by_name.get(row.pop('product_name'))
+        if product_id is None:
+            return None, 'unknown product_name'
+        row['product_id'] = product_id
+    
+    values = {}
+    for field, (parser, required, validator) in spec['fields'].items():
+        if field not in row or row[field] is None:
+            if required:
+                return None, f"missing {field}"
+            continue
+        try:
+            value = parser(row[field])
+            if validator:
+                result = validator(value)
+                if isinstance(result, str):
+                    raise ValueError(result)
+        except (TypeError, ValueError) as e:
+            return None, f"{field}: {e}"
+        values[field] = value
+    
+    if spec['model'] is ProductBatch and values['product_id'] not in product_ids:
+        return None, 'unknown product_id'
+    if spec['model'] is ProductBatch and values['expiry_datetime'] <= values['preparation_date']:
+        return None, 'expiry_datetime must be after preparation_date'
+    return values, None
+
+def upsert_import_chunk(spec, rows):
+    """Insert new rows and update existing ones matched on the natural key"""
+    model = spec['model']
+    key_columns = [getattr(model, column) for column in spec['key']]
+    keys = {tuple(values[column] for column in spec['key']) for values in rows}
+    
+    existing = {}
+    if len(key_columns) == 1:
+        lookup = db.select(model.id, *key_columns).where(key_columns[0].in_([key[0] for key in keys]))
+    else:
+        lookup = db.select(model.id, *key_columns).where(db.tuple_(*key_columns).in_(list(keys)))
+    for record in db.session.execute(lookup):
+        existing[tuple(record[1:])] = record[0]
+    
+    inserts, updates = [], []
+    for values in rows:
+        record_id = existing.get(tuple(values[column] for column in spec['key']))
+        if record_id is None:
+            inserts.append(values)
+        else:
+            updates.append(dict(values, id=record_id))
+    
+    if inserts:
+        db.session.execute(db.insert(model), inserts)
+        if model is ProductBatch:
+            # Bulk inserts skip the mapper event that feeds quality monitoring
+            record_imported_batch_quality(inserts)
+    if updates:
+        db.session.execute(db.update(model), updates)
+    db.session.commit()
+    return len(inserts), len(updates)
+
+def import_dataset(dataset, path, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """Validate and bulk upsert a file, returning counts and row errors"""
+    spec = IMPORT_SPECS[dataset]
+    product_ids_by_name = {}
+    if dataset == 'batches':
+        product_ids_by_name = dict(db.session.execute(db.select(Product.name, Product.id)).all())
+    product_ids = frozenset(product_ids_by_name.values())
+    
+    counts = {'valid': 0, 'inserted': 0, 'updated': 0, 'invalid': 0}
+    errors = []
+    chunk = {}
+    
+    def flush(chunk):
+        if chunk and not dry_run:
+            inserted, updated = upsert_import_chunk(spec, list(chunk.values()))
+            counts['inserted'] += inserted
+            counts['updated'] += updated
+    
+    for line, row, error in read_import_rows(path):
+        if not error:
+            values, error = validate_import_row(spec, row, product_ids_by_name, product_ids)
+        if error:
+            counts['invalid'] += 1
+            errors.append((line, error))
+            continue
+        counts['valid'] += 1
+        # A later row for the same key replaces an earlier one in the chunk
+        chunk[tuple(values[column] for column in spec['key'])] = values
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = {}
+    flush(chunk)
+    
+    # Bulk statements skip the per-row mapper events
+    if dataset == 'products' and not dry_run:
+        catalog_state['version'] += 1
+        bump_cache_version(db.session.connection(), 'catalog')
+        db.session.commit()
+    if dataset == 'zones' and not dry_run:
+        refresh_delivery_timeline()
+    
+    return counts, errors
+
+@app.cli.command('import')
+@click.argument('dataset', type=click.Choice(sorted(IMPORT_SPECS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows per transaction')
+@click.option('--dry-run', is_flag=True, help='Validate only, without writing')
+def import_command(dataset, path, chunk_size, dry_run):
+    """Bulk upsert products, zones or batches from CSV/JSON"""
+    started = time.perf_counter()
+    counts, errors = import_dataset(dataset, path, chunk_size, dry_run)
+    elapsed = time.perf_counter() - started
+    
+    for line, error in errors[:50]:
+        print(f"  line {line}: {error}")
+    if len(errors) > 50:
+        print(f"  ... and {len(errors) - 50} more invalid rows")
+    
+    processed = counts['valid'] + counts['invalid']
+    if dry_run:
+        print(f"{dataset}: {counts['valid']} valid, {counts['invalid']} invalid [dry run]")
+    else:
+        print(f"{dataset}: {counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['invalid']} invalid in {elapsed:.2f}s ({processed / elapsed:.0f} rows/s)")
+
+# Response compression. JSON and text responses above a minimum size are
+# compressed with brotli (when installed) or gzip, as the client accepts.
+# Compressed bodies of cacheable endpoints are kept keyed on a digest of
+# the uncompressed body, so repeat responses skip recompression.
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+COMPRESSION_CACHEABLE_ENDPOINTS = {
+    'get_product_categories',
+    'get_community_tips',
+    'get_ingredient_transparency',
+    'get_delivery_zones',
+    'index'
+}
+COMPRESSION_CACHE_SIZE = 512
+
+# Dynamic responses favour speed; cached ones are compressed once, so harder
+COMPRESSION_LEVELS = {
+    'br': {'dynamic': 4, 'cached': 9},
+    'gzip': {'dynamic': 6, 'cached': 9}
+}
+
+compressed_response_cache = OrderedDict()
+compression_stats = {}
+compression_lock = threading.Lock()
+
+def compress_body(body, encoding, level):
+    """Compress a response body with the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+def choose_content_encoding():
+    """Pick the best content coding the client accepts"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+def record_compression(endpoint, original_size, compressed_size, cpu_seconds, cached):
+    """Accumulate per-endpoint compression statistics"""
+    with compression_lock:
+        stats = compression_stats.setdefault(endpoint, {
+            'responses': 0, 'cache_hits': 0, 'original_bytes': 0,
+            'compressed_bytes': 0, 'cpu_seconds': 0.0
+        })
+        stats['responses'] += 1
+        stats['cache_hits'] += 1 if cached else 0
+        stats['original_bytes'] += original_size
+        stats['compressed_bytes'] += compressed_size
+        stats['cpu_seconds'] += cpu_seconds
+
+def summarize_compression_stats():
+    """Report compression ratio and CPU cost per endpoint"""
+    with compression_lock:
+        snapshot = {endpoint: dict(stats) for endpoint, stats in compression_stats.items()}
+    
+    for stats in snapshot.values():
+        compressed_responses = stats['responses'] - stats['cache_hits']
+        stats['compression_ratio'] = round(stats['original_bytes'] / stats['compressed_bytes'], 2) if stats['compressed_bytes'] else None
+        stats['avg_cpu_ms'] = round(stats['cpu_seconds'] * 1000 / compressed_responses, 3) if compressed_responses else 0.0
+    return snapshot
+
+@app.after_request
+def compress_response(response):
+    """Compress eligible responses for clients that accept it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSION_MIMETYPES):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = choose_content_encoding()
+    if not encoding:
+        return response
+    
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return response
+    
+    endpoint = request.endpoint or request.path
+    cacheable = endpoint in COMPRESSION_CACHEABLE_ENDPOINTS
+    cache_key = None
+    compressed = None
+    
+    if cacheable:
+        cache_key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with compression_lock:
+            compressed = compressed_response_cache.get(cache_key)
+            if compressed is not None:
+                compressed_response_cache.move_to_end(cache_key)
+    
+    cached = compressed is not None
+    cpu_started = time.thread_time()
+    if not cached:
+        compressed = compress_body(body, encoding, COMPRESSION_LEVELS[encoding]['cached' if cacheable else 'dynamic'])
+        if cacheable:
+            with compression_lock:
+                compressed_response_cache[cache_key] = compressed
+                if len(compressed_response_cache) > COMPRESSION_CACHE_SIZE:
+                    compressed_response_cache.popitem(last=False)
+    cpu_seconds = time.thread_time() - cpu_started
+    
+    record_compression(endpoint, len(body), len(compressed), cpu_seconds, cached)
+    
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# Admission control. Each endpoint belongs to a priority class with its own
+# concurrency limit and token bucket, so a morning-peak surge of heavy report
+# requests is shed before it slows down checkout. Shed low-priority requests
+# get the caller's last good response when one is fresh enough, otherwise a
+# 503 with Retry-After. Endpoints not listed are 'normal'. Routes behind
+# token_required are admitted after authentication, the rest before dispatch.
+
+ADMISSION_CLASSES = {
+    # concurrency: requests in flight per worker; rate/burst: token bucket (None = unlimited)
+    'critical': {'concurrency': None, 'rate': None, 'burst': None},
+    'normal': {'concurrency': 32, 'rate': None, 'burst': None},
+    'low': {'concurrency': 4, 'rate': 20, 'burst': 40}
+}
+ADMISSION_ROUTE_CLASSES = {
+    'checkout': 'critical',  # Core app route
+    'check_delivery_availability': 'critical',
+    'get_daily_fresh_report': 'low',
+    'get_personalized_routine': 'low'
+}
+DEGRADED_RESPONSE_MAX_AGE = 300
+DEGRADED_RESPONSE_CACHE_SIZE = 2048
+
+app.config.setdefault('ADMISSION_CONTROL', os.environ.get('ADMISSION_CONTROL', '1') != '0')
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` per second"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def take(self):
+        """Take a token; return 0 if admitted, else seconds until one is available"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+admission_limits = {
+    name: {
+        'slots': threading.BoundedSemaphore(limits['concurrency']) if limits['concurrency'] else None,
+        'bucket': TokenBucket(limits['rate'], limits['burst']) if limits['rate'] else None
+    }
+    for name, limits in ADMISSION_CLASSES.items()
+}
+admission_stats = {name: {'admitted': 0, 'degraded': 0, 'rejected': 0} for name in ADMISSION_CLASSES}
+degraded_response_cache = OrderedDict()
+admission_lock = threading.Lock()
+
+def degraded_cache_key():
+    """Key a cached response on the endpoint, query and caller's credentials"""
+    credentials = request.headers.get('Authorization', '').encode()
+    return (request.endpoint, request.query_string, hashlib.blake2b(credentials, digest_size=16).digest())
+
+def shed_request(priority, retry_after):
+    """Serve a recent cached response for this caller, or a 503"""
+    with admission_lock:
+        cached = degraded_response_cache.get(degraded_cache_key())
+    
+    if cached and time.monotonic() - cached['stored_at'] <= DEGRADED_RESPONSE_MAX_AGE:
+        with admission_lock:
+            admission_stats[priority]['degraded'] += 1
+        response = app.response_class(cached['body'], status=200, mimetype=cached['mimetype'])
+        response.headers['Warning'] = '110 - "Response is stale"'
+        response.headers['Age'] = str(int(time.monotonic() - cached['stored_at']))
+        request.environ['freskin.degraded'] = True
+        return response
+    
+    with admission_lock:
+        admission_stats[priority]['rejected'] += 1
+    response = jsonify({'error': 'Service is busy, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+def apply_admission_limits():
+    """Admit the request under its endpoint's priority class, or return the shed response"""
+    if not app.config['ADMISSION_CONTROL'] or request.endpoint is None:
+        return None
+    
+    priority = ADMISSION_ROUTE_CLASSES.get(request.endpoint, 'normal')
+    limits = admission_limits[priority]
+    
+    if limits['slots'] is not None:
+        if not limits['slots'].acquire(blocking=False):
+            return shed_request(priority, 1)
+        request.environ['freskin.admission_slots'] = limits['slots']
+    
+    # Only a request that got a slot spends a token
+    if limits['bucket'] is not None:
+        wait = limits['bucket'].take()
+        if wait:
+            release_admission_slot(None)
+            return shed_request(priority, wait)
+    
+    with admission_lock:
+        admission_stats[priority]['admitted'] += 1
+    return None
+
+@app.before_request
+def admit_request():
+    """Apply admission limits before dispatch to routes that don't authenticate first"""
+    view = app.view_functions.get(request.endpoint)
+    if getattr(view, 'admitted_after_authentication', False):
+        return None  # token_required admits it once the caller is known
+    return apply_admission_limits()
+
+@app.after_request
+def remember_degradable_response(response):
+    """Keep the last good response of low-priority endpoints to serve when shedding"""
+    if (request.endpoint is None
+            or ADMISSION_ROUTE_CLASSES.get(request.endpoint) != 'low'
+            or response.status_code != 200
+            or response.is_streamed
+            or request.environ.get('freskin.degraded')):
+        return response
+    
+    key = degraded_cache_key()
+    with admission_lock:
+        degraded_response_cache[key] = {
+            'body': response.get_data(),
+            'mimetype': response.mimetype,
+            'stored_at': time.monotonic()
+        }
+        degraded_response_cache.move_to_end(key)
+        if len(degraded_response_cache) > DEGRADED_RESPONSE_CACHE_SIZE:
+            degraded_response_cache.popitem(last=False)
+    return response
+
+@app.teardown_request
+def release_admission_slot(exc):
+    """Free the concurrency slot taken by apply_admission_limits"""
+    slots = request.environ.pop('freskin.admission_slots', None)
+    if slots is not None:
+        slots.release()
+
+# On-demand sampling profiler. An admin opens a bounded window in which a
+# fraction of requests (optionally of one endpoint) are marked for profiling;
+# a sampler thread snapshots their stacks every few milliseconds and counts
+# them as collapsed stacks. The window is a ProfilerWindow row announced
+# through the 'profiler' cache version, so every worker process picks it up
+# within CACHE_VERSION_CHECK_SECONDS and runs its own sampler; each sampler
+# adds its counts to ProfilerStack every PROFILER_FLUSH_SECONDS and when the
+# window ends. Outside a window the per-request cost is the cache version check.
+
+PROFILER_DEFAULT_INTERVAL_MS = 5
+PROFILER_MAX_DURATION_SECONDS = 600
+PROFILER_MAX_STACK_DEPTH = 128
+PROFILER_FLUSH_SECONDS = 5
+
+profiler_state = {
+    'version': None, 'window_id': None, 'until': 0.0, 'sample_rate': 0.0, 'endpoint': None,
+    'interval_ms': PROFILER_DEFAULT_INTERVAL_MS, 'profiled_requests': 0, 'samples': 0,
+    'thread': None, 'thread_window_id': None
+}
+profiled_threads = {}
+profile_stacks = {}  # counts not yet flushed to ProfilerStack
+profiler_lock = threading.Lock()
+
+def format_frame(frame):
+    """Name a frame for a collapsed stack"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def get_latest_profiler_window():
+    """Get the current or last profiling window"""
+    return ProfilerWindow.query.order_by(ProfilerWindow.id.desc()).first()
+
+def flush_profile_samples(window_id):
+    """Add this worker's unflushed counts to the shared window"""
+    with profiler_lock:
+        stacks = dict(profile_stacks)
+        profile_stacks.clear()
+        profiled_requests, samples = profiler_state['profiled_requests'], profiler_state['samples']
+        profiler_state['profiled_requests'] = profiler_state['samples'] = 0
+    if not stacks and not profiled_requests:
+        return
+    
+    if stacks:
+        db.session.execute(db.insert(ProfilerStack), [
+            {'window_id': window_id, 'stack': stack, 'count': count} for stack, count in stacks.items()
+        ])
+    table = ProfilerWindow.__table__
+    db.session.execute(table.update().where(table.c.id == window_id).values(
+        profiled_requests=table.c.profiled_requests + profiled_requests,
+        samples=table.c.samples + samples
+    ))
+    db.session.commit()
+
+def flush_profile_samples_safely(window_id):
+    """Flush from the sampler thread, keeping it alive on database errors"""
+    try:
+        run_in_app_context(flush_profile_samples, window_id)
+    except Exception as e:
+        print(f"Profiler flush failed: {e}")
+
+def sample_profiled_stacks(window_id):
+    """Sampler loop: count the current stack of every profiled request thread"""
+    interval = profiler_state['interval_ms'] / 1000
+    flushed_at = time.monotonic()
+    while profiler_state['window_id'] == window_id and time.monotonic() < profiler_state['until']:
+        frames = sys._current_frames()
+        for thread_id, endpoint in list(profiled_threads.items()):
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None and len(stack) < PROFILER_MAX_STACK_DEPTH:
+                stack.append(format_frame(frame))
+                frame = frame.f_back
+            if not stack:
+                continue
+            stack.append(endpoint)
+            key = ';'.join(reversed(stack))
+            with profiler_lock:
+                profile_stacks[key] = profile_stacks.get(key, 0) + 1
+                profiler_state['samples'] += 1
+        del frames
+        if time.monotonic() - flushed_at >= PROFILER_FLUSH_SECONDS:
+            flush_profile_samples_safely(window_id)
+            flushed_at = time.monotonic()
+        time.sleep(interval)
+    flush_profile_samples_safely(window_id)
+
+def sync_profiler_window():
+    """Follow windows opened or closed by any worker, starting this worker's sampler"""
+    version = get_cache_version('profiler')
+    if version == profiler_state['version']:
+        return
+    window = get_latest_profiler_window()
+    now = datetime.utcnow()
+    
+    with profiler_lock:
+        profiler_state['version'] = version
+        if window is None or window.ends_at <= now:
+            profiler_state['until'] = 0.0
+            return
+        profiler_state.update(
+            window_id=window.id, until=time.monotonic() + (window.ends_at - now).total_seconds(),
+            sample_rate=window.sample_rate, endpoint=window.endpoint, interval_ms=window.interval_ms
+        )
+        thread = profiler_state['thread']
+        if thread is None or not thread.is_alive() or profiler_state['thread_window_id'] != window.id:
+            profiler_state['thread'] = threading.Thread(
+                target=sample_profiled_stacks, args=(window.id,), name='freskin-profiler', daemon=True
+            )
+            profiler_state['thread_window_id'] = window.id
+            profiler_state['thread'].start()
+
+def announce_profiler_window():
+    """Publish a window change to every worker and pick it up here at once"""
+    bump_cache_version(db.session.connection(), 'profiler')
+    db.session.commit()
+    cache_versions.pop('profiler', None)
+    sync_profiler_window()
+
+def start_profiling(sample_rate, endpoint=None, duration_seconds=60, interval_ms=PROFILER_DEFAULT_INTERVAL_MS):
+    """Open a profiling window for all workers"""
+    if not 0 < sample_rate <= 1:
+        raise ValueError('sample_rate must be between 0 and 1')
+    if not 1 <= duration_seconds <= PROFILER_MAX_DURATION_SECONDS:
+        raise ValueError(f"duration_seconds must be between 1 and {PROFILER_MAX_DURATION_SECONDS}")
+    if interval_ms < 1:
+        raise ValueError('interval_ms must be at least 1')
+    
+    now = datetime.utcnow()
+    if ProfilerWindow.query.filter(ProfilerWindow.ends_at > now).first():
+        raise ValueError('A profiling window is already running')
+    db.session.add(ProfilerWindow(
+        sample_rate=sample_rate, endpoint=endpoint, interval_ms=interval_ms,
+        started_at=now, ends_at=now + timedelta(seconds=duration_seconds)
+    ))
+    announce_profiler_window()
+    return profiler_summary()
+
+def stop_profiling():
+    """Close the profiling window early, keeping the stacks collected so far"""
+    table = ProfilerWindow.__table__
+    now = datetime.utcnow()
+    db.session.execute(table.update().where(table.c.ends_at > now).values(ends_at=now))
+    announce_profiler_window()
+    thread = profiler_state['thread']
+    if thread is not None:
+        thread.join()  # flushes this worker's counts; others flush within a few seconds
+
+def profiler_summary():
+    """Describe the current or last profiling window, as flushed by the workers"""
+    window = get_latest_profiler_window()
+    if window is None:
+        return {
+            'active': False, 'seconds_left': 0, 'sample_rate': 0.0, 'endpoint': None,
+            'interval_ms': PROFILER_DEFAULT_INTERVAL_MS, 'started_at': None,
+            'profiled_requests': 0, 'samples': 0, 'distinct_stacks': 0
+        }
+    
+    now = datetime.utcnow()
+    distinct_stacks = db.session.query(db.func.count(db.distinct(ProfilerStack.stack))).filter(
+        ProfilerStack.window_id == window.id
+    ).scalar()
+    return {
+        'active': window.ends_at > now,
+        'seconds_left': max(0, int((window.ends_at - now).total_seconds())),
+        'sample_rate': window.sample_rate,
+        'endpoint': window.endpoint,
+        'interval_ms': window.interval_ms,
+        'started_at': window.started_at.isoformat(),
+        'profiled_requests': window.profiled_requests,
+        'samples': window.samples,
+        'distinct_stacks': distinct_stacks
+    }
+
+def collapsed_stacks():
+    """Render the collected stacks of all workers in collapsed 'a;b;c count' form, hottest first"""
+    window = get_latest_profiler_window()
+    if window is None:
+        return ''
+    if profiler_state['window_id'] == window.id:
+        flush_profile_samples(window.id)
+    
+    count = db.func.sum(ProfilerStack.count)
+    stacks = db.session.query(ProfilerStack.stack, count).filter(
+        ProfilerStack.window_id == window.id
+    ).group_by(ProfilerStack.stack).order_by(count.desc()).all()
+    return ''.join(f"{stack} {total}\n" for stack, total in stacks)
+
+@app.before_request
+def select_request_for_profiling():
+    """Mark this request's thread for sampling while a window is open"""
+    sync_profiler_window()
+    if profiler_state['until'] < time.monotonic():
+        return None
+    if profiler_state['endpoint'] and request.endpoint != profiler_state['endpoint']:
+        return None
+    if random.random() >= profiler_state['sample_rate']:
+        return None
+    
+    profiled_threads[threading.get_ident()] = request.endpoint or request.path
+    request.environ['freskin.profiled'] = True
+    with profiler_lock:
+        profiler_state['profiled_requests'] += 1
+    return None
+
+@app.teardown_request
+def unmark_profiled_request(exc):
+    """Stop sampling the thread once its request is done"""
+    if request.environ.pop('freskin.profiled', False):
+        profiled_threads.pop(threading.get_ident(), None)
+
+# Static asset pipeline. `flask build-assets` renders each page once per
+# deploy, moves its inline CSS and JS into content-hashed files under
+# static/assets, precompressed next to them, and saves the remaining HTML
+# shell under build/. Hashed assets never change, so they are cached for a
+# year; the shell is revalidated with its ETag, so repeat visits download
+# next to nothing. The shell is compressed by compress_response like any
+# other HTML, so its ETag is weak: it names the content in every encoding.
+
+PRERENDERED_PAGES = ['index.html']
+ASSET_CACHE_MAX_AGE = 365 * 24 * 3600
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+prerendered_pages = {}
+
+def get_asset_build_dir():
+    """Directory holding the pre-rendered shells and the asset manifest"""
+    return os.path.join(app.root_path, 'build')
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Pre-render pages and write their fingerprinted CSS/JS assets"""
+    for name in PRERENDERED_PAGES:
+        with app.test_request_context():
+            html = render_template(name)
+        entry = asset_pipeline.build_page(
+            name, html, app.static_folder, get_asset_build_dir(), static_url=app.static_url_path
+        )
+        print(f"{name}: {entry['source_bytes']} bytes -> {entry['shell_bytes']} byte shell, "
+              f"{len(entry['css'])} css files ({entry['css_bytes']} bytes), "
+              f"{len(entry['js'])} js files ({entry['js_bytes']} bytes)")
+
+def load_prerendered_page(name):
+    """Get a pre-rendered shell and its ETag, read once per worker"""
+    if name not in prerendered_pages:
+        entry = asset_pipeline.load_manifest(get_asset_build_dir()).get(name)
+        page = None
+        if entry:
+            with open(os.path.join(get_asset_build_dir(), name), 'rb') as f:
+                page = {'body': f.read(), 'etag': entry['etag']}
+        prerendered_pages[name] = page
+    return prerendered_pages[name]
+
+def render_page(name):
+    """Serve a page's pre-rendered shell, falling back to rendering the template"""
+    page = load_prerendered_page(name)
+    if page is None:
+        return render_template(name)
+    
+    response = app.response_class(page['body'], mimetype='text/html')
+    response.set_etag(page['etag'], weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def serve_index():
+    """Serve the home page from its pre-rendered shell"""
+    return render_page('index.html')
+
+# The core app registers '/' as 'index'; route it through the pipeline
+if 'index' in app.view_functions:
+    app.view_functions['index'] = serve_index
+else:
+    app.add_url_rule('/', 'index', serve_index)
+
+def send_precompressed_asset(response, filename):
+    """Swap a static asset's body for its precompressed file, if the client accepts one"""
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    encoding = choose_content_encoding()
+    if response.status_code != 200 or not encoding:
+        return response
+    
+    path = os.path.join(app.static_folder, filename + PRECOMPRESSED_SUFFIXES[encoding])
+    if not os.path.isfile(path):
+        return response
+    with open(path, 'rb') as f:
+        body = f.read()
+    if hasattr(response.response, 'close'):
+        response.response.close()  # the uncompressed file
+    response.direct_passthrough = False
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.headers.pop('Accept-Ranges', None)
+    return response
+
+@app.after_request
+def cache_fingerprinted_assets(response):
+    """Let browsers and CDNs keep content-hashed assets for a year, compressed"""
+    filename = (request.view_args or {}).get('filename', '')
+    if request.endpoint != 'static' or not filename.startswith(asset_pipeline.ASSET_DIR + '/'):
+        return response
+    if response.status_code == 200:
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    return send_precompressed_asset(response, filename)
+
+# Kitchen preparation planning: batches become jobs whose deadline is the
+# start of their zone's delivery slot, sequenced by kitchen_scheduler
+
+KITCHEN_OPENING_HOUR = 3
+KITCHEN_DEFAULT_CAPACITY = 4
+
+def build_preparation_jobs(batches, delivery_date):
+    """Turn requested batches into scheduler jobs with slot deadlines"""
+    zones = {zone.id: zone for zone in DeliveryZone.query.filter_by(is_active=True).all()}
+    slots_by_zone = {zone_id: parse_delivery_slots(zone.delivery_slots) for zone_id, zone in zones.items()}
+    
+    jobs = []
+    errors = []
+    for position, batch in enumerate(batches):
+        zone = zones.get(batch.get('zone_id'))
+        slot = slots_by_zone[zone.id].get(batch.get('slot', 'morning')) if zone else None
+        if not zone:
+            errors.append({'batch': position, 'error': 'unknown or inactive zone_id'})
+            continue
+        if not slot:
+            errors.append({'batch': position, 'error': f"zone has no '{batch.get('slot', 'morning')}' slot"})
+            continue
+        if not batch.get('kitchen'):
+            errors.append({'batch': position, 'error': 'kitchen is required'})
+            continue
+        
+        duration_minutes = batch.get('duration_minutes') or (zone.preparation_time_hours or 0) * 60
+        if not duration_minutes:
+            errors.append({'batch': position, 'error': 'duration_minutes is required, the zone has no preparation time'})
+            continue
+        
+        jobs.append({
+            'id': batch.get('batch_number') or batch.get('id') or position,
+            'kitchen': batch['kitchen'],
+            'deadline': slot_window(delivery_date, slot)[0],
+            'duration': timedelta(minutes=duration_minutes)
+        })
+    
+    return jobs, errors
+
+# Per-zone order cut-offs. Every pincode/slot pair is precomputed into the
+# zone_delivery_timeline table in the same transaction as the zone change
+# (or by `flask refresh-delivery-timeline` and `flask init-db`), and workers
+# only read it into an in-process map, so finding a cut-off is a dict lookup
+# plus a few slots. A timeline found empty while zones exist is built once.
+
+# Orders must be in this long before the zone's preparation starts
+ORDER_CUTOFF_LEAD_HOURS = 6
+DELIVERY_TIMELINE_TTL_SECONDS = 60
+
+zone_state = {'version': 0}
+delivery_timeline = {'version': None, 'loaded_at': None, 'by_pincode': {}, 'by_city': {}}
+
+@db.event.listens_for(DeliveryZone, 'after_insert')
+@db.event.listens_for(DeliveryZone, 'after_update')
+@db.event.listens_for(DeliveryZone, 'after_delete')
+def mark_zones_changed(mapper, connection, target):
+    """Rebuild the delivery timeline after a zone changes"""
+    zone_state['version'] += 1
+    db.object_session(target).info['zones_changed'] = True
+
+@db.event.listens_for(DeliveryZone, 'before_delete')
+def delete_zone_timeline(mapper, connection, target):
+    """Delete a zone's timeline rows before the zone, in the same flush"""
+    # Tables created before the cascading foreign key need this too
+    connection.execute(db.delete(ZoneDeliveryTimeline).where(ZoneDeliveryTimeline.zone_id == target.id))
+
+@db.event.listens_for(db.session, 'after_flush')
+def rebuild_timeline_after_zone_changes(session, flush_context):
+    """Rewrite the timeline for flushed zone changes, in their transaction"""
+    if session.info.pop('zones_changed', False):
+        rebuild_delivery_timeline(session.connection())
+
+def compute_zone_timeline(zone):
+    """Compute slot, preparation and cut-off minutes for a zone's slots"""
+    timeline = []
+    for slot_name, (start_hour, end_hour) in parse_delivery_slots(zone.delivery_slots).items():
+        slot_start = start_hour * 60
+        preparation_start = slot_start - (zone.preparation_time_hours or 0) * 60
+        timeline.append({
+            'slot_name': slot_name,
+            'slot_start_minute': slot_start,
+            'slot_end_minute': end_hour * 60,
+            'preparation_start_minute': preparation_start,
+            'cutoff_minute': preparation_start - ORDER_CUTOFF_LEAD_HOURS * 60
+        })
+    return timeline
+
+def rebuild_delivery_timeline(connection):
+    """Rewrite the zone_delivery_timeline table from the active zones"""
+    zones = DeliveryZone.__table__
+    rows = []
+    for zone in connection.execute(db.select(zones).where(zones.c.is_active == True)):
+        zone_timeline = compute_zone_timeline(zone)
+        for pincode in zone.pincode_range.split(','):
+            for slot in zone_timeline:
+                rows.append(dict(slot, zone_id=zone.id, pincode=pincode.strip(), city=zone.city))
+    
+    connection.execute(db.delete(ZoneDeliveryTimeline))
+    if rows:
+        connection.execute(db.insert(ZoneDeliveryTimeline), rows)
+    # Tells the other workers to reload their maps
+    bump_cache_version(connection, 'zones')
+    return len(rows)
+
+def refresh_delivery_timeline():
+    """Rebuild the zone_delivery_timeline table and commit it"""
+    rows = rebuild_delivery_timeline(db.session.connection())
+    db.session.commit()
+    zone_state['version'] += 1
+    return rows
+
+def get_zone_version():
+    """Get the version zone-derived maps are keyed on (shared and in-process changes)"""
+    return (get_cache_version('zones'), zone_state['version'])
+
+def get_delivery_timeline():
+    """Get the pincode and city timeline maps, reloading them when stale"""
+    # The table is only written when zones change, or below when it's empty
+    version = get_zone_version()
+    loaded_at = delivery_timeline['loaded_at']
+    if (delivery_timeline['version'] != version or loaded_at is None
+            or time.monotonic() - loaded_at > DELIVERY_TIMELINE_TTL_SECONDS):
+        by_pincode, by_city = {}, {}
+        timeline_query = db.session.query(ZoneDeliveryTimeline, DeliveryZone.zone_name).join(
+            DeliveryZone, DeliveryZone.id == ZoneDeliveryTimeline.zone_id
+        )
+        rows = timeline_query.all()
+        if not rows and db.session.query(DeliveryZone.id).filter_by(is_active=True).first():
+            # Databases whose zones predate the timeline table start with it
+            # empty; build it once, outside the request's transaction
+            with db.engine.begin() as connection:
+                rebuild_delivery_timeline(connection)
+            rows = timeline_query.all()
+        for row, zone_name in rows:
+            slot = (row.cutoff_minute, row.preparation_start_minute, row.slot_start_minute,
+                    row.slot_end_minute, row.slot_name, zone_name)
+            by_pincode.setdefault(row.pincode, []).append(slot)
+            by_city.setdefault(row.city.lower(), set()).add(slot)
+        delivery_timeline['by_pincode'] = by_pincode
+        delivery_timeline['by_city'] = {city: list(slots) for city, slots in by_city.items()}
+        delivery_timeline['version'] = version
+        delivery_timeline['loaded_at'] = time.monotonic()
+    
+    return delivery_timeline
+
+def get_order_cutoff(pincode=None, city=None, now=None):
+    """Get the next order cut-off and the slot it feeds for a pincode (or city)"""
+    timeline = get_delivery_timeline()
+    slots = timeline['by_pincode'].get(str(pincode).strip()) if pincode else None
+    if slots is None and city:
+        slots = timeline['by_city'].get(city.lower())
+    if not slots:
+        return None
+    
+    now = now or datetime.now()
+    today = datetime.combine(now.date(), datetime.min.time())
+    best = None
+    for cutoff_minute, preparation_minute, start_minute, end_minute, slot_name, zone_name in slots:
+        # The soonest delivery day whose cut-off hasn't passed yet
+        day_offset = 0
+        while today + timedelta(days=day_offset, minutes=cutoff_minute) <= now:
+            day_offset += 1
+        delivery_day = today + timedelta(days=day_offset)
+        cut_off = delivery_day + timedelta(minutes=cutoff_minute)
+        if best is None or cut_off < best['cut_off']:
+            best = {
+                'cut_off': cut_off,
+                'preparation_start': delivery_day + timedelta(minutes=preparation_minute),
+                'delivery_start': delivery_day + timedelta(minutes=start_minute),
+                'delivery_end': delivery_day + timedelta(minutes=end_minute),
+                'slot': slot_name,
+                'zone_name': zone_name
+            }
+    return best
+
+@app.cli.command('refresh-delivery-timeline')
+def refresh_delivery_timeline_command():
+    """Recompute per-pincode delivery slots and order cut-offs"""
+    rows = refresh_delivery_timeline()
+    print(f"Delivery timeline refreshed ({rows} pincode slots)")
+
+# City shards. Each metro's users, orders and batches can live in their own
+# database, configured as SQLALCHEMY_BINDS entries named 'city:<city>' before
+# db is initialised, e.g. for local testing with SQLite files:
+#   SQLALCHEMY_BINDS = {'city:mumbai': 'sqlite:///mumbai.db', 'city:delhi': 'sqlite:///delhi.db'}
+# Request routes, imports and the sweeper all read and write db.session, so a
+# shard only holds what a migration copies into it; routing a request to its
+# city's shard waits for the core checkout and user tables to move there
+# together. Until then shards serve admin aggregates, which fan out across
+# the default database and every shard.
+
+shard_sessions = city_shards.ShardSessions()
+
+def get_shard_cities():
+    """Get the cities that have their own shard"""
+    return city_shards.shard_cities(app.config.get('SQLALCHEMY_BINDS') or {})
+
+def get_shard_session(city):
+    """Get the session for a city's shard, or db.session if it has none"""
+    return shard_sessions.get(city, db.engines, db.session)
+
+@app.teardown_appcontext
+def remove_shard_sessions(exc):
+    """Close this thread's shard sessions, as Flask-SQLAlchemy does for db.session"""
+    shard_sessions.remove()
+
+def query_shard(fn, city):
+    """Run fn(session) against one shard"""
+    return fn(get_shard_session(city))
+
+def fan_out_to_shards(fn):
+    """Run fn(session) on the default database and every city shard (admin aggregates only)"""
+    futures = {city: submit_io_task(query_shard, fn, city) for city in [None] + get_shard_cities()}
+    return {city or 'default': future.result() for city, future in futures.items()}
+
+def count_shard_rows(session):
+    """Count the sharded tables in one database"""
+    return {
+        'users': session.query(db.func.count(User.id)).scalar(),
+        'orders': session.query(db.func.count(Order.id)).scalar(),
+        'product_batches': session.query(db.func.count(ProductBatch.id)).scalar()
+    }
+
+@app.cli.command('init-shards')
+def init_shards_command():
+    """Create the schema in every configured city shard"""
+    cities = get_shard_cities()
+    if not cities:
+        print("No city shards configured in SQLALCHEMY_BINDS")
+        return
+    for city in cities:
+        db.metadata.create_all(db.engines[city_shards.shard_key(city)])
+        print(f"Shard {city}: schema created")
+
+# Streaming quality monitoring. Each new batch updates running mean/variance
+# (Welford) and EWMA statistics for its product and its preparation location
+# in O(1), inside the inserting transaction, and is flagged when its score is
+# far from what that product or kitchen usually achieves.
+
+QUALITY_EWMA_ALPHA = 0.1
+QUALITY_ANOMALY_Z_SCORE = 3.0
+QUALITY_ANOMALY_MIN_COUNT = 10
+# Floor for the standard deviation, so perfectly steady series don't flag noise
+QUALITY_MIN_STD_DEV = 0.1
+
+def record_batch_quality(connection, batch_id, product_id, location, score):
+    """Fold one batch's quality score into its product and location stats"""
+    if score is None:
+        return []
+    
+    stats_table = QualityStats.__table__
+    anomalies = []
+    now = datetime.utcnow()
+    
+    for scope, key in (('product', str(product_id)), ('location', location)):
+        lookup = db.select(stats_table).where(
+            stats_table.c.scope == scope,
+            stats_table.c.key == key
+        ).with_for_update()
+        row = connection.execute(lookup).first()
+        
+        if row is None:
+            try:
+                # First batch for this product or kitchen - create its stats row.
+                # The savepoint keeps a concurrent insert from failing the batch.
+                with connection.begin_nested():
+                    connection.execute(db.insert(stats_table).values(
+                        scope=scope, key=key, count=1, mean=score, m2=0.0, ewma=score,
+                        ewm_variance=0.0, last_score=score, anomaly_count=0, updated_at=now
+                    ))
+                continue
+            except IntegrityError:
+                # Created concurrently; fold the score into that row instead
+                row = connection.execute(lookup).first()
+        
+        # Judge the batch against the statistics before it
+        std_dev = max((row.m2 / (row.count - 1)) ** 0.5 if row.count > 1 else 0.0, QUALITY_MIN_STD_DEV)
+        ewm_std_dev = max(row.ewm_variance ** 0.5, QUALITY_MIN_STD_DEV)
+        z_score = (score - row.mean) / std_dev
+        ewm_z_score = (score - row.ewma) / ewm_std_dev
+        is_anomaly = row.count >= QUALITY_ANOMALY_MIN_COUNT and (
+            abs(z_score) > QUALITY_ANOMALY_Z_SCORE or abs(ewm_z_score) > QUALITY_ANOMALY_Z_SCORE
+        )
+        
+        count = row.count + 1
+        delta = score - row.mean
+        mean = row.mean + delta / count
+        m2 = row.m2 + delta * (score - mean)
+        ewm_delta = score - row.ewma
+        ewma = row.ewma + QUALITY_EWMA_ALPHA * ewm_delta
+        ewm_variance = (1 - QUALITY_EWMA_ALPHA) * (row.ewm_variance + QUALITY_EWMA_ALPHA * ewm_delta * ewm_delta)
+        
+        connection.execute(db.update(stats_table).where(stats_table.c.id == row.id).values(
+            count=count, mean=mean, m2=m2, ewma=ewma, ewm_variance=ewm_variance, last_score=score,
+            anomaly_count=row.anomaly_count + (1 if is_anomaly else 0), updated_at=now
+        ))
+        
+        if is_anomaly:
+            anomaly = {
+                'batch_id': batch_id, 'scope': scope, 'key': key, 'quality_score': score,
+                'expected_score': row.ewma if abs(ewm_z_score) >= abs(z_score) else row.mean,
+                'z_score': ewm_z_score if abs(ewm_z_score) >= abs(z_score) else z_score,
+                'detected_at': now
+            }
+            connection.execute(db.insert(QualityAnomaly.__table__).values(**anomaly))
+            anomalies.append(anomaly)
+    
+    return anomalies
+
+@db.event.listens_for(ProductBatch, 'after_insert')
+def monitor_batch_quality(mapper, connection, target):
+    """Update quality statistics as each batch is recorded"""
+    anomalies = record_batch_quality(
+        connection, target.id, target.product_id, target.preparation_location, target.quality_score
+    )
+    for anomaly in anomalies:
+        app.logger.warning(
+            "Quality anomaly: batch %s scored %.2f, expected %.2f for %s %s",
+            target.batch_number, anomaly['quality_score'], anomaly['expected_score'],
+            anomaly['scope'], anomaly['key']
+        )
+
+def record_imported_batch_quality(rows):
+    """Update quality statistics for bulk-inserted batches"""
+    batch_ids = dict(db.session.execute(
+        db.select(ProductBatch.batch_number, ProductBatch.id).where(
+            ProductBatch.batch_number.in_([row['batch_number'] for row in rows])
+        )
+    ).all())
+    connection = db.session.connection()
+    for row in rows:
+        record_batch_quality(
+            connection, batch_ids[row['batch_number']], row['product_id'],
+            row['preparation_location'], row.get('quality_score', 5.0)
+        )
+
+# Expiry sweeper. Expired batches move to archived_product_batch in short
+# chunked transactions (so concurrent readers wait on at most one chunk) and
+# their unsold quantity is added to the daily waste rollup. Batches that order
+# items still point at through a foreign key are archived but kept, so order
+# history and recalls can always trace an item to its batch.
+
+SWEEP_CHUNK_SIZE = 500
+
+def get_batch_sales(batch_ids):
+    """Get quantity sold per batch, when order items record their batch"""
+    # batch_id is an optional column on the core OrderItem model
+    if not hasattr(OrderItem, 'batch_id'):
+        return {}
+    return dict(db.session.execute(
+        db.select(OrderItem.batch_id, db.func.sum(OrderItem.quantity)).where(
+            OrderItem.batch_id.in_(batch_ids)
+        ).group_by(OrderItem.batch_id)
+    ).all())
+
+def get_referenced_batch_ids(batch_ids):
+    """Get the batches order items reference through a foreign key to product_batch"""
+    # Archived rows keep their ids, so plain batch_id values still find them
+    # after the delete; a foreign key would have to be cleared, losing the trace
+    if not hasattr(OrderItem, 'batch_id') or not OrderItem.__table__.c.batch_id.foreign_keys:
+        return set()
+    return set(db.session.execute(
+        db.select(OrderItem.batch_id).where(OrderItem.batch_id.in_(batch_ids)).distinct()
+    ).scalars())
+
+def sweep_expired_batches(chunk_size=SWEEP_CHUNK_SIZE, now=None):
+    """Archive expired batches chunk by chunk and account for their waste"""
+    now = now or datetime.utcnow()
+    batch_table = ProductBatch.__table__
+    archive_columns = [column.name for column in batch_table.columns]
+    stats = {'archived': 0, 'kept': 0, 'quantity_wasted': 0, 'chunks': 0, 'max_chunk_ms': 0.0, 'total_chunk_ms': 0.0}
+    started = time.perf_counter()
+    
+    while True:
+        chunk_started = time.perf_counter()
+        # Kept batches are already archived
+        batches = db.session.execute(
+            db.select(batch_table).where(
+                batch_table.c.expiry_datetime <= now,
+                ~db.exists().where(ArchivedProductBatch.id == batch_table.c.id)
+            ).order_by(batch_table.c.id).limit(chunk_size).with_for_update()
+        ).mappings().all()
+        if not batches:
+            db.session.rollback()
+            break
+        
+        batch_ids = [batch['id'] for batch in batches]
+        sales = get_batch_sales(batch_ids)
+        
+        archive_rows = []
+        waste = {}
+        for batch in batches:
+            sold = min(sales.get(batch['id'], 0) or 0, batch['quantity_prepared'])
+            wasted = batch['quantity_prepared'] - sold
+            archive_rows.append(dict(
+                {column: batch[column] for column in archive_columns},
+                quantity_sold=sold, quantity_wasted=wasted, archived_at=now
+            ))
+            key = (batch['expiry_datetime'].date(), batch['product_id'], batch['preparation_location'])
+            totals = waste.setdefault(key, {'batches': 0, 'quantity_prepared': 0, 'quantity_wasted': 0})
+            totals['batches'] += 1
+            totals['quantity_prepared'] += batch['quantity_prepared']
+            totals['quantity_wasted'] += wasted
+            stats['quantity_wasted'] += wasted
+        
+        db.session.execute(db.insert(ArchivedProductBatch), archive_rows)
+        referenced = get_referenced_batch_ids(batch_ids)
+        deleted_ids = [batch_id for batch_id in batch_ids if batch_id not in referenced]
+        if deleted_ids:
+            db.session.execute(db.delete(ProductBatch).where(ProductBatch.id.in_(deleted_ids)))
+        for key, increments in waste.items():
+            add_to_rollup(DailyWasteRollup, ('day', 'product_id', 'preparation_location'), key, increments)
+        db.session.commit()
+        
+        chunk_ms = (time.perf_counter() - chunk_started) * 1000
+        stats['archived'] += len(batches)
+        stats['kept'] += len(referenced)
+        stats['chunks'] += 1
+        stats['total_chunk_ms'] += chunk_ms
+        stats['max_chunk_ms'] = max(stats['max_chunk_ms'], chunk_ms)
+    
+    stats['elapsed_seconds'] = time.perf_counter() - started
+    return stats
+
+@app.cli.command('sweep-expired-batches')
+@click.option('--chunk-size', default=SWEEP_CHUNK_SIZE, show_default=True, help='Batches per transaction')
+def sweep_expired_batches_command(chunk_size):
+    """Archive expired batches and record their unsold quantity as waste"""
+    stats = sweep_expired_batches(chunk_size)
+    if not stats['archived']:
+        print("No expired batches to sweep")
+        return
+    
+    print(f"Archived {stats['archived']} batches ({stats['quantity_wasted']} units wasted) "
+          f"in {stats['chunks']} chunks, {stats['archived'] / stats['elapsed_seconds']:.0f} batches/s")
+    if stats['kept']:
+        print(f"Kept {stats['kept']} archived batches that order items still reference")
+    print(f"Transaction time per chunk: avg {stats['total_chunk_ms'] / stats['chunks']:.1f} ms, "
+          f"max {stats['max_chunk_ms']:.1f} ms")
+
+# Password hashing and token signing. Login, registration and token_required
+# go through these so the CPU-heavy work runs in a bounded worker pool
+# (AUTH_POOL_KIND: process, thread or inline) instead of on the request thread.
+# HS* tokens are signed with SECRET_KEY. Asymmetric algorithms (RS*, PS*, ES*,
+# EdDSA) sign with the PEM private key at AUTH_TOKEN_PRIVATE_KEY_PATH and
+# verify with the public key at AUTH_TOKEN_PUBLIC_KEY_PATH, which needs the
+# cryptography package.
+
+AUTH_TOKEN_LIFETIME_SECONDS = 7 * 24 * 3600
+AUTH_MIN_PASSWORD_LENGTH = 8
+
+app.config.setdefault('AUTH_POOL_KIND', os.environ.get('AUTH_POOL_KIND', 'thread'))
+app.config.setdefault('AUTH_POOL_WORKERS', int(os.environ.get('AUTH_POOL_WORKERS', '0')) or None)
+app.config.setdefault('AUTH_POOL_MAX_PENDING', int(os.environ.get('AUTH_POOL_MAX_PENDING', '64')))
+app.config.setdefault('AUTH_TOKEN_ALGORITHM', os.environ.get('AUTH_TOKEN_ALGORITHM', 'HS256'))
+app.config.setdefault('AUTH_TOKEN_PRIVATE_KEY_PATH', os.environ.get('AUTH_TOKEN_PRIVATE_KEY_PATH'))
+app.config.setdefault('AUTH_TOKEN_PUBLIC_KEY_PATH', os.environ.get('AUTH_TOKEN_PUBLIC_KEY_PATH'))
+
+auth_pool.configure(
+    kind=app.config['AUTH_POOL_KIND'],
+    workers=app.config['AUTH_POOL_WORKERS'],
+    max_pending=app.config['AUTH_POOL_MAX_PENDING']
+)
+
+def hash_user_password(password):
+    """Hash a new or changed password"""
+    return auth_pool.hash_password(password)
+
+def check_user_password(user, password):
+    """Check a login password against the user's stored hash"""
+    return auth_pool.verify_password(user.password_hash, password)
+
+@lru_cache(maxsize=8)
+def read_token_key(path):
+    """Read a PEM key file once per worker"""
+    with open(path, encoding='utf-8') as key_file:
+        return key_file.read()
+
+def get_token_keys():
+    """Get the (signing, verification) keys for AUTH_TOKEN_ALGORITHM"""
+    algorithm = app.config['AUTH_TOKEN_ALGORITHM']
+    if not algorithm.startswith(auth_pool.OFFLOADED_TOKEN_ALGORITHM_PREFIXES):
+        return app.config['SECRET_KEY'], app.config['SECRET_KEY']
+    
+    private_key_path = app.config['AUTH_TOKEN_PRIVATE_KEY_PATH']
+    public_key_path = app.config['AUTH_TOKEN_PUBLIC_KEY_PATH']
+    if not private_key_path or not public_key_path:
+        raise RuntimeError(f"{algorithm} tokens need AUTH_TOKEN_PRIVATE_KEY_PATH and AUTH_TOKEN_PUBLIC_KEY_PATH")
+    # PEM text rather than key objects, so process pools can pickle them
+    return read_token_key(private_key_path), read_token_key(public_key_path)
+
+def issue_auth_token(user, lifetime_seconds=AUTH_TOKEN_LIFETIME_SECONDS):
+    """Sign a JWT for a logged-in user"""
+    payload = {'user_id': user.id, 'exp': int(time.time()) + lifetime_seconds}
+    return auth_pool.sign_token(payload, get_token_keys()[0], app.config['AUTH_TOKEN_ALGORITHM'])
+
+def decode_auth_token(token):
+    """Verify a JWT and return its payload"""
+    return auth_pool.decode_token(token, get_token_keys()[1], app.config['AUTH_TOKEN_ALGORITHM'])
+
+@app.errorhandler(auth_pool.AuthPoolBusy)
+def auth_pool_busy(e):
+    """Shed logins when the hashing pool is saturated instead of queueing them"""
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
 
 def get_featured_ingredient_of_week():
     """Get featured natural ingredient information"""
@@ -1206,6 +4726,104 @@ def get_weekly_diy_tip():
     ]
     return random.choice(tips)
 
+# Referral ledger helpers
+
+REFERRAL_REWARD_AMOUNT = 200
+REFERRAL_CODE_PREFIX = 'FRESH'
+# Stats shown before a user's first referral creates their counter row
+EMPTY_REFERRAL_STATS = {
+    'total_referrals': 0,
+    'successful_referrals': 0,
+    'pending_referrals': 0,
+    'total_rewards_earned': 0,
+    'current_referral_code': None
+}
+# Crockford base32: no I, L, O or U, so codes can't be misread when typed
+REFERRAL_CODE_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+def encode_referral_code(sequence):
+    """Encode a referral ledger id as a short, unique base32 code"""
+    digits = ''
+    while True:
+        sequence, remainder = divmod(sequence, 32)
+        digits = REFERRAL_CODE_ALPHABET[remainder] + digits
+        if not sequence:
+            break
+    return f"{REFERRAL_CODE_PREFIX}{digits.rjust(4, '0')}"
+
+def increment_referral_stats(user_id, **increments):
+    """Atomically add to a user's referral counters"""
+    values = {getattr(ReferralStats, column): getattr(ReferralStats, column) + amount
+              for column, amount in increments.items()}
+    updated = ReferralStats.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+    if not updated:
+        try:
+            # First referral activity for this user - create the counter row
+            with db.session.begin_nested():
+                db.session.add(ReferralStats(
+                    user_id=user_id,
+                    total_referrals=0,
+                    successful_referrals=0,
+                    pending_referrals=0,
+                    total_rewards_earned=0
+                ))
+        except IntegrityError:
+            pass  # Created concurrently; the update below applies to it
+        ReferralStats.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+
+def create_referral(referrer, friend_email):
+    """Record a referral invitation and give it a collision-free code"""
+    referral = Referral(referrer_id=referrer.id, friend_email=friend_email, status='pending')
+    db.session.add(referral)
+    db.session.flush()  # Assigns the ledger id the code is derived from
+    referral.referral_code = encode_referral_code(referral.id)
+    
+    increment_referral_stats(referrer.id, total_referrals=1, pending_referrals=1)
+    ReferralStats.query.filter_by(user_id=referrer.id).update(
+        {ReferralStats.current_referral_code: referral.referral_code},
+        synchronize_session=False
+    )
+    
+    db.session.commit()
+    return referral
+
+def redeem_referral_code(referral_code, user):
+    """Mark a pending referral as successful and reward the referrer"""
+    referral = Referral.query.filter_by(referral_code=referral_code).first()
+    
+    if not referral:
+        return None, 'Invalid referral code'
+    if referral.referrer_id == user.id:
+        return None, 'You cannot redeem your own referral code'
+    
+    # Conditional update so a code can only ever be redeemed once; the unique
+    # referred_user_id lets each user redeem only one code, even concurrently
+    try:
+        redeemed = Referral.query.filter_by(id=referral.id, status='pending').update({
+            Referral.status: 'successful',
+            Referral.referred_user_id: user.id,
+            Referral.reward_amount: REFERRAL_REWARD_AMOUNT,
+            Referral.redeemed_at: datetime.utcnow()
+        }, synchronize_session=False)
+    except IntegrityError:
+        db.session.rollback()
+        return None, 'You have already redeemed a referral code'
+    
+    if not redeemed:
+        db.session.rollback()
+        return None, 'This referral code has already been used'
+    
+    increment_referral_stats(
+        referral.referrer_id,
+        successful_referrals=1,
+        pending_referrals=-1,
+        total_rewards_earned=REFERRAL_REWARD_AMOUNT
+    )
+    
+    db.session.commit()
+    db.session.refresh(referral)
+    return referral, None
+
 def send_referral_invitation(friend_email, referrer_name, referral_code):
     """Send referral invitation email"""
     try:
@@ -1240,10 +4858,17 @@ def send_referral_invitation(friend_email, referrer_name, referral_code):
     except Exception as e:
         print(f"Error sending referral invitation: {e}")
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database tables and load the sample data"""
+    db.create_all()
+    initialize_sample_data()
+    # Zones that already existed were never written to the timeline
+    refresh_delivery_timeline()
+
 # Add this to the end of your existing app.py file
+# Schema creation and seeding run once per deploy with `flask init-db`,
+# not on every worker start
 
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-        initialize_sample_data()
     app.run(debug=True)
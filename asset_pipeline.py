@@ -0,0 +1,172 @@
+# Static asset build for Freskin pages
+# Moves a rendered page's inline <style> and <script> blocks into minified,
+# content-hashed files and keeps the rest as a small pre-rendered HTML shell.
+# Each asset is also written precompressed (.gz, and .br when brotli is
+# installed) for the app to serve. Runs at deploy time through
+# `flask build-assets`; the app only reads the manifest and the built files.
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only attribute-less blocks are inline assets; <script src=...> tags are kept.
+# Blocks are merged only up to the next kept tag of the same kind, so scripts
+# still run, and stylesheets still cascade, in the order they were written.
+STYLE_BLOCK = re.compile(r'[ \t]*<style>(.*?)</style>[ \t]*\n?', re.S)
+SCRIPT_BLOCK = re.compile(r'[ \t]*<script>(.*?)</script>[ \t]*\n?', re.S)
+KEPT_STYLE_TAG = re.compile(r'<style\s[^>]*>|<link\s[^>]*\bstylesheet\b[^>]*>', re.I)
+KEPT_SCRIPT_TAG = re.compile(r'<script\s[^>]*>', re.I)
+# Elements whose whitespace is significant, or that hold code, stay as written
+RAW_ELEMENT = re.compile(r'<(pre|textarea|script|style)\b.*?</\1\s*>', re.S | re.I)
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+FINGERPRINT_LENGTH = 12
+ASSET_DIR = 'assets'
+MANIFEST_NAME = 'manifest.json'
+
+
+def fingerprint(content):
+    """Short content hash used in asset file names and ETags"""
+    return hashlib.sha256(content.encode()).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def minify_css(css):
+    """Drop comments and insignificant whitespace from a stylesheet"""
+    css = CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = CSS_PUNCTUATION.sub(r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """Drop indentation, blank lines and whole-line comments from a script"""
+    # Conservative on purpose: line breaks are kept so automatic semicolon
+    # insertion is unaffected, and lines inside template literals are left
+    # exactly as written
+    lines = []
+    in_template = False
+    for line in js.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        # An odd number of unescaped backticks opens or closes a template literal
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+
+def minify_html(html):
+    """Drop indentation and blank lines from the HTML shell, outside raw elements"""
+    parts = []
+    position = 0
+    for match in RAW_ELEMENT.finditer(html):
+        parts.append(re.sub(r'\s*\n\s*', '\n', html[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(re.sub(r'\s*\n\s*', '\n', html[position:]))
+    return ''.join(parts).strip()
+
+
+def write_asset(static_dir, name, extension, content):
+    """Write a fingerprinted asset, returning its path relative to static_dir"""
+    relative_path = f"{ASSET_DIR}/{name}.{fingerprint(content)}.{extension}"
+    path = os.path.join(static_dir, relative_path)
+    # Same name means same content, so an existing file is already correct
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        data = content.encode()
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+    return relative_path
+
+
+def group_blocks(pattern, kept_tag, html):
+    """Split inline blocks into runs that no kept tag of the same kind interrupts"""
+    blocks = list(pattern.finditer(html))
+    kept = [match.start() for match in kept_tag.finditer(html)
+            if not any(block.start() <= match.start() < block.end() for block in blocks)]
+    groups = []
+    for block in blocks:
+        if groups and not any(groups[-1][-1].end() <= position < block.start() for position in kept):
+            groups[-1].append(block)
+        else:
+            groups.append([block])
+    return groups
+
+
+def extract_assets(pattern, kept_tag, html, minify, write, make_tag):
+    """Move each run of inline blocks into one asset, tagged where the run began"""
+    paths = []
+    total_bytes = 0
+    replacements = []
+    for group in group_blocks(pattern, kept_tag, html):
+        content = minify('\n'.join(block.group(1) for block in group))
+        if content:
+            path = write(content)
+            paths.append(path)
+            total_bytes += len(content.encode())
+            replacements.append((group[0], make_tag(path) + '\n'))
+        else:
+            replacements.append((group[0], ''))
+        replacements.extend((block, '') for block in group[1:])
+
+    for block, replacement in sorted(replacements, key=lambda item: item[0].start(), reverse=True):
+        html = html[:block.start()] + replacement + html[block.end():]
+    return html, paths, total_bytes
+
+
+def build_page(name, html, static_dir, build_dir, static_url='/static'):
+    """Extract a page's inline assets and write its pre-rendered shell"""
+    stem = os.path.splitext(name)[0]
+    entry = {'source_bytes': len(html.encode())}
+
+    shell, css, css_bytes = extract_assets(
+        STYLE_BLOCK, KEPT_STYLE_TAG, html, minify_css,
+        lambda content: write_asset(static_dir, stem, 'css', content),
+        lambda path: f'<link rel="stylesheet" href="{static_url}/{path}">'
+    )
+    shell, js, js_bytes = extract_assets(
+        SCRIPT_BLOCK, KEPT_SCRIPT_TAG, shell, minify_js,
+        lambda content: write_asset(static_dir, stem, 'js', content),
+        lambda path: f'<script src="{static_url}/{path}"></script>'
+    )
+    entry.update(css=css, css_bytes=css_bytes, js=js, js_bytes=js_bytes)
+
+    shell = minify_html(shell)
+    entry['shell_bytes'] = len(shell.encode())
+    entry['etag'] = fingerprint(shell)
+
+    os.makedirs(build_dir, exist_ok=True)
+    with open(os.path.join(build_dir, name), 'w', encoding='utf-8') as f:
+        f.write(shell)
+
+    manifest = load_manifest(build_dir)
+    manifest[name] = entry
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return entry
+
+
+def load_manifest(build_dir):
+    """Read the build manifest, or an empty one if nothing has been built"""
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
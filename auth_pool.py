@@ -0,0 +1,99 @@
+# Password hashing and token signing off the request thread
+# Werkzeug password hashes and asymmetric JWT signatures are computed on a
+# bounded thread or process pool, so a burst of logins can't hold every
+# request thread; past max_pending queued calls AuthPoolBusy is raised.
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import jwt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# HMAC signing takes microseconds - less than a hop through the pool - so
+# only asymmetric algorithms are worth offloading
+OFFLOADED_TOKEN_ALGORITHM_PREFIXES = ('RS', 'PS', 'ES', 'Ed')
+
+pool_config = {'kind': 'thread', 'workers': os.cpu_count() or 2, 'max_pending': 64}
+pool_state = {'executor': None, 'slots': None, 'pid': None}
+pool_lock = threading.Lock()
+
+
+class AuthPoolBusy(Exception):
+    """Raised when too many hashing or signing operations are already queued"""
+
+
+def configure(kind='thread', workers=None, max_pending=64):
+    """Set the pool type ('process', 'thread' or 'inline'), size and queue bound"""
+    if kind not in ('process', 'thread', 'inline'):
+        raise ValueError(f"Unknown auth pool kind: {kind}")
+    with pool_lock:
+        shutdown_executor()
+        pool_config.update(kind=kind, workers=workers or os.cpu_count() or 2, max_pending=max_pending)
+
+
+def shutdown_executor():
+    """Stop the current executor (callers hold pool_lock)"""
+    if pool_state['executor'] is not None and pool_state['pid'] == os.getpid():
+        pool_state['executor'].shutdown(wait=False)
+    pool_state.update(executor=None, slots=None, pid=None)
+
+
+def get_executor():
+    """Get this process's executor, creating it on first use after fork"""
+    if pool_state['pid'] != os.getpid():
+        with pool_lock:
+            if pool_state['pid'] != os.getpid():
+                executor_class = ProcessPoolExecutor if pool_config['kind'] == 'process' else ThreadPoolExecutor
+                pool_state.update(
+                    executor=executor_class(max_workers=pool_config['workers']),
+                    slots=threading.BoundedSemaphore(pool_config['max_pending']),
+                    pid=os.getpid()
+                )
+    return pool_state['executor'], pool_state['slots']
+
+
+def run(fn, *args, timeout=None):
+    """Run fn in the pool and wait for it, refusing work beyond the queue bound"""
+    if pool_config['kind'] == 'inline':
+        return fn(*args)
+
+    executor, slots = get_executor()
+    if not slots.acquire(blocking=False):
+        raise AuthPoolBusy('Authentication is busy, please retry')
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result(timeout=timeout)
+
+
+def decode_token_in_worker(token, secret, algorithms):
+    """Verify and decode a JWT (module level so process pools can pickle it)"""
+    return jwt.decode(token, secret, algorithms=algorithms)
+
+
+def hash_password(password):
+    """Hash a password in the pool"""
+    return run(generate_password_hash, password)
+
+
+def verify_password(password_hash, password):
+    """Check a password against its hash in the pool"""
+    return run(check_password_hash, password_hash, password)
+
+
+def sign_token(payload, secret, algorithm='HS256'):
+    """Sign a JWT, in the pool for asymmetric algorithms"""
+    if algorithm.startswith(OFFLOADED_TOKEN_ALGORITHM_PREFIXES):
+        return run(jwt.encode, payload, secret, algorithm)
+    return jwt.encode(payload, secret, algorithm)
+
+
+def decode_token(token, secret, algorithm='HS256'):
+    """Verify a JWT, in the pool for asymmetric algorithms"""
+    if algorithm.startswith(OFFLOADED_TOKEN_ALGORITHM_PREFIXES):
+        return run(decode_token_in_worker, token, secret, [algorithm])
+    return decode_token_in_worker(token, secret, [algorithm])
@@ -0,0 +1,80 @@
+# Benchmark for login throughput with and without the auth worker pool
+#
+#   python benchmarks/bench_auth_pool.py --clients 16 --seconds 5
+#
+# Simulates concurrent logins (password check plus token signing) with
+# auth_pool in inline, thread and process mode and reports logins per second,
+# per core and the p99 login latency.
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth_pool  # noqa: E402
+
+SECRET = 'bench-secret'
+
+
+def run_clients(clients, seconds, password_hash):
+    """Log in from several threads until the time is up"""
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if auth_pool.verify_password(password_hash, 'correct horse'):
+                    auth_pool.sign_token({'user_id': 1}, SECRET)
+            except auth_pool.AuthPoolBusy:
+                with lock:
+                    rejected[0] += 1
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, rejected[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark login throughput with and without the auth worker pool')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--max-pending', type=int, default=64)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    password_hash = auth_pool.generate_password_hash('correct horse')
+    print(f"{args.clients} clients, {args.workers} pool workers, {cores} cores")
+
+    for kind in ('inline', 'thread', 'process'):
+        auth_pool.configure(kind=kind, workers=args.workers, max_pending=args.max_pending)
+        # Warm up so process start-up isn't counted
+        auth_pool.verify_password(password_hash, 'correct horse')
+
+        latencies, rejected = run_clients(args.clients, args.seconds, password_hash)
+        rate = len(latencies) / args.seconds
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) > 1 else 0
+        print(f"{kind:>8}: {rate:8.1f} logins/s  {rate / cores:7.1f} per core  "
+              f"p99 {p99:7.1f} ms  rejected {rejected}")
+
+    auth_pool.configure(kind='inline')
+
+
+if __name__ == '__main__':
+    main()
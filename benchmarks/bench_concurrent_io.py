@@ -0,0 +1,94 @@
+# Offline benchmark for concurrent I/O in /api/daily-fresh-report
+#
+#   python benchmarks/bench_concurrent_io.py --clients 16 --requests 400
+#
+# Replays the endpoint's I/O shape without a server or database: the batch
+# query runs alongside the weather lookup and the recommendation query that
+# depends on it. Each step is a sleep of the given latency, which, like a
+# socket wait, releases the GIL. Requests run sequentially (CONCURRENT_IO=0)
+# and through a shared pool of --pool-workers threads (CONCURRENT_IO=1), from
+# the given number of concurrent clients, standing in for gthread threads.
+# A pool smaller than the number of request threads queues selections behind
+# each other and ends up slower than running them inline.
+# bench_daily_fresh_report.py measures the same thing against a running app.
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The pool app.py starts, from the same environment variable and default
+IO_EXECUTOR_WORKERS = int(os.environ.get('IO_EXECUTOR_WORKERS', '16'))
+
+
+def weather_adapted_selection(weather_ms, recommendation_ms):
+    """Weather lookup followed by the recommendation query"""
+    time.sleep(weather_ms / 1000)
+    time.sleep(recommendation_ms / 1000)
+
+
+def daily_fresh_report(executor, batch_ms, weather_ms, recommendation_ms):
+    """One request, with the selection on the pool when an executor is given"""
+    if executor is None:
+        weather_adapted_selection(weather_ms, recommendation_ms)
+        time.sleep(batch_ms / 1000)
+        return
+    selection = executor.submit(weather_adapted_selection, weather_ms, recommendation_ms)
+    time.sleep(batch_ms / 1000)
+    selection.result()
+
+
+def run(executor, clients, requests, latencies_ms):
+    """Issue requests from several client threads, returning per-request latencies"""
+    latencies = []
+    remaining = [requests]
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            daily_fresh_report(executor, *latencies_ms)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Model sequential vs concurrent I/O for the daily fresh report')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--batch-ms', type=float, default=20)
+    parser.add_argument('--weather-ms', type=float, default=60)
+    parser.add_argument('--recommendation-ms', type=float, default=15)
+    parser.add_argument('--pool-workers', type=int, default=IO_EXECUTOR_WORKERS,
+                        help='defaults to the app\'s IO_EXECUTOR_WORKERS')
+    args = parser.parse_args()
+
+    latencies_ms = (args.batch_ms, args.weather_ms, args.recommendation_ms)
+    print(f"batch {args.batch_ms} ms | weather {args.weather_ms} ms -> recommendations "
+          f"{args.recommendation_ms} ms, {args.clients} clients, {args.pool_workers} pool workers")
+
+    with ThreadPoolExecutor(max_workers=args.pool_workers) as executor:
+        for name, mode_executor in (('sequential', None), ('concurrent', executor)):
+            latencies, wall_time = run(mode_executor, args.clients, args.requests, latencies_ms)
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(f"{name:>10}: p50 {quantiles[49] * 1000:6.1f} ms  p95 {quantiles[94] * 1000:6.1f} ms  "
+                  f"{len(latencies) / wall_time:6.1f} req/s")
+
+
+if __name__ == '__main__':
+    main()
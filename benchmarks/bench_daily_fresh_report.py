@@ -0,0 +1,93 @@
+# Latency benchmark for /api/daily-fresh-report
+#
+# Start the app under gunicorn in each mode and point this script at it:
+#
+#   sequential, sync workers:    CONCURRENT_IO=0 gunicorn -w 4 -k sync app:app
+#   concurrent, sync workers:    CONCURRENT_IO=1 gunicorn -w 4 -k sync app:app
+#   concurrent, async workers:   CONCURRENT_IO=1 gunicorn -w 4 -k gevent app:app  (needs gevent installed)
+#
+#   python benchmarks/bench_daily_fresh_report.py --url http://127.0.0.1:8000 --token <jwt>
+#
+# Run each mode with the same --concurrency and --requests and compare the
+# reported latency percentiles and throughput.
+
+import argparse
+import statistics
+import threading
+import time
+import urllib.request
+
+
+def fetch(url, token):
+    """Time one request, returning (seconds, status)"""
+    req = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - started, status
+
+
+def run(url, token, concurrency, total_requests):
+    """Issue total_requests requests from concurrency threads"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = [total_requests]
+
+    def worker():
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            elapsed, status = fetch(url, token)
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors.append(status)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    return latencies, errors, wall_time
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api/daily-fresh-report latency')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--token', required=True, help='JWT for a user with a skin profile')
+    parser.add_argument('--city', default='Mumbai')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    args = parser.parse_args()
+
+    url = f"{args.url.rstrip('/')}/api/daily-fresh-report?city={args.city}"
+    run(url, args.token, min(args.concurrency, args.warmup), args.warmup)
+    latencies, errors, wall_time = run(url, args.token, args.concurrency, args.requests)
+
+    print(f"requests:    {len(latencies)} ({len(errors)} errors)")
+    print(f"throughput:  {len(latencies) / wall_time:.1f} req/s")
+    print(f"mean:        {statistics.mean(latencies) * 1000:.1f} ms")
+    print(f"p50:         {percentile(latencies, 0.50) * 1000:.1f} ms")
+    print(f"p95:         {percentile(latencies, 0.95) * 1000:.1f} ms")
+    print(f"p99:         {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# Expiry sweep benchmark: sweep throughput and its effect on concurrent reads
+#
+#   python benchmarks/bench_expiry_sweep.py --database instance/freskin.db --seed 50000
+#
+# Optionally seeds expired batches straight into product_batch, measures the
+# latency of the fresh-batch query from reader threads while idle, then runs
+# `flask sweep-expired-batches` and measures the same query while it works.
+# The sweeper prints its own throughput and per-chunk transaction times.
+
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FRESH_QUERY = 'SELECT COUNT(*) FROM product_batch WHERE expiry_datetime > ?'
+
+
+def seed_expired_batches(database, count):
+    """Insert expired batches for the first active product"""
+    connection = sqlite3.connect(database)
+    product_id = connection.execute('SELECT id FROM product ORDER BY id LIMIT 1').fetchone()[0]
+    prepared = datetime.utcnow() - timedelta(days=2)
+    run = int(time.time())
+    connection.executemany(
+        'INSERT INTO product_batch (product_id, batch_number, preparation_date, expiry_datetime, '
+        'quantity_prepared, preparation_location, quality_score) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (
+            (product_id, f'BENCH-{run}-{number}', prepared, prepared + timedelta(hours=12),
+             50, f'Kitchen {number % 5}', 4.5)
+            for number in range(count)
+        )
+    )
+    connection.commit()
+    connection.close()
+
+
+def read_latencies(database, stop, latencies):
+    """Run the fresh-batch query in a loop, recording each latency"""
+    connection = sqlite3.connect(database, timeout=30)
+    while not stop.is_set():
+        started = time.perf_counter()
+        connection.execute(FRESH_QUERY, (datetime.utcnow(),)).fetchone()
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def measure_reads(database, readers, action):
+    """Collect reader latencies while action() runs"""
+    stop = threading.Event()
+    latencies = []
+    threads = [threading.Thread(target=read_latencies, args=(database, stop, latencies)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    action()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def report(label, latencies):
+    """Print latency percentiles"""
+    ordered = sorted(latencies)
+    p99 = ordered[int(0.99 * (len(ordered) - 1))]
+    print(f"{label}: {len(ordered)} reads, p50 {statistics.median(ordered) * 1000:.2f} ms, "
+          f"p99 {p99 * 1000:.2f} ms, max {ordered[-1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the expiry sweeper')
+    parser.add_argument('--database', required=True, help='SQLite database file used by the app')
+    parser.add_argument('--seed', type=int, default=0, help='Expired batches to insert first')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--baseline-seconds', type=float, default=5.0)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed_expired_batches(args.database, args.seed)
+
+    baseline = measure_reads(args.database, args.readers, lambda: time.sleep(args.baseline_seconds))
+
+    def sweep():
+        started = time.perf_counter()
+        subprocess.run(
+            ['flask', 'sweep-expired-batches', '--chunk-size', str(args.chunk_size)],
+            cwd=ROOT, check=True, env=dict(os.environ, FLASK_APP=os.environ.get('FLASK_APP', 'app'))
+        )
+        print(f"sweep wall time: {time.perf_counter() - started:.2f} s")
+
+    during = measure_reads(args.database, args.readers, sweep)
+
+    report('reads while idle    ', baseline)
+    report('reads during sweep  ', during)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Benchmark for the kitchen preparation scheduler
+#
+#   python benchmarks/bench_kitchen_scheduler.py --kitchens 50 --batches 5000
+#
+# Generates a day's batches spread over the kitchens, with deadlines taken
+# from the seeded delivery slots, and times schedule_preparation().
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kitchen_scheduler import parse_delivery_slots, schedule_preparation, slot_window  # noqa: E402
+
+SEEDED_SLOTS = [
+    'morning:6-9,evening:5-8,night:8-10',
+    'morning:7-10,evening:6-9',
+    'morning:6-9,evening:5-8',
+]
+
+
+def generate_jobs(kitchens, batches, seed):
+    """Build random preparation jobs for the given number of kitchens"""
+    rng = random.Random(seed)
+    delivery_date = date.today() + timedelta(days=1)
+    windows = [
+        slot_window(delivery_date, hours)
+        for slots in SEEDED_SLOTS
+        for hours in parse_delivery_slots(slots).values()
+    ]
+    kitchen_names = [f'kitchen-{number}' for number in range(kitchens)]
+    jobs = [
+        {
+            'id': number,
+            'kitchen': rng.choice(kitchen_names),
+            'deadline': rng.choice(windows)[0],
+            'duration': timedelta(minutes=rng.choice([20, 30, 45, 60, 90]))
+        }
+        for number in range(batches)
+    ]
+    capacities = {name: rng.randint(4, 12) for name in kitchen_names}
+    opens_at = datetime.combine(delivery_date, datetime.min.time()) - timedelta(hours=2)
+    return jobs, capacities, opens_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark schedule_preparation()')
+    parser.add_argument('--kitchens', type=int, default=50)
+    parser.add_argument('--batches', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    jobs, capacities, opens_at = generate_jobs(args.kitchens, args.batches, args.seed)
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = schedule_preparation(jobs, capacities, opens_at)
+        timings.append(time.perf_counter() - started)
+
+    print(f"{args.kitchens} kitchens x {args.batches} batches, {args.runs} runs")
+    print(f"mean:  {statistics.mean(timings) * 1000:.1f} ms")
+    print(f"max:   {max(timings) * 1000:.1f} ms")
+    print(f"late:  {len(result['late'])} batches")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Startup benchmark: module import time and gunicorn cold start
+#
+#   python benchmarks/bench_startup.py --runs 10
+#   python benchmarks/bench_startup.py --gunicorn --runs 5 --path /api/delivery-zones
+#
+# Import time is measured in a fresh interpreter per run. Cold start is the
+# time from launching a single-worker gunicorn until the first successful
+# response, which includes worker boot and the first request.
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); "
+    "import {module}; print(time.perf_counter() - started)"
+)
+
+
+def measure_import(module):
+    """Import the app module in a fresh interpreter and return seconds"""
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_SNIPPET.format(module=module)],
+        cwd=ROOT,
+        text=True
+    )
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port():
+    """Find an unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_cold_start(app_spec, path, timeout):
+    """Start gunicorn and return seconds until the first 200 response"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        ['gunicorn', '-w', '1', '-b', f'127.0.0.1:{port}', app_spec],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f'gunicorn did not answer {path} within {timeout}s')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(label, samples):
+    """Print summary statistics for a list of timings"""
+    print(f"{label}: mean {statistics.mean(samples) * 1000:.1f} ms, "
+          f"min {min(samples) * 1000:.1f} ms, max {max(samples) * 1000:.1f} ms "
+          f"over {len(samples)} runs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app import time and gunicorn cold start')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--gunicorn', action='store_true', help='Also measure gunicorn cold start')
+    parser.add_argument('--path', default='/api/delivery-zones', help='Unauthenticated path to probe')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    report('import', [measure_import(args.module) for _ in range(args.runs)])
+    if args.gunicorn:
+        report('cold start', [
+            measure_cold_start(f'{args.module}:app', args.path, args.timeout)
+            for _ in range(args.runs)
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# Benchmark for the fingerprinted static asset pipeline
+#
+#   python benchmarks/bench_static_assets.py --requests 200
+#
+# Builds templates/index.html with asset_pipeline into a temporary directory
+# and serves both variants from a local HTTP server the way the app does:
+# HTML is gzipped as compress_response does for the cacheable index endpoint
+# (level 9, compressed once per distinct body), and hashed assets are sent
+# from the .gz files the build writes next to them.
+#
+#   inline:     the full template, read and sent on every page load
+#   pipeline:   the pre-rendered shell (weak ETag revalidated) plus hashed
+#               assets with far-future cache headers
+#
+# For a first visit and a repeat visit (browser cache warm) it reports the
+# median time to first byte of the page request and the bytes transferred.
+# 'new shell' is a repeat visit after a deploy that only changed the HTML.
+
+import argparse
+import gzip
+import hashlib
+import http.client
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asset_pipeline  # noqa: E402
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'index.html')
+ASSET_CACHE_MAX_AGE = 365 * 24 * 3600
+HTML_GZIP_LEVEL = 9
+
+
+def make_handler(static_dir, build_dir, etag):
+    """Request handler serving the inline page, the shell and the assets"""
+    compressed_html = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def accepts_gzip(self):
+            return 'gzip' in self.headers.get('Accept-Encoding', '')
+
+        def send_html(self, body, headers=()):
+            if self.accepts_gzip():
+                key = hashlib.blake2b(body, digest_size=16).digest()
+                if key not in compressed_html:
+                    compressed_html[key] = gzip.compress(body, HTML_GZIP_LEVEL, mtime=0)
+                body = compressed_html[key]
+                headers = list(headers) + [('Content-Encoding', 'gzip')]
+            self.send_body(body, 'text/html', list(headers) + [('Vary', 'Accept-Encoding')])
+
+        def send_body(self, body, content_type, headers=()):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/inline':
+                # Re-read on every request, like rendering the template per page load
+                with open(TEMPLATE_PATH, 'rb') as f:
+                    self.send_html(f.read())
+            elif self.path == '/shell':
+                if self.headers.get('If-None-Match') == f'W/"{etag}"':
+                    self.send_response(304)
+                    self.send_header('ETag', f'W/"{etag}"')
+                    self.end_headers()
+                    return
+                with open(os.path.join(build_dir, 'index.html'), 'rb') as f:
+                    body = f.read()
+                self.send_html(body, [('ETag', f'W/"{etag}"'), ('Cache-Control', 'no-cache')])
+            elif self.path.startswith('/static/'):
+                content_type = 'text/css' if self.path.endswith('.css') else 'application/javascript'
+                path = os.path.join(static_dir, self.path[len('/static/'):])
+                headers = [('Cache-Control', f'public, max-age={ASSET_CACHE_MAX_AGE}, immutable'),
+                           ('Vary', 'Accept-Encoding')]
+                # Precompressed at build time, as the app serves them
+                if self.accepts_gzip() and os.path.isfile(path + '.gz'):
+                    path += '.gz'
+                    headers.append(('Content-Encoding', 'gzip'))
+                with open(path, 'rb') as f:
+                    self.send_body(f.read(), content_type, headers)
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+    return Handler
+
+
+def fetch(connection, path, headers=None):
+    """GET a path, returning (seconds to first byte, bytes transferred)"""
+    headers = dict(headers or {}, **{'Accept-Encoding': 'gzip'})
+    started = time.perf_counter()
+    connection.request('GET', path, headers=headers)
+    response = connection.getresponse()
+    first_byte = time.perf_counter() - started
+    body = response.read()
+    header_bytes = sum(len(name) + len(value) + 4 for name, value in response.getheaders())
+    return first_byte, len(body) + header_bytes
+
+
+def measure_visit(port, requests, paths):
+    """Median TTFB of the page request and bytes per visit"""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    ttfbs = []
+    transferred = 0
+    for _ in range(requests):
+        transferred = 0
+        for index, (path, headers) in enumerate(paths):
+            first_byte, size = fetch(connection, path, headers)
+            transferred += size
+            if index == 0:
+                ttfbs.append(first_byte)
+    connection.close()
+    return statistics.median(ttfbs) * 1000, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    with open(TEMPLATE_PATH, encoding='utf-8') as f:
+        html = f.read()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        static_dir = os.path.join(workdir, 'static')
+        build_dir = os.path.join(workdir, 'build')
+        entry = asset_pipeline.build_page('index.html', html, static_dir, build_dir)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(static_dir, build_dir, entry['etag']))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        assets = [(f"/static/{path}", None) for path in entry['css'] + entry['js']]
+        scenarios = [
+            ('inline, first visit', [('/inline', None)]),
+            ('inline, repeat visit', [('/inline', None)]),
+            ('pipeline, first visit', [('/shell', None)] + assets),
+            ('pipeline, repeat visit', [('/shell', {'If-None-Match': f"W/\"{entry['etag']}\""})]),
+            # After a deploy that changed the shell: assets are still cached
+            ('pipeline, new shell', [('/shell', None)]),
+        ]
+
+        print(f"template {entry['source_bytes']} bytes -> shell {entry['shell_bytes']}, "
+              f"css {entry['css_bytes']}, js {entry['js_bytes']} bytes (uncompressed)")
+        for name, paths in scenarios:
+            ttfb, transferred = measure_visit(port, args.requests, paths)
+            print(f"{name:>24}: TTFB {ttfb:6.3f} ms  transferred {transferred:6d} bytes")
+
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
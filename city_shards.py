@@ -0,0 +1,48 @@
+# City shard sessions for Freskin
+# A city's shard is the engine bound under 'city:<city>'. Sessions are kept
+# per shard and per thread, and a city without a shard gets the default
+# session, so reads and writes for one city always meet in the same database.
+
+import threading
+
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+BIND_PREFIX = 'city:'
+
+
+def shard_key(city):
+    """Bind key of a city's shard"""
+    return BIND_PREFIX + city.strip().lower()
+
+
+def shard_cities(bind_keys):
+    """Cities with a shard among the configured bind keys"""
+    return sorted(key[len(BIND_PREFIX):] for key in bind_keys if key and key.startswith(BIND_PREFIX))
+
+
+class ShardSessions:
+    """Thread-scoped sessions for each city shard, created on first use"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, city, engines, default_session):
+        """Get the session for a city's shard, or default_session if it has none"""
+        key = shard_key(city) if city else None
+        if key is None or key not in engines:
+            return default_session
+
+        session = self.sessions.get(key)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(key)
+                if session is None:
+                    session = scoped_session(sessionmaker(bind=engines[key]), scopefunc=threading.get_ident)
+                    self.sessions[key] = session
+        return session
+
+    def remove(self):
+        """Close the calling thread's session on every shard"""
+        for session in list(self.sessions.values()):
+            session.remove()
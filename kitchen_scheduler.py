@@ -0,0 +1,86 @@
+# Preparation scheduling for Freskin kitchens
+# Turns zone delivery slot strings into hour ranges and lines up each
+# kitchen's preparation jobs on its stations, earliest deadline first.
+
+import heapq
+from datetime import datetime, timedelta
+
+# Slots written in 12-hour form ('evening:5-8') that are in the afternoon/evening
+AFTERNOON_SLOTS = {'afternoon', 'evening', 'night'}
+
+
+def parse_delivery_slots(delivery_slots):
+    """Parse 'morning:6-9,evening:5-8' into {'morning': (6, 9), 'evening': (17, 20)}"""
+    slots = {}
+    for slot in delivery_slots.split(','):
+        if ':' not in slot:
+            continue
+        name, hours = slot.split(':', 1)
+        name = name.strip().lower()
+        start, end = (int(hour) for hour in hours.split('-'))
+        if name in AFTERNOON_SLOTS and start < 12:
+            start += 12
+        # The end is the first matching clock hour after the start, so
+        # 'afternoon:12-3' ends at 15 and 'night:10-1' at 25 (1am next day)
+        while end <= start:
+            end += 12
+        slots[name] = (start, end)
+    return slots
+
+
+def slot_window(delivery_date, slot_hours):
+    """Get the (start, end) datetimes of a slot on a delivery date"""
+    start_hour, end_hour = slot_hours
+    day = datetime.combine(delivery_date, datetime.min.time())
+    return day + timedelta(hours=start_hour), day + timedelta(hours=end_hour)
+
+
+def schedule_preparation(jobs, kitchens, opens_at):
+    """Sequence preparation jobs on each kitchen's stations, earliest deadline first"""
+    # jobs: dicts with 'id', 'kitchen', 'deadline' (datetime) and 'duration'
+    # (timedelta). kitchens: {name: batches it can prepare at once}. Each
+    # station is a capacity bucket and a job takes whichever of its kitchen's
+    # stations frees up first. Jobs that miss their deadline are still
+    # scheduled and reported as late.
+    jobs_by_kitchen = {}
+    unassigned = []
+    for job in jobs:
+        if job['kitchen'] in kitchens and kitchens[job['kitchen']] > 0:
+            jobs_by_kitchen.setdefault(job['kitchen'], []).append(job)
+        else:
+            unassigned.append(job['id'])
+
+    timelines = {}
+    late = []
+    for kitchen, kitchen_jobs in jobs_by_kitchen.items():
+        kitchen_jobs.sort(key=lambda job: (job['deadline'], job['duration']))
+        # (free at, station number): the earliest free station is always first
+        stations = [(opens_at, station) for station in range(kitchens[kitchen])]
+        timeline = []
+
+        for job in kitchen_jobs:
+            free_at, station = stations[0]
+            end = free_at + job['duration']
+            heapq.heapreplace(stations, (end, station))
+
+            slack = job['deadline'] - end
+            entry = {
+                'id': job['id'],
+                'station': station,
+                'start': free_at,
+                'end': end,
+                'deadline': job['deadline'],
+                'slack_minutes': int(slack.total_seconds() // 60)
+            }
+            timeline.append(entry)
+            if slack < timedelta(0):
+                late.append(job['id'])
+
+        timeline.sort(key=lambda entry: (entry['start'], entry['station']))
+        timelines[kitchen] = timeline
+
+    return {
+        'timelines': timelines,
+        'late': late,
+        'unassigned': unassigned
+    }
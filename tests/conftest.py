@@ -0,0 +1,176 @@
+# app.py is a fragment of the core Freskin app: it expects app, db, the User,
+# SkinProfile, Product, Subscription, Order and OrderItem models and
+# token_required to exist already. These fixtures build a minimal stand-in
+# for that core, run app.py inside it and give each test a fresh database.
+
+import os
+import sys
+import types
+from datetime import datetime, timedelta
+from functools import wraps
+
+import jwt
+import pytest
+from flask import Flask, jsonify, render_template, request
+from flask_sqlalchemy import SQLAlchemy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SECRET_KEY = 'test-secret'
+
+
+def build_core_app(database_uri, binds=None, omit_order_columns=()):
+    """Create the core app and models app.py builds on (optionally with an older Order model)"""
+    app = Flask('freskin', root_path=ROOT)
+    app.config.update(
+        SECRET_KEY=SECRET_KEY,
+        SQLALCHEMY_DATABASE_URI=database_uri,
+        SQLALCHEMY_BINDS=binds or {},
+        TESTING=True
+    )
+    db = SQLAlchemy(app)
+
+    class User(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(100))
+        email = db.Column(db.String(120), unique=True)
+        password_hash = db.Column(db.String(256))
+        is_admin = db.Column(db.Boolean, default=False)
+        pincode = db.Column(db.String(10))
+        skin_profile = db.relationship('SkinProfile', uselist=False)
+
+    class SkinProfile(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+        skin_type = db.Column(db.String(50))
+        skin_concerns = db.Column(db.Text)
+        allergies = db.Column(db.Text)
+
+    class Product(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(100))
+        category = db.Column(db.String(50))
+        ingredients = db.Column(db.Text)
+        skin_types = db.Column(db.Text)
+        benefits = db.Column(db.Text)
+        usage_instructions = db.Column(db.Text)
+        shelf_life_hours = db.Column(db.Integer)
+        price = db.Column(db.Float)
+        is_active = db.Column(db.Boolean, default=True)
+
+        def to_dict(self):
+            return {'id': self.id, 'name': self.name, 'category': self.category, 'price': self.price}
+
+    class Subscription(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        plan_type = db.Column(db.String(50))
+        price = db.Column(db.Float)
+        duration_days = db.Column(db.Integer)
+        features = db.Column(db.Text)
+        is_active = db.Column(db.Boolean)
+
+    order_columns = {
+        'id': db.Column(db.Integer, primary_key=True),
+        'user_id': db.Column(db.Integer, db.ForeignKey('user.id')),
+        'status': db.Column(db.String(20), default='pending'),
+        'total_amount': db.Column(db.Float),
+        'delivery_pincode': db.Column(db.String(10)),
+        'plan_type': db.Column(db.String(50)),
+        'created_at': db.Column(db.DateTime, default=datetime.utcnow),
+    }
+
+    def order_to_dict(self):
+        return {'id': self.id, 'status': getattr(self, 'status', None),
+                'total_amount': getattr(self, 'total_amount', None)}
+
+    Order = type('Order', (db.Model,), dict(
+        {name: column for name, column in order_columns.items() if name not in omit_order_columns},
+        to_dict=order_to_dict
+    ))
+
+    class OrderItem(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        order_id = db.Column(db.Integer, db.ForeignKey('order.id'))
+        product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
+        batch_id = db.Column(db.Integer, db.ForeignKey('product_batch.id'))
+        quantity = db.Column(db.Integer)
+        price = db.Column(db.Float)
+
+    def token_required(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            try:
+                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+            except jwt.PyJWTError:
+                return jsonify({'message': 'Token is invalid'}), 401
+            return f(db.session.get(User, data['user_id']), *args, **kwargs)
+        return decorated
+
+    return {
+        'app': app, 'db': db, 'request': request, 'jsonify': jsonify,
+        'render_template': render_template, 'datetime': datetime, 'timedelta': timedelta,
+        'User': User, 'SkinProfile': SkinProfile, 'Product': Product, 'Subscription': Subscription,
+        'Order': Order, 'OrderItem': OrderItem, 'token_required': token_required
+    }
+
+
+def load_freskin(database_uri, binds=None, omit_order_columns=()):
+    """Run app.py on top of a fresh core app, returning it as a module"""
+    module = types.ModuleType('freskin_app')
+    module.__dict__.update(build_core_app(database_uri, binds, omit_order_columns))
+    module.__file__ = os.path.join(ROOT, 'app.py')
+    with open(module.__file__, encoding='utf-8') as f:
+        exec(compile(f.read(), module.__file__, 'exec'), module.__dict__)
+    return module
+
+
+def reset_caches(freskin):
+    """Drop in-process caches that would outlive a test's database"""
+    freskin.cache_versions.clear()
+    freskin.catalog_state['version'] += 1
+    freskin.zone_state['version'] += 1
+    freskin.community_feeds.clear()
+    freskin.community_feeds['computed_at'] = None
+    freskin.compressed_response_cache.clear()
+    freskin.degraded_response_cache.clear()
+    freskin.prerendered_pages.clear()
+    freskin.profiler_state.update(version=None, window_id=None, until=0.0)
+    freskin.profile_stacks.clear()
+
+
+@pytest.fixture(scope='session')
+def freskin_app(tmp_path_factory):
+    """app.py loaded once per test session, on an SQLite file"""
+    path = tmp_path_factory.mktemp('freskin') / 'freskin.db'
+    return load_freskin(f"sqlite:///{path}")
+
+
+@pytest.fixture
+def freskin(freskin_app):
+    """The loaded app.py module inside an app context, on empty tables"""
+    with freskin_app.app.app_context():
+        freskin_app.db.drop_all()
+        freskin_app.db.create_all()
+        reset_caches(freskin_app)
+        yield freskin_app
+        freskin_app.db.session.remove()
+
+
+@pytest.fixture
+def client(freskin):
+    return freskin.app.test_client()
+
+
+@pytest.fixture
+def make_user(freskin):
+    """Create a user and return it with its Authorization header"""
+    def make_user(name='Asha', email=None, is_admin=False, pincode=None):
+        user = freskin.User(name=name, email=email or f"{name.lower()}@example.com",
+                            is_admin=is_admin, pincode=pincode)
+        freskin.db.session.add(user)
+        freskin.db.session.commit()
+        token = jwt.encode({'user_id': user.id}, SECRET_KEY, 'HS256')
+        return user, {'Authorization': f"Bearer {token}"}
+    return make_user
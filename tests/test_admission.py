@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+REPORT = '/api/daily-fresh-report'
+
+
+@pytest.fixture
+def low_class(freskin, monkeypatch):
+    """Fresh limits and stats for the low priority class"""
+    limits = freskin.ADMISSION_CLASSES['low']
+    monkeypatch.setitem(freskin.admission_limits, 'low', {
+        'slots': threading.BoundedSemaphore(limits['concurrency']),
+        'bucket': freskin.TokenBucket(limits['rate'], limits['burst'])
+    })
+    monkeypatch.setitem(freskin.admission_stats, 'low', {'admitted': 0, 'degraded': 0, 'rejected': 0})
+    monkeypatch.setitem(freskin.app.config, 'ADMISSION_CONTROL', True)
+    return freskin.admission_limits['low']
+
+
+def hold_all_slots(low_class, freskin):
+    for _ in range(freskin.ADMISSION_CLASSES['low']['concurrency']):
+        assert low_class['slots'].acquire(blocking=False)
+
+
+def test_token_bucket_refills_over_time(freskin, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(freskin.time, 'monotonic', lambda: clock[0])
+    bucket = freskin.TokenBucket(rate=2, burst=2)
+
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert bucket.take() == 0
+
+
+def test_refused_slot_does_not_spend_a_token(freskin, client, make_user, low_class):
+    user, headers = make_user()
+    hold_all_slots(low_class, freskin)
+    tokens = low_class['bucket'].tokens
+
+    response = client.get(REPORT, headers=headers)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert low_class['bucket'].tokens == tokens
+    assert freskin.admission_stats['low']['rejected'] == 1
+
+
+def test_empty_bucket_frees_the_slot(freskin, client, make_user, low_class):
+    user, headers = make_user()
+    low_class['bucket'].tokens = 0
+
+    assert client.get(REPORT, headers=headers).status_code == 503
+
+    # Every slot is free again
+    hold_all_slots(low_class, freskin)
+
+
+def test_unauthenticated_requests_are_not_admitted(freskin, client, low_class):
+    tokens = low_class['bucket'].tokens
+
+    response = client.get(REPORT, headers={'Authorization': 'Bearer not-a-token'})
+
+    assert response.status_code == 401
+    assert low_class['bucket'].tokens == tokens
+    assert freskin.admission_stats['low'] == {'admitted': 0, 'degraded': 0, 'rejected': 0}
+
+
+def test_shed_requests_get_the_callers_last_good_response(freskin, client, make_user, low_class):
+    user, headers = make_user()
+    fresh = client.get(REPORT, headers=headers)
+    assert fresh.status_code == 200
+    hold_all_slots(low_class, freskin)
+
+    response = client.get(REPORT, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers['Warning'] == '110 - "Response is stale"'
+    assert response.get_data() == fresh.get_data()
+    other, other_headers = make_user('Ravi')
+    assert client.get(REPORT, headers=other_headers).status_code == 503
+
+
+def test_unauthenticated_routes_are_admitted_before_dispatch(freskin, client, monkeypatch):
+    monkeypatch.setitem(freskin.app.config, 'ADMISSION_CONTROL', True)
+    monkeypatch.setitem(freskin.admission_limits, 'normal', {'slots': threading.BoundedSemaphore(1), 'bucket': None})
+    freskin.admission_limits['normal']['slots'].acquire()
+
+    assert client.get('/api/delivery-zones').status_code == 503
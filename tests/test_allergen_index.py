@@ -0,0 +1,61 @@
+import pytest
+
+
+@pytest.fixture
+def catalog(freskin):
+    for name, ingredients in (
+        ('Rose Glow Toner', 'Rose Water, Aloe Vera Gel'),
+        ('Neem Clarifying Mask', 'Neem Powder, Multani Mitti'),
+        ('Honey Lip Balm', 'Raw Honey, Beeswax'),
+        ('Wild Rose Oil', 'Wild Rose'),
+    ):
+        freskin.db.session.add(freskin.Product(
+            name=name, category='care', ingredients=ingredients, skin_types='all',
+            shelf_life_hours=48, price=99.0, is_active=True
+        ))
+    freskin.db.session.commit()
+    return freskin
+
+
+def product_ids(freskin, *names):
+    return {product.id for product in freskin.Product.query.filter(freskin.Product.name.in_(names))}
+
+
+def test_descriptors_are_ignored(catalog):
+    assert catalog.normalize_ingredient('Organic Neem Powder') == 'neem'
+    assert catalog.get_unsafe_product_ids(['neem']) == product_ids(catalog, 'Neem Clarifying Mask')
+    assert catalog.get_unsafe_product_ids(['fresh honey']) == product_ids(catalog, 'Honey Lip Balm')
+
+
+def test_allergy_matches_every_ingredient_containing_its_words(catalog):
+    assert catalog.get_unsafe_product_ids(['rose']) == product_ids(catalog, 'Rose Glow Toner', 'Wild Rose Oil')
+    assert catalog.get_unsafe_product_ids(['rose water']) == product_ids(catalog, 'Rose Glow Toner')
+
+
+def test_unknown_or_empty_allergies_exclude_nothing(catalog):
+    assert catalog.get_unsafe_product_ids(['saffron']) == set()
+    assert catalog.get_unsafe_product_ids([]) == set()
+
+
+def test_new_products_are_screened(catalog):
+    catalog.get_unsafe_product_ids(['honey'])
+    catalog.db.session.add(catalog.Product(
+        name='Honey Oat Scrub', category='scrub', ingredients='honey, oats', skin_types='all',
+        shelf_life_hours=24, price=149.0, is_active=True
+    ))
+    catalog.db.session.commit()
+
+    assert catalog.get_unsafe_product_ids(['honey']) == product_ids(catalog, 'Honey Lip Balm', 'Honey Oat Scrub')
+
+
+def test_change_during_build_leaves_the_index_stale(catalog):
+    @catalog.db.event.listens_for(catalog.db.session, 'do_orm_execute')
+    def bump_during_build(state):
+        catalog.catalog_state['version'] += 1
+
+    try:
+        index = catalog.build_allergen_index()
+    finally:
+        catalog.db.event.remove(catalog.db.session, 'do_orm_execute', bump_during_build)
+
+    assert index['version'] != catalog.get_catalog_version()
@@ -0,0 +1,85 @@
+import jwt
+import pytest
+
+ACCOUNT = {'name': 'Asha', 'email': 'Asha@Example.com', 'password': 'correct horse'}
+
+
+def register(client, **fields):
+    return client.post('/api/auth/register', json=dict(ACCOUNT, **fields))
+
+
+def test_register_and_log_in(freskin, client):
+    response = register(client)
+    assert response.status_code == 201
+
+    user = freskin.db.session.get(freskin.User, response.json['user_id'])
+    assert user.email == 'asha@example.com'
+    assert user.password_hash != ACCOUNT['password']
+
+    response = client.post('/api/auth/login', json={'email': 'asha@example.com', 'password': 'correct horse'})
+    assert response.status_code == 200
+    assert jwt.decode(response.json['token'], 'test-secret', algorithms=['HS256'])['user_id'] == user.id
+
+
+def test_wrong_password_and_duplicate_email(freskin, client):
+    register(client)
+
+    assert client.post('/api/auth/login', json={'email': 'asha@example.com', 'password': 'nope'}).status_code == 401
+    assert client.post('/api/auth/login', json={'email': 'ravi@example.com', 'password': 'x'}).status_code == 401
+    assert register(client, email='ASHA@example.com').json['error'] == 'Email is already registered'
+    assert register(client, email='ravi@example.com', password='short').status_code == 400
+
+
+def test_routes_accept_issued_tokens_only(freskin, client):
+    token = register(client).json['token']
+
+    assert client.get('/api/skin-diary', headers={'Authorization': f"Bearer {token}"}).status_code == 200
+    assert client.get('/api/skin-diary').json == {'message': 'Token is missing'}
+    forged = jwt.encode({'user_id': 1}, 'another-secret', 'HS256')
+    assert client.get('/api/skin-diary', headers={'Authorization': f"Bearer {forged}"}).status_code == 401
+
+
+def test_saturated_pool_sheds_logins(freskin, client, monkeypatch):
+    register(client)
+
+    def busy(*args):
+        raise freskin.auth_pool.AuthPoolBusy('Authentication is busy, please retry')
+    monkeypatch.setattr(freskin.auth_pool, 'verify_password', busy)
+
+    response = client.post('/api/auth/login', json={'email': 'asha@example.com', 'password': 'correct horse'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_asymmetric_algorithms_need_a_key_pair(freskin, monkeypatch):
+    monkeypatch.setitem(freskin.app.config, 'AUTH_TOKEN_ALGORITHM', 'RS256')
+
+    with pytest.raises(RuntimeError, match='AUTH_TOKEN_PRIVATE_KEY_PATH'):
+        freskin.get_token_keys()
+
+
+def test_asymmetric_tokens_are_signed_with_the_private_key(freskin, client, monkeypatch, tmp_path):
+    pytest.importorskip('cryptography')
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    private_path = tmp_path / 'private.pem'
+    public_path = tmp_path / 'public.pem'
+    private_path.write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    public_path.write_bytes(private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ))
+    monkeypatch.setitem(freskin.app.config, 'AUTH_TOKEN_ALGORITHM', 'ES256')
+    monkeypatch.setitem(freskin.app.config, 'AUTH_TOKEN_PRIVATE_KEY_PATH', str(private_path))
+    monkeypatch.setitem(freskin.app.config, 'AUTH_TOKEN_PUBLIC_KEY_PATH', str(public_path))
+
+    token = register(client).json['token']
+
+    assert jwt.decode(token, public_path.read_text(), algorithms=['ES256'])['user_id'] == 1
+    assert client.get('/api/skin-diary', headers={'Authorization': f"Bearer {token}"}).status_code == 200
+    hs_token = jwt.encode({'user_id': 1}, 'test-secret', 'HS256')
+    assert client.get('/api/skin-diary', headers={'Authorization': f"Bearer {hs_token}"}).status_code == 401
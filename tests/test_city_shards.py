@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine, select
+from sqlalchemy.orm import Session, declarative_base
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import city_shards  # noqa: E402
+
+Base = declarative_base()
+
+
+class Order(Base):
+    __tablename__ = 'order'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False)
+
+
+@pytest.fixture
+def engines(tmp_path):
+    """A default database and Mumbai and Delhi shards, each its own SQLite file"""
+    engines = {
+        None: create_engine(f"sqlite:///{tmp_path / 'default.db'}"),
+        'city:mumbai': create_engine(f"sqlite:///{tmp_path / 'mumbai.db'}"),
+        'city:delhi': create_engine(f"sqlite:///{tmp_path / 'delhi.db'}"),
+    }
+    for engine in engines.values():
+        Base.metadata.create_all(engine)
+    yield engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+def count_orders(engine):
+    with Session(engine) as session:
+        return len(session.scalars(select(Order)).all())
+
+
+def test_write_and_read_land_on_the_same_shard(engines):
+    shards = city_shards.ShardSessions()
+    default_session = Session(engines[None])
+
+    writer = shards.get('Mumbai', engines, default_session)
+    writer.add(Order(user_id=7, status='placed'))
+    writer.commit()
+    shards.remove()
+
+    reader = shards.get(' mumbai ', engines, default_session)
+    orders = reader.scalars(select(Order).filter_by(user_id=7)).all()
+    assert [order.status for order in orders] == ['placed']
+    assert count_orders(engines['city:mumbai']) == 1
+    assert count_orders(engines['city:delhi']) == 0
+    assert count_orders(engines[None]) == 0
+    shards.remove()
+    default_session.close()
+
+
+def test_city_without_a_shard_uses_the_default_session(engines):
+    shards = city_shards.ShardSessions()
+    default_session = Session(engines[None])
+
+    assert shards.get('Pune', engines, default_session) is default_session
+    assert shards.get(None, engines, default_session) is default_session
+    default_session.close()
+
+
+def test_sessions_are_per_thread(engines):
+    shards = city_shards.ShardSessions()
+    sessions = []
+
+    def open_session():
+        sessions.append(shards.get('delhi', engines, None)())
+
+    thread = threading.Thread(target=open_session)
+    thread.start()
+    thread.join()
+    open_session()
+
+    assert sessions[0] is not sessions[1]
+    assert sessions[0].get_bind() is sessions[1].get_bind() is engines['city:delhi']
+
+
+def test_shard_cities():
+    assert city_shards.shard_cities([None, 'city:mumbai', 'analytics', 'city:delhi']) == ['delhi', 'mumbai']
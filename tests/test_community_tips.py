@@ -0,0 +1,76 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def community(freskin, monkeypatch):
+    # Keep the background flusher out of the tests; they flush explicitly
+    monkeypatch.setitem(freskin.like_flusher, 'pid', os.getpid())
+    freskin.pending_likes['counts'].clear()
+    old = datetime.utcnow() - timedelta(days=3)
+    for likes, category in [(5, 'application'), (9, 'storage'), (5, 'application'), (1, 'lifestyle')]:
+        freskin.db.session.add(freskin.CommunityTip(
+            author_name='Asha', tip=f"{category} tip with {likes} likes", category=category,
+            season='summer', likes=likes, created_at=old
+        ))
+    freskin.db.session.add(freskin.SuccessStory(author_name='Meera', title='Clear skin', preview='...'))
+    freskin.db.session.commit()
+    return freskin
+
+
+def test_feed_pages_follow_the_cursor(community):
+    feed = community.get_community_feeds()['tips']['top_daily']
+
+    first, cursor = community.get_feed_page(feed, None, 2)
+    second, last_cursor = community.get_feed_page(feed, cursor, 2)
+
+    assert [(tip['likes'], tip['id']) for tip in first] == [(9, 2), (5, 3)]
+    assert cursor == '5.3'
+    assert [(tip['likes'], tip['id']) for tip in second] == [(5, 1), (1, 4)]
+    assert last_cursor is None
+
+
+def test_invalid_cursor_is_a_bad_request(community, client):
+    response = client.get('/api/community-tips?cursor=abc')
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid cursor'
+
+
+def test_category_feed(community, client):
+    response = client.get('/api/community-tips?feed=category&category=Application')
+
+    assert response.status_code == 200
+    assert [tip['id'] for tip in response.json['community_content']['daily_tips']] == [3, 1]
+
+
+def test_likes_are_buffered_and_coalesced(community, client, make_user):
+    user, headers = make_user()
+    for _ in range(3):
+        assert client.post('/api/community-tips/tips/4/like', headers=headers).status_code == 202
+
+    assert community.pending_likes['counts'] == {('tips', 4): 3}
+    assert community.db.session.get(community.CommunityTip, 4).likes == 1
+
+    assert community.flush_pending_likes(force=True) == 3
+    community.db.session.expire_all()
+    assert community.db.session.get(community.CommunityTip, 4).likes == 4
+    assert community.pending_likes['counts'] == {}
+
+
+def test_only_tips_and_stories_can_be_liked(community, client, make_user):
+    user, headers = make_user()
+
+    response = client.post('/api/community-tips/orders/1/like', headers=headers)
+
+    assert response.status_code == 404
+
+
+def test_seasonal_feed_falls_back_to_the_latest_season_with_tips(community):
+    tips = community.CommunityTip.query.all()
+
+    # Every season is reachable within the last twelve months
+    assert community.get_latest_season_with_tips(tips) == 'summer'
+    assert community.get_latest_season_with_tips([]) == community.get_current_season()
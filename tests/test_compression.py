@@ -0,0 +1,45 @@
+import gzip
+
+
+def add_zones(freskin, count):
+    for number in range(count):
+        freskin.db.session.add(freskin.DeliveryZone(
+            city='Mumbai', zone_name=f"Zone {number}", pincode_range='400001,400002',
+            delivery_slots='morning:6-9,evening:5-8'
+        ))
+    freskin.db.session.commit()
+
+
+def test_large_json_is_gzipped_for_clients_that_accept_it(freskin, client):
+    add_zones(freskin, 20)
+
+    response = client.get('/api/delivery-zones', headers={'Accept-Encoding': 'gzip'})
+    plain = client.get('/api/delivery-zones')
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == plain.get_data()
+    assert 'Content-Encoding' not in plain.headers
+
+
+def test_small_responses_are_sent_as_is(freskin, client):
+    add_zones(freskin, 1)
+
+    response = client.get('/api/delivery-zones', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_cacheable_endpoints_reuse_compressed_bodies(freskin, client, make_user):
+    add_zones(freskin, 20)
+    freskin.compression_stats.clear()
+    for _ in range(3):
+        client.get('/api/delivery-zones', headers={'Accept-Encoding': 'gzip'})
+    admin, headers = make_user('Admin', is_admin=True)
+
+    stats = client.get('/api/admin/compression-stats', headers=headers).json['compression_stats']
+
+    zone_stats = stats['get_delivery_zones']
+    assert (zone_stats['responses'], zone_stats['cache_hits']) == (3, 2)
+    assert zone_stats['compression_ratio'] > 1
+    assert len(freskin.compressed_response_cache) == 1
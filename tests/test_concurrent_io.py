@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+
+def current_thread_name():
+    return threading.current_thread().name
+
+
+def test_tasks_run_inline_when_concurrent_io_is_off(freskin, monkeypatch):
+    monkeypatch.setitem(freskin.app.config, 'CONCURRENT_IO', False)
+
+    task = freskin.submit_io_task(current_thread_name)
+
+    assert isinstance(task, freskin.CompletedTask)
+    assert task.result() == threading.current_thread().name
+
+
+def test_tasks_run_on_the_pool_in_their_own_app_context(freskin, monkeypatch):
+    monkeypatch.setitem(freskin.app.config, 'CONCURRENT_IO', True)
+
+    def session_in_task():
+        return freskin.db.session()
+
+    assert freskin.submit_io_task(current_thread_name).result().startswith('freskin-io')
+    assert freskin.submit_io_task(session_in_task).result() is not freskin.db.session()
+
+
+def test_pool_is_sized_from_the_environment(freskin):
+    assert freskin.io_executor._max_workers == freskin.IO_EXECUTOR_WORKERS
+
+
+@pytest.mark.parametrize('concurrent_io', [False, True])
+def test_daily_fresh_report_is_the_same_either_way(freskin, client, make_user, monkeypatch, concurrent_io):
+    monkeypatch.setitem(freskin.app.config, 'CONCURRENT_IO', concurrent_io)
+    monkeypatch.setattr(freskin, 'get_current_weather', lambda city: {'city': city, 'condition': 'humid'})
+    freskin.db.session.add(freskin.Product(
+        name='Aloe Gel', category='hydrating_gel', ingredients='aloe vera', price=149.0, is_active=True
+    ))
+    freskin.db.session.commit()
+    user, headers = make_user()
+
+    response = client.get('/api/daily-fresh-report?city=Pune', headers=headers)
+
+    assert response.status_code == 200
+    report = response.json['freshness_report']
+    assert report['current_weather'] == {'city': 'Pune', 'condition': 'humid'}
+    # No skin profile, so no personalised selection
+    assert report['weather_adapted_selection'] == []
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def zone(freskin):
+    zone = freskin.DeliveryZone(city='Mumbai', zone_name='South', pincode_range='400001, 400002',
+                                delivery_slots='morning:6-9,evening:5-8', preparation_time_hours=2)
+    freskin.db.session.add(zone)
+    freskin.db.session.commit()
+    return zone
+
+
+def test_zone_changes_rewrite_the_timeline_in_their_transaction(freskin, zone):
+    assert freskin.ZoneDeliveryTimeline.query.count() == 4
+
+    zone.pincode_range = '400001'
+    freskin.db.session.commit()
+
+    assert sorted(row.pincode for row in freskin.ZoneDeliveryTimeline.query) == ['400001', '400001']
+
+
+def test_deleting_a_zone_deletes_its_timeline(freskin, zone):
+    freskin.db.session.execute(freskin.db.text('PRAGMA foreign_keys=ON'))
+    try:
+        freskin.db.session.delete(zone)
+        freskin.db.session.commit()
+    finally:
+        freskin.db.session.execute(freskin.db.text('PRAGMA foreign_keys=OFF'))
+
+    assert freskin.ZoneDeliveryTimeline.query.count() == 0
+    assert freskin.get_order_cutoff(pincode='400001') is None
+
+
+def test_order_cutoff_is_the_soonest_open_one(freskin, zone):
+    # Morning slot: preparation at 4:00, cut-off 22:00 the day before
+    cutoff = freskin.get_order_cutoff(pincode='400002', now=datetime(2026, 3, 1, 21, 0))
+
+    assert cutoff['slot'] == 'morning'
+    assert cutoff['cut_off'] == datetime(2026, 3, 1, 22, 0)
+    assert cutoff['delivery_start'] == datetime(2026, 3, 2, 6, 0)
+
+    cutoff = freskin.get_order_cutoff(city='mumbai', now=datetime(2026, 3, 1, 23, 0))
+    assert (cutoff['slot'], cutoff['cut_off']) == ('evening', datetime(2026, 3, 2, 9, 0))
+
+
+def test_empty_timeline_is_built_on_first_read(freskin, zone):
+    # As on a database whose zones predate the timeline table
+    freskin.db.session.execute(freskin.db.delete(freskin.ZoneDeliveryTimeline))
+    freskin.db.session.commit()
+
+    assert freskin.get_order_cutoff(pincode='400001') is not None
+    assert freskin.ZoneDeliveryTimeline.query.count() == 4
+
+
+def test_init_db_builds_the_timeline_for_existing_zones(freskin, zone):
+    freskin.db.session.execute(freskin.db.delete(freskin.ZoneDeliveryTimeline))
+    freskin.db.session.commit()
+
+    assert freskin.app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+
+    assert freskin.ZoneDeliveryTimeline.query.filter_by(pincode='400001').count() == 2
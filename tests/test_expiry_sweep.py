@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def batches(freskin, make_user):
+    user, headers = make_user()
+    freskin.db.session.add(freskin.Product(id=1, name='Rose Toner', price=100.0))
+    now = datetime.utcnow()
+    for number, expires_in_hours in enumerate([-30, -20, -10, 24], start=1):
+        freskin.db.session.add(freskin.ProductBatch(
+            id=number, product_id=1, batch_number=f"B{number}", preparation_date=now - timedelta(days=3),
+            expiry_datetime=now + timedelta(hours=expires_in_hours), quantity_prepared=10,
+            preparation_location='Andheri'
+        ))
+    order = freskin.Order(user_id=user.id, status='delivered', total_amount=300.0)
+    freskin.db.session.add(order)
+    freskin.db.session.flush()
+    freskin.db.session.add(freskin.OrderItem(order_id=order.id, product_id=1, batch_id=2, quantity=3, price=100.0))
+    freskin.db.session.commit()
+    return freskin
+
+
+def test_expired_batches_are_archived_with_their_waste(batches):
+    stats = batches.sweep_expired_batches(chunk_size=2)
+
+    assert (stats['archived'], stats['kept'], stats['quantity_wasted']) == (3, 1, 27)
+    archived = {batch.id: batch for batch in batches.ArchivedProductBatch.query}
+    assert sorted(archived) == [1, 2, 3]
+    assert (archived[2].quantity_sold, archived[2].quantity_wasted) == (3, 7)
+    waste = batches.DailyWasteRollup.query.all()
+    assert sum(row.quantity_wasted for row in waste) == 27
+    assert sum(row.batches for row in waste) == 3
+
+
+def test_referenced_batches_keep_order_history(batches):
+    batches.sweep_expired_batches()
+
+    assert sorted(batch.id for batch in batches.ProductBatch.query) == [2, 4]
+    assert batches.OrderItem.query.one().batch_id == 2
+
+
+def test_kept_batches_are_not_swept_again(batches):
+    batches.sweep_expired_batches()
+
+    stats = batches.sweep_expired_batches()
+
+    assert stats['archived'] == 0
+    assert sum(row.quantity_wasted for row in batches.DailyWasteRollup.query) == 27
@@ -0,0 +1,94 @@
+import csv
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def shop(freskin, make_user):
+    user, headers = make_user()
+    freskin.db.session.add(freskin.Product(id=1, name='Rose Toner', price=100.0))
+    freskin.db.session.add(freskin.Order(id=1, user_id=user.id, status='confirmed', total_amount=100.0))
+    freskin.db.session.commit()
+    return freskin
+
+
+def add_feedback(freskin, created_at, rating=5):
+    freskin.db.session.add(freskin.UserFeedback(
+        user_id=1, order_id=1, product_id=1, rating=rating, created_at=created_at
+    ))
+    freskin.db.session.commit()
+
+
+def read_export(path):
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as export_file:
+        return list(csv.DictReader(export_file))
+
+
+def export(freskin, table_name, output_dir, **kwargs):
+    return freskin.export_table(table_name, str(output_dir), freskin.CsvGzipExportWriter, **kwargs)
+
+
+def test_append_only_tables_export_changes_since_the_watermark(shop, tmp_path):
+    now = datetime.utcnow()
+    add_feedback(shop, now - timedelta(days=2))
+    add_feedback(shop, now - timedelta(hours=1))
+
+    path, rows_written = export(shop, 'user_feedback', tmp_path)
+    assert rows_written == 2
+    assert '-full-' in path
+    with open(tmp_path / 'user_feedback.watermark.json', encoding='utf-8') as watermark_file:
+        assert json.load(watermark_file)['exported_until'] == (now - timedelta(hours=1)).isoformat()
+
+    # Committed after the export with a timestamp just before its watermark
+    add_feedback(shop, now - timedelta(hours=1, minutes=5), rating=2)
+    path, rows_written = export(shop, 'user_feedback', tmp_path)
+
+    assert '-changes-' in path
+    assert sorted(row['rating'] for row in read_export(path)) == ['2', '5']
+
+
+def test_tables_without_a_timestamp_are_exported_in_full(shop, tmp_path):
+    assert shop.get_export_timestamp_column('order') is None
+    export(shop, 'order', tmp_path)
+
+    order = shop.db.session.get(shop.Order, 1)
+    order.status = 'delivered'
+    shop.db.session.commit()
+    path, rows_written = export(shop, 'order', tmp_path)
+
+    assert rows_written == 1
+    assert [row['status'] for row in read_export(path)] == ['delivered']
+    assert not (tmp_path / 'order.watermark.json').exists()
+
+
+def test_id_watermarks_from_older_exports_start_over(shop, tmp_path):
+    add_feedback(shop, datetime.utcnow() - timedelta(days=30))
+    (tmp_path / 'user_feedback.watermark.json').write_text(json.dumps({'last_id': 1}), encoding='utf-8')
+
+    path, rows_written = export(shop, 'user_feedback', tmp_path)
+
+    assert rows_written == 1
+    assert '-full-' in path
+
+
+def test_export_is_chunked(shop, tmp_path):
+    for rating in range(1, 6):
+        add_feedback(shop, datetime.utcnow(), rating=rating)
+
+    path, rows_written = export(shop, 'user_feedback', tmp_path, chunk_size=2)
+
+    assert rows_written == 5
+    assert [row['rating'] for row in read_export(path)] == ['1', '2', '3', '4', '5']
+
+
+def test_export_command(shop, tmp_path):
+    result = shop.app.test_cli_runner().invoke(args=[
+        'export', 'order', 'product_batch', '--format', 'csv', '--output-dir', str(tmp_path)
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert 'order: 1 rows' in result.output
+    assert 'product_batch: no changed rows' in result.output
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+PRODUCT = {
+    'name': 'Rose Toner', 'category': 'toner', 'ingredients': ['rose water', 'aloe vera'],
+    'skin_types': 'dry, normal', 'shelf_life_hours': 48, 'price': 199
+}
+
+
+def write_jsonl(path, lines):
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_bad_jsonl_lines_are_reported_and_skipped(freskin, tmp_path):
+    path = write_jsonl(tmp_path / 'products.jsonl', [
+        json.dumps(PRODUCT),
+        '{"name": "Broken',
+        '',
+        '["not", "an", "object"]',
+        json.dumps(dict(PRODUCT, name='Neem Mask', price=-1)),
+        json.dumps(dict(PRODUCT, name='Aloe Gel')),
+    ])
+
+    counts, errors = freskin.import_dataset('products', path)
+
+    assert counts == {'valid': 2, 'inserted': 2, 'updated': 0, 'invalid': 3}
+    assert [line for line, error in errors] == [2, 4, 5]
+    assert errors[0][1].startswith('invalid JSON')
+    assert errors[1][1] == 'expected an object'
+    assert errors[2][1] == 'price: must be positive'
+    assert sorted(product.name for product in freskin.Product.query.all()) == ['Aloe Gel', 'Rose Toner']
+
+
+def test_import_upserts_on_the_natural_key(freskin, tmp_path):
+    freskin.import_dataset('products', write_jsonl(tmp_path / 'first.jsonl', [json.dumps(PRODUCT)]))
+
+    counts, errors = freskin.import_dataset('products', write_jsonl(tmp_path / 'second.jsonl', [
+        json.dumps(dict(PRODUCT, price=249)),
+        json.dumps(dict(PRODUCT, name='Aloe Gel')),
+    ]), chunk_size=1)
+
+    assert (counts['inserted'], counts['updated'], errors) == (1, 1, [])
+    product = freskin.Product.query.filter_by(name='Rose Toner').one()
+    assert (product.price, product.ingredients, product.skin_types) == (249.0, 'rose water,aloe vera', 'dry,normal')
+
+
+def test_product_import_invalidates_the_search_index(freskin, tmp_path):
+    assert freskin.search_product_catalog('rose')['total_results'] == 0
+
+    freskin.import_dataset('products', write_jsonl(tmp_path / 'products.jsonl', [json.dumps(PRODUCT)]))
+
+    assert freskin.search_product_catalog('rose')['total_results'] == 1
+
+
+def test_dry_run_validates_without_writing(freskin, tmp_path):
+    path = tmp_path / 'zones.csv'
+    path.write_text(
+        'city,zone_name,pincode_range,delivery_slots\n'
+        'Mumbai,South,"400001,400002",morning:6-9\n'
+        'Mumbai,North,40001,morning:6-9\n',
+        encoding='utf-8'
+    )
+
+    counts, errors = freskin.import_dataset('zones', str(path), dry_run=True)
+
+    assert (counts['valid'], counts['invalid']) == (1, 1)
+    assert errors == [(3, "pincode_range: invalid pincode '40001'")]
+    assert freskin.DeliveryZone.query.count() == 0
+
+
+@pytest.mark.parametrize('row, error', [
+    ({'batch_number': 'B1', 'product_name': 'Missing'}, 'unknown product_name'),
+    ({'batch_number': 'B1', 'product_id': 1, 'preparation_date': '2026-01-02T06:00:00',
+      'expiry_datetime': '2026-01-01T06:00:00', 'quantity_prepared': 5, 'preparation_location': 'Mumbai'},
+     'expiry_datetime must be after preparation_date'),
+])
+def test_batch_rows_are_checked_against_products(freskin, row, error):
+    spec = freskin.IMPORT_SPECS['batches']
+
+    assert freskin.validate_import_row(spec, row, {}, frozenset({1})) == (None, error)
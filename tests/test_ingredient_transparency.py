@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+KNOWLEDGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'ingredient_knowledge.json')
+
+
+@pytest.fixture
+def knowledge():
+    with open(KNOWLEDGE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def product(freskin):
+    product = freskin.Product(
+        name='Aloe Rose Gel', category='gel', ingredients='Fresh Aloe Vera, Rose Water, Beeswax',
+        skin_types='all', shelf_life_hours=48, price=199.0, is_active=True
+    )
+    freskin.db.session.add(product)
+    freskin.db.session.commit()
+    return product
+
+
+def test_general_information_comes_from_the_data_file(client, knowledge):
+    response = client.get('/api/ingredient-transparency')
+
+    assert response.status_code == 200
+    assert response.json == {
+        'common_ingredients': knowledge['common_ingredient_benefits'],
+        'avoided_chemicals': knowledge['avoided_chemicals'],
+        'sourcing_philosophy': knowledge['sourcing_philosophy']
+    }
+
+
+def test_product_ingredients_are_matched_to_knowledge_entries(client, product, knowledge):
+    response = client.get(f"/api/ingredient-transparency?product_id={product.id}")
+
+    assert response.status_code == 200
+    assert response.json['product']['name'] == 'Aloe Rose Gel'
+    assert response.json['ingredient_transparency'] == {
+        'aloe_vera': knowledge['ingredients']['aloe_vera'],
+        'rose_water': knowledge['ingredients']['rose_water']
+    }
+    assert response.json['sourcing_info']['local_farms'] == knowledge['local_farms']
+
+
+def test_unknown_and_malformed_product_ids(client):
+    assert client.get('/api/ingredient-transparency?product_id=999').status_code == 404
+    assert client.get('/api/ingredient-transparency?product_id=abc').status_code == 400
+
+
+def test_loaded_knowledge_is_read_only(freskin):
+    with pytest.raises(TypeError):
+        freskin.ingredient_knowledge['data']['ingredients']['aloe_vera']['purity'] = '50%'
+
+
+def test_cached_response_is_dropped_when_the_product_changes(freskin, client, product):
+    client.get(f"/api/ingredient-transparency?product_id={product.id}")
+    product.name = 'Aloe Rose Gel 2.0'
+    freskin.db.session.commit()
+
+    response = client.get(f"/api/ingredient-transparency?product_id={product.id}")
+
+    assert response.json['product']['name'] == 'Aloe Rose Gel 2.0'
@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import kitchen_scheduler
+
+
+@pytest.mark.parametrize('slots, expected', [
+    ('morning:6-9,evening:5-8', {'morning': (6, 9), 'evening': (17, 20)}),
+    ('afternoon:12-3', {'afternoon': (12, 15)}),
+    ('night:10-1', {'night': (22, 25)}),
+    (' Morning:7-10,bogus', {'morning': (7, 10)}),
+])
+def test_parse_delivery_slots(slots, expected):
+    assert kitchen_scheduler.parse_delivery_slots(slots) == expected
+
+
+def test_slot_window_runs_past_midnight():
+    start, end = kitchen_scheduler.slot_window(date(2026, 3, 1), (22, 25))
+
+    assert (start, end) == (datetime(2026, 3, 1, 22), datetime(2026, 3, 2, 1))
+
+
+def job(job_id, deadline_hour, minutes, kitchen='andheri'):
+    return {'id': job_id, 'kitchen': kitchen, 'deadline': datetime(2026, 3, 1, deadline_hour),
+            'duration': timedelta(minutes=minutes)}
+
+
+def test_earliest_deadline_first_across_stations():
+    opens_at = datetime(2026, 3, 1, 3)
+    jobs = [job('evening', 17, 120), job('early', 5, 120), job('morning', 6, 120), job('lost', 6, 30, 'closed')]
+
+    schedule = kitchen_scheduler.schedule_preparation(jobs, {'andheri': 2}, opens_at)
+
+    timeline = schedule['timelines']['andheri']
+    assert [(entry['id'], entry['station'], entry['start'].hour) for entry in timeline] == [
+        ('early', 0, 3), ('morning', 1, 3), ('evening', 0, 5)
+    ]
+    assert schedule['late'] == []
+    assert schedule['unassigned'] == ['lost']
+
+
+def test_jobs_that_miss_their_deadline_are_reported_late():
+    schedule = kitchen_scheduler.schedule_preparation(
+        [job('first', 5, 120), job('second', 6, 120)], {'andheri': 1}, datetime(2026, 3, 1, 3)
+    )
+
+    assert schedule['late'] == ['second']
+    assert schedule['timelines']['andheri'][1]['slack_minutes'] == -60
+
+
+def test_zone_without_a_preparation_time_needs_a_duration(freskin):
+    zone = freskin.DeliveryZone(id=1, city='Mumbai', zone_name='South', pincode_range='400001',
+                                delivery_slots='morning:6-9')
+    freskin.db.session.add(zone)
+    freskin.db.session.commit()
+    # The column default only applies on insert
+    zone.preparation_time_hours = None
+    freskin.db.session.commit()
+
+    jobs, errors = freskin.build_preparation_jobs([
+        {'zone_id': 1, 'kitchen': 'andheri'},
+        {'zone_id': 1, 'kitchen': 'andheri', 'duration_minutes': 45},
+        {'zone_id': 1, 'kitchen': 'andheri', 'slot': 'evening'},
+        {'zone_id': 2, 'kitchen': 'andheri'},
+    ], date(2026, 3, 1))
+
+    assert [(job['id'], job['deadline'], job['duration']) for job in jobs] == [
+        (1, datetime(2026, 3, 1, 6), timedelta(minutes=45))
+    ]
+    assert errors == [
+        {'batch': 0, 'error': 'duration_minutes is required, the zone has no preparation time'},
+        {'batch': 2, 'error': "zone has no 'evening' slot"},
+        {'batch': 3, 'error': 'unknown or inactive zone_id'},
+    ]
+
+
+def test_kitchen_schedule_endpoint(freskin, client, make_user):
+    freskin.db.session.add(freskin.DeliveryZone(
+        id=1, city='Mumbai', zone_name='South', pincode_range='400001', delivery_slots='morning:6-9',
+        preparation_time_hours=2
+    ))
+    freskin.db.session.commit()
+    admin, headers = make_user('Admin', is_admin=True)
+
+    response = client.post('/api/admin/kitchen-schedule', headers=headers, json={
+        'delivery_date': '2026-03-01',
+        'batches': [{'zone_id': 1, 'kitchen': 'andheri', 'batch_number': 'B1'}]
+    })
+
+    assert response.status_code == 200
+    assert response.json['schedule']['timelines']['andheri'][0]['start'] == '2026-03-01T03:00:00'
+    assert response.json['late_batches'] == 0
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def order(freskin, make_user):
+    user, headers = make_user()
+    order = freskin.Order(user_id=user.id, status='confirmed', total_amount=499.0)
+    freskin.db.session.add(order)
+    freskin.db.session.commit()
+    order.headers = headers
+    return order
+
+
+def parse_events(chunks):
+    return [json.loads(chunk.split('data: ', 1)[1]) for chunk in chunks if chunk.startswith('event:')]
+
+
+def test_committed_status_changes_are_published(freskin, order):
+    subscription = freskin.order_event_broker.subscribe(freskin.order_event_topic(order.id))
+    try:
+        order.status = 'out_for_delivery'
+        freskin.db.session.commit()
+
+        event = freskin.order_event_broker.get(subscription, 0)
+        assert event['type'] == 'status'
+        assert event['status'] == 'out_for_delivery'
+        assert freskin.order_event_broker.get(subscription, 0) is None
+    finally:
+        freskin.order_event_broker.unsubscribe(subscription)
+
+
+def test_rolled_back_status_changes_are_not_published(freskin, order):
+    subscription = freskin.order_event_broker.subscribe(freskin.order_event_topic(order.id))
+    try:
+        order.status = 'cancelled'
+        freskin.db.session.flush()
+        freskin.db.session.rollback()
+        freskin.db.session.commit()
+
+        assert freskin.order_event_broker.get(subscription, 0) is None
+    finally:
+        freskin.order_event_broker.unsubscribe(subscription)
+
+
+def test_stream_starts_with_the_snapshot_and_ends_on_delivery(freskin, order):
+    subscription = freskin.order_event_broker.subscribe(freskin.order_event_topic(order.id))
+    freskin.publish_order_eta(order.id, '2026-01-01T10:00:00')
+    order.status = 'delivered'
+    freskin.db.session.commit()
+
+    events = parse_events(freskin.generate_order_event_stream(
+        subscription, {'order_id': order.id, 'status': 'confirmed'}
+    ))
+
+    assert [(event['type'], event.get('status')) for event in events] == [
+        ('status', 'confirmed'), ('eta', None), ('status', 'delivered')
+    ]
+    assert freskin.order_event_broker.subscribers == {}
+
+
+def test_stream_of_a_finished_order_closes_immediately(freskin, client, order):
+    order.status = 'delivered'
+    freskin.db.session.commit()
+    order_id = order.id
+
+    response = client.get(f"/api/orders/{order_id}/events", headers=order.headers)
+
+    assert response.mimetype == 'text/event-stream'
+    assert parse_events([response.get_data(as_text=True)]) == [
+        {'type': 'status', 'order_id': order_id, 'status': 'delivered'}
+    ]
+    assert freskin.order_event_broker.subscribers == {}
+
+
+def test_stream_of_another_users_order_is_not_found(freskin, client, order, make_user):
+    other, headers = make_user('Ravi')
+
+    response = client.get(f"/api/orders/{order.id}/events", headers=headers)
+
+    assert response.status_code == 404
+
+
+def test_full_subscriber_queue_drops_events(freskin):
+    broker = freskin.InProcessEventBroker()
+    subscription = broker.subscribe('order:1')
+
+    for number in range(freskin.ORDER_EVENT_QUEUE_SIZE + 5):
+        assert broker.publish('order:1', {'number': number}) == 1
+
+    assert subscription[1].qsize() == freskin.ORDER_EVENT_QUEUE_SIZE
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import load_freskin, reset_caches
+
+
+def add_order(freskin, total, pincode='400001', plan_type='premium', status='delivered', days_ago=0, items=()):
+    fields = {'total_amount': total, 'delivery_pincode': pincode, 'plan_type': plan_type, 'status': status,
+              'created_at': datetime.utcnow() - timedelta(days=days_ago)}
+    columns = freskin.Order.__table__.columns
+    order = freskin.Order(**{name: value for name, value in fields.items() if name in columns})
+    freskin.db.session.add(order)
+    freskin.db.session.flush()
+    for product_id, quantity, price in items:
+        freskin.db.session.add(freskin.OrderItem(order_id=order.id, product_id=product_id, quantity=quantity, price=price))
+    freskin.db.session.commit()
+    return order
+
+
+@pytest.fixture
+def catalog(freskin):
+    freskin.db.session.add(freskin.Product(id=1, name='Rose Toner', price=100.0))
+    freskin.db.session.add(freskin.DeliveryZone(
+        city='Mumbai', zone_name='South Mumbai', pincode_range='400001, 400002', delivery_slots='morning:6-9'
+    ))
+    freskin.db.session.commit()
+    return freskin
+
+
+def test_rollups_report_by_zone_and_plan(catalog):
+    add_order(catalog, 300.0, items=[(1, 3, 100.0)])
+    add_order(catalog, 100.0, pincode='999999', plan_type=None, items=[(1, 1, 100.0)])
+    add_order(catalog, 500.0, status='cancelled', items=[(1, 5, 100.0)])
+
+    stats = catalog.refresh_order_rollups()
+    analytics = catalog.get_order_analytics(datetime.utcnow().date(), datetime.utcnow().date())
+
+    assert stats['new_orders'] == 3
+    assert stats['missing_columns'] == []
+    assert analytics['revenue_by_zone'] == {
+        'South Mumbai': {'orders': 1, 'revenue': 300.0},
+        'unknown': {'orders': 1, 'revenue': 100.0}
+    }
+    assert analytics['revenue_by_plan'] == {
+        'premium': {'orders': 1, 'revenue': 300.0},
+        'one-time': {'orders': 1, 'revenue': 100.0}
+    }
+    assert analytics['top_products'] == [{'product_id': 1, 'name': 'Rose Toner', 'quantity': 4, 'revenue': 400.0}]
+
+
+def test_refresh_picks_up_later_cancellations_of_recent_days(catalog):
+    order = add_order(catalog, 300.0, days_ago=2)
+    catalog.refresh_order_rollups()
+
+    order.status = 'cancelled'
+    catalog.db.session.commit()
+    stats = catalog.refresh_order_rollups()
+
+    assert stats['new_orders'] == 0
+    assert catalog.DailyRevenueRollup.query.count() == 0
+
+
+def test_refresh_rebuilds_old_days_of_new_orders(catalog):
+    add_order(catalog, 300.0, days_ago=10)
+    catalog.refresh_order_rollups()
+    add_order(catalog, 200.0, days_ago=10)
+
+    catalog.refresh_order_rollups()
+
+    day = (datetime.utcnow() - timedelta(days=10)).date()
+    assert catalog.get_order_analytics(day, day)['revenue_by_day'] == {
+        day.isoformat(): {'orders': 2, 'revenue': 500.0}
+    }
+
+
+def test_analytics_are_admin_only(catalog, client, make_user):
+    user, headers = make_user()
+    admin, admin_headers = make_user('Admin', is_admin=True)
+
+    assert client.get('/api/admin/analytics', headers=headers).status_code == 403
+    assert client.get('/api/admin/analytics?from=yesterday', headers=admin_headers).status_code == 400
+    assert client.get('/api/admin/analytics', headers=admin_headers).status_code == 200
+
+
+@pytest.fixture(scope='module')
+def older_core(tmp_path_factory):
+    """app.py on a core Order model without plan, pincode or total columns"""
+    path = tmp_path_factory.mktemp('older-core') / 'freskin.db'
+    return load_freskin(f"sqlite:///{path}", omit_order_columns=('plan_type', 'delivery_pincode', 'total_amount'))
+
+
+@pytest.fixture
+def older(older_core):
+    with older_core.app.app_context():
+        older_core.db.create_all()
+        reset_caches(older_core)
+        yield older_core
+        older_core.db.session.remove()
+
+
+def test_rollups_degrade_without_optional_order_columns(older):
+    older.db.session.add(older.Product(id=1, name='Rose Toner', price=100.0))
+    add_order(older, None, items=[(1, 2, 150.0)])
+
+    stats = older.refresh_order_rollups()
+    today = datetime.utcnow().date()
+
+    assert stats['missing_columns'] == ['total_amount', 'delivery_pincode', 'plan_type']
+    # Revenue comes from the order items
+    assert older.get_order_analytics(today, today)['revenue_by_zone'] == {
+        'unknown': {'orders': 1, 'revenue': 300.0}
+    }
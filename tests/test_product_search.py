@@ -0,0 +1,90 @@
+import pytest
+
+
+@pytest.fixture
+def catalog(freskin):
+    products = [
+        ('Rose Glow Toner', 'toner', 'rose water, aloe vera', 'dry,normal', 'hydration,glow'),
+        ('Neem Clarifying Mask', 'mask', 'neem, multani mitti', 'oily', 'acne control'),
+        ('Rosehip Night Serum', 'serum', 'rosehip oil, honey', 'dry', 'repair,glow'),
+        ('Aloe Calm Gel', 'gel', 'aloe vera', 'sensitive,normal', 'soothing'),
+    ]
+    for name, category, ingredients, skin_types, benefits in products:
+        freskin.db.session.add(freskin.Product(
+            name=name, category=category, ingredients=ingredients, skin_types=skin_types,
+            benefits=benefits, shelf_life_hours=48, price=199.0, is_active=True
+        ))
+    freskin.db.session.add(freskin.Product(
+        name='Retired Rose Cream', category='cream', ingredients='rose water', skin_types='dry',
+        benefits='glow', shelf_life_hours=48, price=99.0, is_active=False
+    ))
+    freskin.db.session.commit()
+    return freskin
+
+
+def names(results):
+    return [product['name'] for product in results['products']]
+
+
+def test_last_token_matches_as_a_prefix(catalog):
+    assert names(catalog.search_product_catalog('ros')) == [
+        'Rose Glow Toner', 'Rosehip Night Serum'
+    ]
+    assert names(catalog.search_product_catalog('aloe ge')) == ['Aloe Calm Gel']
+
+
+def test_facets_filter_and_count_the_results(catalog):
+    results = catalog.search_product_catalog('', filters={'benefit': ['Glow']})
+
+    assert names(results) == ['Rose Glow Toner', 'Rosehip Night Serum']
+    assert results['facets']['category'] == {'toner': 1, 'serum': 1}
+    assert results['facets']['skin_type'] == {'dry': 2, 'normal': 1}
+
+
+def test_allergies_exclude_products(catalog):
+    results = catalog.search_product_catalog('', exclude_ingredients=['aloe'])
+
+    assert names(results) == ['Neem Clarifying Mask', 'Rosehip Night Serum']
+    assert results['excluded_for_allergies'] == 2
+
+
+def test_index_follows_catalog_changes(catalog):
+    assert catalog.search_product_catalog('turmeric')['total_results'] == 0
+
+    catalog.db.session.add(catalog.Product(
+        name='Turmeric Brightening Pack', category='mask', ingredients='turmeric, besan',
+        skin_types='normal', benefits='glow', shelf_life_hours=24, price=149.0, is_active=True
+    ))
+    catalog.db.session.commit()
+
+    assert names(catalog.search_product_catalog('turmeric')) == ['Turmeric Brightening Pack']
+
+
+def test_change_during_build_leaves_the_index_stale(catalog):
+    # A write landing between the version read and the product query must
+    # not be stamped as included in the index
+    @catalog.db.event.listens_for(catalog.db.session, 'do_orm_execute')
+    def bump_during_build(state):
+        catalog.catalog_state['version'] += 1
+
+    try:
+        index = catalog.build_product_search_index()
+    finally:
+        catalog.db.event.remove(catalog.db.session, 'do_orm_execute', bump_during_build)
+
+    assert index['version'] != catalog.get_catalog_version()
+
+
+def test_search_clamps_limit_and_offset(catalog, client, make_user):
+    user, headers = make_user()
+
+    response = client.get('/api/products/search?limit=-5&offset=-3', headers=headers)
+
+    assert response.status_code == 200
+    assert response.json['products'] == []
+    assert response.json['total_results'] == 4
+
+    response = client.get('/api/products/search?limit=2&offset=-3', headers=headers)
+    assert [product['name'] for product in response.json['products']] == [
+        'Rose Glow Toner', 'Neem Clarifying Mask'
+    ]
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def admin(freskin, make_user):
+    user, headers = make_user('Admin', is_admin=True)
+    return headers
+
+
+def other_worker(freskin):
+    """Forget what this process knows, as a second worker would"""
+    freskin.cache_versions.clear()
+    freskin.profiler_state.update(version=None, window_id=None, until=0.0)
+
+
+def test_window_is_shared_through_the_database(freskin, admin, client):
+    response = client.post('/api/admin/profiler', headers=admin, json={'sample_rate': 1, 'duration_seconds': 30})
+    assert response.status_code == 201
+    window_id = freskin.get_latest_profiler_window().id
+
+    other_worker(freskin)
+    with freskin.app.test_request_context('/'):
+        freskin.sync_profiler_window()
+
+    assert freskin.profiler_state['window_id'] == window_id
+    assert freskin.profiler_state['until'] > time.monotonic()
+    assert freskin.profiler_state['thread'].is_alive()
+    freskin.stop_profiling()
+
+
+def test_second_window_is_refused_from_any_worker(freskin, admin, client):
+    freskin.start_profiling(0.5, duration_seconds=30)
+    other_worker(freskin)
+
+    response = client.post('/api/admin/profiler', headers=admin, json={'sample_rate': 0.5})
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'A profiling window is already running'
+    freskin.stop_profiling()
+
+
+def test_stacks_of_all_workers_are_summed(freskin):
+    freskin.start_profiling(1, duration_seconds=30)
+    window_id = freskin.profiler_state['window_id']
+    freskin.stop_profiling()
+    # Counts flushed by two workers
+    freskin.db.session.add_all([
+        freskin.ProfilerStack(window_id=window_id, stack='index;render', count=3),
+        freskin.ProfilerStack(window_id=window_id, stack='index;render', count=4),
+        freskin.ProfilerStack(window_id=window_id, stack='index;query', count=5),
+    ])
+    freskin.db.session.commit()
+
+    assert freskin.collapsed_stacks() == 'index;render 7\nindex;query 5\n'
+    assert freskin.profiler_summary()['distinct_stacks'] == 2
+
+
+def test_sampler_flushes_profiled_requests(freskin):
+    freskin.start_profiling(1, duration_seconds=30, interval_ms=1)
+    freskin.profiled_threads[threading.get_ident()] = 'busy'
+    try:
+        deadline = time.monotonic() + 2
+        while not freskin.profile_stacks and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        freskin.profiled_threads.pop(threading.get_ident(), None)
+    freskin.stop_profiling()
+
+    summary = freskin.profiler_summary()
+    assert not summary['active']
+    assert summary['samples'] > 0
+    assert freskin.collapsed_stacks().startswith('busy;')
+
+
+def test_profiler_is_admin_only(freskin, client, make_user):
+    user, headers = make_user()
+
+    assert client.get('/api/admin/profiler', headers=headers).status_code == 403
@@ -0,0 +1,84 @@
+import json
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def add_batch(freskin):
+    freskin.db.session.add(freskin.Product(id=1, name='Rose Toner', price=100.0))
+    freskin.db.session.commit()
+    numbers = iter(range(1, 1000))
+
+    def add_batch(score, location='Andheri'):
+        now = datetime.utcnow()
+        batch = freskin.ProductBatch(
+            product_id=1, batch_number=f"B{next(numbers)}", preparation_date=now,
+            expiry_datetime=now + timedelta(days=2), quantity_prepared=10,
+            preparation_location=location, quality_score=score
+        )
+        freskin.db.session.add(batch)
+        freskin.db.session.commit()
+        return batch
+    return add_batch
+
+
+def get_stats(freskin, scope, key):
+    return freskin.QualityStats.query.filter_by(scope=scope, key=key).one()
+
+
+def test_running_stats_match_the_batch_scores(freskin, add_batch):
+    scores = [4.5, 4.7, 4.2, 4.9, 4.4]
+    for score in scores:
+        add_batch(score)
+
+    stats = get_stats(freskin, 'product', '1')
+    assert stats.count == 5
+    assert stats.mean == pytest.approx(statistics.mean(scores))
+    assert stats.m2 / (stats.count - 1) == pytest.approx(statistics.variance(scores))
+    assert get_stats(freskin, 'location', 'Andheri').count == 5
+
+
+def test_outliers_are_flagged_once_there_is_enough_history(freskin, add_batch):
+    add_batch(2.0)
+    for number in range(freskin.QUALITY_ANOMALY_MIN_COUNT - 1):
+        add_batch(4.7 + number % 2 * 0.1)
+    # Not enough history to judge the early low score
+    assert freskin.QualityAnomaly.query.count() == 0
+    for number in range(20):
+        add_batch(4.7 + number % 2 * 0.1)
+
+    outlier = add_batch(2.0, location='Bandra')
+
+    anomalies = freskin.QualityAnomaly.query.all()
+    # Bandra has no history yet, so only the product flags it
+    assert [(anomaly.batch_id, anomaly.scope) for anomaly in anomalies] == [(outlier.id, 'product')]
+    assert get_stats(freskin, 'product', '1').anomaly_count == 1
+
+
+def test_imported_batches_update_the_stats(freskin, tmp_path):
+    freskin.db.session.add(freskin.Product(id=1, name='Rose Toner', price=100.0))
+    freskin.db.session.commit()
+    path = tmp_path / 'batches.jsonl'
+    path.write_text('\n'.join(json.dumps({
+        'batch_number': f"B{number}", 'product_name': 'Rose Toner', 'preparation_date': '2026-03-01T04:00:00',
+        'expiry_datetime': '2026-03-03T04:00:00', 'quantity_prepared': 10, 'preparation_location': 'Andheri',
+        'quality_score': score
+    }) for number, score in enumerate([4.0, 5.0])), encoding='utf-8')
+
+    counts, errors = freskin.import_dataset('batches', str(path))
+
+    assert (counts['inserted'], errors) == (2, [])
+    assert get_stats(freskin, 'product', '1').mean == pytest.approx(4.5)
+
+
+def test_quality_monitoring_endpoint(freskin, client, make_user, add_batch):
+    add_batch(4.5)
+    admin, headers = make_user('Admin', is_admin=True)
+
+    response = client.get('/api/admin/quality-monitoring?scope=location', headers=headers)
+
+    assert response.status_code == 200
+    assert [stats['key'] for stats in response.json['quality_stats']] == ['Andheri']
+    assert response.json['recent_anomalies'] == []
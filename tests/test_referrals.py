@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def users(make_user):
+    return [make_user(name) for name in ('Asha', 'Ravi', 'Meera')]
+
+
+def invite(client, headers, email='friend@example.com'):
+    response = client.post('/api/referral-program', headers=headers, json={'friend_email': email})
+    assert response.status_code == 200
+    return response.json['referral_code']
+
+
+def redeem(client, headers, code):
+    return client.post('/api/referral-program/redeem', headers=headers, json={'referral_code': code})
+
+
+def test_codes_are_derived_from_the_ledger_id(freskin):
+    codes = [freskin.encode_referral_code(sequence) for sequence in (1, 31, 32, 1024)]
+
+    assert codes == ['FRESH0001', 'FRESH000Z', 'FRESH0010', 'FRESH0100']
+    assert len(set(freskin.encode_referral_code(sequence) for sequence in range(1, 5000))) == 4999
+
+
+def test_redemption_rewards_the_referrer(client, users):
+    (asha, asha_headers), (ravi, ravi_headers), _ = users
+    code = invite(client, asha_headers)
+
+    response = redeem(client, ravi_headers, code.lower())
+
+    assert response.status_code == 200
+    stats = client.get('/api/referral-program', headers=asha_headers).json['referral_stats']
+    assert stats['successful_referrals'] == 1
+    assert stats['pending_referrals'] == 0
+    assert stats['total_rewards_earned'] == 200
+    assert stats['referral_rewards'][0]['friend_name'] == 'Ravi'
+
+
+def test_code_is_redeemed_only_once(client, users):
+    (asha, asha_headers), (ravi, ravi_headers), (meera, meera_headers) = users
+    code = invite(client, asha_headers)
+
+    assert redeem(client, ravi_headers, code).status_code == 200
+    response = redeem(client, meera_headers, code)
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'This referral code has already been used'
+
+
+def test_user_redeems_only_one_code(client, users):
+    (asha, asha_headers), (ravi, ravi_headers), (meera, meera_headers) = users
+    first = invite(client, asha_headers)
+    second = invite(client, ravi_headers, 'meera@example.com')
+
+    assert redeem(client, meera_headers, first).status_code == 200
+    response = redeem(client, meera_headers, second)
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'You have already redeemed a referral code'
+    stats = client.get('/api/referral-program', headers=ravi_headers).json['referral_stats']
+    assert stats['successful_referrals'] == 0
+    assert stats['pending_referrals'] == 1
+
+
+def test_concurrent_redemptions_by_one_user_reward_once(freskin, users):
+    (asha, asha_headers), (ravi, ravi_headers), (meera, meera_headers) = users
+    client = freskin.app.test_client()
+    codes = [invite(client, asha_headers, f"friend{number}@example.com") for number in range(4)]
+    statuses = []
+
+    def redeem_in_thread(code):
+        with freskin.app.app_context():
+            statuses.append(redeem(freskin.app.test_client(), meera_headers, code).status_code)
+
+    threads = [threading.Thread(target=redeem_in_thread, args=(code,)) for code in codes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200, 400, 400, 400]
+    assert freskin.Referral.query.filter_by(referred_user_id=meera.id).count() == 1
+
+
+def test_stats_before_any_referral(client, users):
+    (asha, asha_headers), _, _ = users
+
+    stats = client.get('/api/referral-program', headers=asha_headers).json['referral_stats']
+
+    assert stats == {
+        'total_referrals': 0, 'successful_referrals': 0, 'pending_referrals': 0,
+        'total_rewards_earned': 0, 'current_referral_code': None, 'referral_rewards': []
+    }
+
+
+def test_own_code_cannot_be_redeemed(client, users):
+    (asha, asha_headers), _, _ = users
+    code = invite(client, asha_headers)
+
+    assert redeem(client, asha_headers, code).json['error'] == 'You cannot redeem your own referral code'
@@ -0,0 +1,58 @@
+import json
+from datetime import date, datetime
+
+
+def add_zone(freskin, **fields):
+    zone = freskin.DeliveryZone(**dict({
+        'city': 'Mumbai', 'zone_name': 'South', 'pincode_range': '400001,400002',
+        'delivery_slots': 'morning:6-9,evening:5-8', 'preparation_time_hours': 2
+    }, **fields))
+    freskin.db.session.add(zone)
+    freskin.db.session.commit()
+    return zone
+
+
+def test_serializer_computes_fields_and_keeps_the_selection_order(freskin):
+    zone = add_zone(freskin)
+
+    assert freskin.serialize_rows(freskin.DeliveryZone, [zone], ('delivery_slots', 'city')) == [
+        {'city': 'Mumbai', 'delivery_slots': {'morning': '6-9', 'evening': '5-8'}}
+    ]
+    assert list(freskin.serialize_rows(freskin.DeliveryZone, [zone], ('zone_name',))[0]) == ['zone_name']
+
+
+def test_to_dict_matches_the_full_serializer_with_iso_dates(freskin):
+    entry = freskin.SkinDiary(user_id=1, entry_date=date(2026, 3, 1), products_used='Rose Toner,Aloe Gel')
+    freskin.db.session.add(entry)
+    freskin.db.session.commit()
+
+    data = entry.to_dict()
+
+    assert data['date'] == '2026-03-01'
+    assert data['products_used'] == ['Rose Toner', 'Aloe Gel']
+    assert data['photos'] == []
+    assert set(data) == set(freskin.MODEL_SERIALIZERS[freskin.SkinDiary])
+
+
+def test_dumps_json_encodes_dates_and_sets(freskin):
+    payload = {'at': datetime(2026, 3, 1, 6, 30), 'tags': {'fresh'}, 'day': date(2026, 3, 1)}
+
+    assert json.loads(freskin.dumps_json(payload)) == {
+        'at': '2026-03-01T06:30:00', 'tags': ['fresh'], 'day': '2026-03-01'
+    }
+
+
+def test_sparse_fieldsets(freskin, client):
+    add_zone(freskin)
+    add_zone(freskin, zone_name='Retired', is_active=False)
+
+    response = client.get('/api/delivery-zones?fields=zone_name,pincode_range')
+
+    assert response.json['delivery_zones'] == [{'zone_name': 'South', 'pincode_range': ['400001', '400002']}]
+
+
+def test_unknown_fields_are_a_bad_request(freskin, client):
+    response = client.get('/api/delivery-zones?fields=zone_name,password')
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Unknown fields: password'
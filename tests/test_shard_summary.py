@@ -0,0 +1,48 @@
+import jwt
+import pytest
+from conftest import SECRET_KEY, load_freskin, reset_caches
+
+
+@pytest.fixture(scope='module')
+def sharded_core(tmp_path_factory):
+    """app.py with Mumbai and Delhi shards next to the default database"""
+    path = tmp_path_factory.mktemp('sharded')
+    return load_freskin(f"sqlite:///{path / 'freskin.db'}", binds={
+        'city:mumbai': f"sqlite:///{path / 'mumbai.db'}",
+        'city:delhi': f"sqlite:///{path / 'delhi.db'}",
+    })
+
+
+@pytest.fixture
+def sharded(sharded_core):
+    with sharded_core.app.app_context():
+        sharded_core.db.create_all()
+        reset_caches(sharded_core)
+        result = sharded_core.app.test_cli_runner().invoke(args=['init-shards'])
+        assert 'Shard delhi: schema created' in result.output
+        yield sharded_core
+        sharded_core.db.session.remove()
+
+
+def test_cities_without_a_shard_use_the_default_session(sharded):
+    assert sharded.get_shard_cities() == ['delhi', 'mumbai']
+    assert sharded.get_shard_session('Pune') is sharded.db.session
+    assert sharded.get_shard_session('Mumbai') is not sharded.db.session
+
+
+def test_admin_summary_fans_out_across_shards(sharded):
+    mumbai = sharded.get_shard_session('mumbai')
+    mumbai.add_all([sharded.User(name='Asha', email='asha@example.com'),
+                    sharded.User(name='Ravi', email='ravi@example.com')])
+    mumbai.commit()
+    admin = sharded.User(name='Admin', email='admin@example.com', is_admin=True)
+    sharded.db.session.add(admin)
+    sharded.db.session.commit()
+
+    token = jwt.encode({'user_id': admin.id}, SECRET_KEY, 'HS256')
+    response = sharded.app.test_client().get('/api/admin/shards', headers={'Authorization': f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert response.json['shards']['mumbai']['users'] == 2
+    assert response.json['shards']['default']['users'] == 1
+    assert response.json['totals']['users'] == 3
@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta
+
+
+def diary_entry(freskin, days_ago, **fields):
+    today = date.today()
+    return freskin.SkinDiary(user_id=1, entry_date=today - timedelta(days=days_ago), **fields)
+
+
+def test_last_day_and_weekly_rules(freskin):
+    history = [
+        diary_entry(freskin, 2, breakouts=True, sleep_hours=5),
+        diary_entry(freskin, 1, breakouts=False, sleep_hours=5),
+        diary_entry(freskin, 0, breakouts=True, sleep_hours=7, stress_level=9),
+    ]
+
+    insights = freskin.generate_skin_insights(history)
+
+    assert "Consider using our clay-neem purifying mask this week" in insights
+    assert "High stress detected - our lavender-chamomile evening routine might help" in insights
+    assert "Breakouts on 67% of days this week - add a weekly clay mask and keep cleansing gentle" in insights
+    assert "You averaged 5.7 hours of sleep this week - aim for 7+ to support overnight repair" in insights
+    # Only the latest entry counts for the one-day sleep rule
+    assert "Low sleep affects skin repair - try our overnight treatment masks" not in insights
+
+
+def test_weekly_window_ignores_older_entries(freskin):
+    history = [diary_entry(freskin, day, breakouts=True) for day in (20, 15, 10)]
+    history.append(diary_entry(freskin, 0, breakouts=False))
+
+    assert freskin.generate_skin_insights(history) == []
+
+
+def test_product_correlation_matches_names_case_insensitively(freskin):
+    history = [
+        diary_entry(freskin, 5, breakouts=True, products_used='Rose Toner, Aloe Gel'),
+        diary_entry(freskin, 4, breakouts=True, products_used=' rose toner'),
+        diary_entry(freskin, 3, breakouts=True, products_used='ROSE TONER'),
+        diary_entry(freskin, 2, breakouts=False, products_used='Aloe Gel'),
+        diary_entry(freskin, 1, breakouts=False, products_used='Aloe Gel'),
+        diary_entry(freskin, 0, breakouts=False, products_used=''),
+    ]
+
+    insights = freskin.evaluate_product_correlations(freskin.build_diary_columns(history))
+
+    assert insights == ["Breakouts happened on 100% of days you used Rose Toner - try pausing it for a week"]
+
+
+def test_parse_diary_list_accepts_strings_and_lists(freskin):
+    assert freskin.parse_diary_list('Rose Toner, Aloe Gel ,') == 'Rose Toner,Aloe Gel'
+    assert freskin.parse_diary_list([' Rose Toner', 'Aloe Gel', '']) == 'Rose Toner,Aloe Gel'
+    assert freskin.parse_diary_list(None) == ''
+
+
+def test_post_stores_string_products_as_names(freskin, client, make_user):
+    user, headers = make_user()
+
+    response = client.post('/api/skin-diary', headers=headers, json={
+        'skin_condition': 'good', 'products_used': 'Rose Toner, Aloe Gel'
+    })
+
+    assert response.status_code == 201
+    entry = freskin.db.session.get(freskin.SkinDiary, response.json['entry_id'])
+    assert entry.products_used == 'Rose Toner,Aloe Gel'
+
+
+def test_progress_summary_counts_products_case_insensitively(freskin):
+    history = [
+        diary_entry(freskin, 2, skin_condition='good', products_used='Aloe Gel, Rose Toner'),
+        diary_entry(freskin, 1, skin_condition='excellent', products_used='aloe gel'),
+        diary_entry(freskin, 0, skin_condition='poor', products_used='Rose Toner'),
+    ]
+
+    summary = freskin.summarize_skin_progress(1, history)
+
+    assert summary['best_performing_products'] == ['Aloe Gel', 'Rose Toner']
+    assert summary['consistent_days'] == 3
+
+
+def test_get_ignores_precomputed_insights_older_than_the_diary(freskin, client, make_user):
+    user, headers = make_user()
+    client.post('/api/skin-diary', headers=headers, json={'breakouts': False})
+    freskin.db.session.add(freskin.SkinInsight(
+        user_id=user.id, insights='["stale"]', entries_analysed=1,
+        computed_at=datetime.utcnow() - timedelta(hours=1)
+    ))
+    freskin.db.session.commit()
+    client.post('/api/skin-diary', headers=headers, json={'breakouts': True})
+
+    response = client.get('/api/skin-diary', headers=headers)
+
+    assert response.status_code == 200
+    assert "Consider using our clay-neem purifying mask this week" in response.json['insights']
+    assert 'stale' not in response.json['insights']
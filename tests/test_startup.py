@@ -0,0 +1,18 @@
+import sys
+
+
+def test_loading_the_app_does_not_seed_or_import_geocoding(freskin):
+    assert 'geopy' not in sys.modules
+    assert freskin.Product.query.count() == 0
+
+
+def test_init_db_seeds_once(freskin):
+    runner = freskin.app.test_cli_runner()
+
+    assert runner.invoke(args=['init-db']).exit_code == 0
+    products = freskin.Product.query.count()
+    assert products > 0
+    assert freskin.DeliveryZone.query.count() > 0
+
+    assert runner.invoke(args=['init-db']).exit_code == 0
+    assert freskin.Product.query.count() == products
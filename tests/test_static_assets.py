@@ -0,0 +1,113 @@
+import gzip
+import os
+
+import pytest
+
+import asset_pipeline
+
+PAGE = '''<html>
+<head>
+    <style>body { color: red; }</style>
+    <link rel="stylesheet" href="/vendor.css">
+    <style>p { margin: 0; }</style>
+</head>
+<body>
+    <script>var first = 1;</script>
+    <script>var second = first + 1;</script>
+    <script src="/vendor.js"></script>
+    <script>var third = vendor(second);</script>
+    <pre>
+  keep   this
+    indentation
+</pre>
+    <textarea>
+   as typed</textarea>
+</body>
+</html>
+'''
+
+
+@pytest.fixture
+def built(tmp_path):
+    static_dir = tmp_path / 'static'
+    entry = asset_pipeline.build_page('page.html', PAGE, str(static_dir), str(tmp_path / 'build'))
+    shell = (tmp_path / 'build' / 'page.html').read_text(encoding='utf-8')
+    return static_dir, entry, shell
+
+
+def read_asset(static_dir, path):
+    return (static_dir / path).read_text(encoding='utf-8')
+
+
+def test_inline_blocks_keep_their_order_around_kept_tags(built):
+    static_dir, entry, shell = built
+
+    assert [read_asset(static_dir, path) for path in entry['js']] == [
+        'var first = 1;\nvar second = first + 1;', 'var third = vendor(second);'
+    ]
+    assert len(entry['css']) == 2
+    tags = [line for line in shell.splitlines() if 'src=' in line or 'stylesheet' in line]
+    assert tags == [
+        f'<link rel="stylesheet" href="/static/{entry["css"][0]}">',
+        '<link rel="stylesheet" href="/vendor.css">',
+        f'<link rel="stylesheet" href="/static/{entry["css"][1]}">',
+        f'<script src="/static/{entry["js"][0]}"></script>',
+        '<script src="/vendor.js"></script>',
+        f'<script src="/static/{entry["js"][1]}"></script>',
+    ]
+
+
+def test_whitespace_sensitive_elements_are_kept_as_written(built):
+    static_dir, entry, shell = built
+
+    assert '<pre>\n  keep   this\n    indentation\n</pre>' in shell
+    assert '<textarea>\n   as typed</textarea>' in shell
+    assert '\n<body>\n' in shell
+
+
+def test_assets_are_written_precompressed(built):
+    static_dir, entry, shell = built
+
+    for path in entry['css'] + entry['js']:
+        with gzip.open(static_dir / (path + '.gz'), 'rt', encoding='utf-8') as f:
+            assert f.read() == read_asset(static_dir, path)
+
+
+@pytest.fixture
+def site(freskin, tmp_path, monkeypatch):
+    monkeypatch.setattr(freskin.app, 'static_folder', str(tmp_path / 'static'))
+    monkeypatch.setattr(freskin, 'get_asset_build_dir', lambda: str(tmp_path / 'build'))
+    result = freskin.app.test_cli_runner().invoke(args=['build-assets'])
+    assert result.exit_code == 0, result.output
+    return freskin, asset_pipeline.load_manifest(str(tmp_path / 'build'))['index.html']
+
+
+def test_index_is_served_from_the_shell_with_a_weak_etag(site, client):
+    freskin, entry = site
+
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == f'W/"{entry["etag"]}"'
+    assert f'/static/{entry["js"][0]}' in gzip.decompress(response.data).decode()
+
+    revalidated = client.get('/', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_fingerprinted_assets_are_sent_precompressed(site, client):
+    freskin, entry = site
+    path = f'/static/{entry["css"][0]}'
+
+    compressed = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    plain = client.get(path)
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert compressed.headers['ETag'].startswith('W/')
+    assert 'immutable' in compressed.headers['Cache-Control']
+    assert gzip.decompress(compressed.data) == plain.data
+    assert 'Content-Encoding' not in plain.headers
+    compressed.close()
+    plain.close()